@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+""" Generate synthetic dmr resumes for benchmarking.
+
+The size of a generated resume can be scaled independently along
+several axes:
+
+* ``sections``: The number of Experience, List, and Text sections, in
+  rotation;
+* ``jobs``: The number of jobs in each Experience section, grouped
+  two to an employer;
+* ``bullets``: The number of bullet points in each job and List
+  section;
+* ``references``: The number of entries in the References section;
+  and
+* ``markup``: The fraction of words that have inline markup
+  (emphasis, strong, literals, and links).
+
+Generated documents are deterministic for a given set of parameters,
+so results can be compared between runs.
+
+Run this module as a script to write a generated resume to stdout. """
+
+import sys
+import random
+import argparse
+
+__all__ = ["generate", "AXES", "DEFAULTS"]
+
+#: The axes along which a generated resume can be scaled
+AXES = ["sections", "jobs", "bullets", "references", "markup"]
+
+#: The default value of each axis, which gives a resume of roughly
+#: realistic size
+DEFAULTS = dict(sections=6, jobs=4, bullets=4, references=3, markup=0.1)
+
+_WORDS = ("designed built maintained scalable distributed systems for "
+          "customers across several teams and improved reliability "
+          "latency throughput while mentoring engineers and writing "
+          "documentation about deployment monitoring storage").split()
+
+# links are anonymous, since the same word may be linked more than once
+_MARKUP = ["*%s*", "**%s**", "``%s``", "`%s <http://example.com/%s>`__"]
+
+
+def _heading(text, char, overline=False):
+    """ Format a reST section heading """
+    rule = char * (len(text) + 2 if overline else len(text))
+    if overline:
+        return "%s\n %s\n%s\n" % (rule, text, rule)
+    return "%s\n%s\n" % (text, rule)
+
+
+class _Generator(object):
+    """ Generate the parts of a synthetic resume """
+
+    def __init__(self, markup, seed):
+        self.markup = markup
+        self.random = random.Random(seed)
+
+    def sentence(self, words=10):
+        """ Generate a sentence with inline markup at the configured
+        density """
+        rv = []
+        for _ in range(words):
+            word = self.random.choice(_WORDS)
+            if self.random.random() < self.markup:
+                fmt = self.random.choice(_MARKUP)
+                word = fmt % ((word,) * fmt.count("%s"))
+            rv.append(word)
+        return " ".join(rv).capitalize() + "."
+
+    def bullets(self, count):
+        """ Generate a bullet list """
+        return "".join("* %s\n" % self.sentence() for _ in range(count))
+
+    def address(self, idx, name=None):
+        """ Generate an address block.  A name is only given for
+        References entries; elsewhere, the name is the section
+        title. """
+        rv = ("| %d Main St.\n| Springfield, XX %05d\n"
+              "| (555) 555-%04d\n| person%d@example.com\n" %
+              (idx, idx, idx % 10000, idx))
+        if name is not None:
+            rv = "| %s\n%s" % (name, rv)
+        return rv
+
+    def experience(self, title, idx, jobs, bullets):
+        """ Generate an Experience section with two jobs per
+        employer """
+        rv = [_heading(title, "=")]
+        for job in range(jobs):
+            if job % 2 == 0:
+                employer = "Employer %d.%d" % (idx, job // 2)
+                rv.append("\n" + _heading(employer, "-") + "\n" +
+                          self.address(idx * 1000 + job))
+            year = 2010 - job
+            rv.append("\n" + _heading("Position %d.%d" % (idx, job), "~") +
+                      "%d - %d\n\n" % (year - 1, year) +
+                      self.bullets(bullets))
+        return "\n".join(rv)
+
+    def list(self, title, bullets):
+        """ Generate a List section """
+        return "%s\n%s" % (_heading(title, "="), self.bullets(bullets))
+
+    def text(self, title):
+        """ Generate a Text section """
+        return "%s\n%s\n\n%s\n" % (_heading(title, "="),
+                                   " ".join(self.sentence()
+                                            for _ in range(4)),
+                                   self.sentence())
+
+    def references(self, count):
+        """ Generate a References section """
+        return "%s\n%s" % (_heading("References", "="),
+                           "\n".join(self.address(i, "Reference %d" % i)
+                                     for i in range(count)))
+
+
+def generate(sections=DEFAULTS['sections'], jobs=DEFAULTS['jobs'],
+             bullets=DEFAULTS['bullets'], references=DEFAULTS['references'],
+             markup=DEFAULTS['markup'], seed=0):
+    """ Generate a synthetic resume.
+
+    :param sections: The number of Experience, List, and Text
+                     sections
+    :type sections: int
+    :param jobs: The number of jobs in each Experience section
+    :type jobs: int
+    :param bullets: The number of bullet points in each job and List
+                    section
+    :type bullets: int
+    :param references: The number of References entries.  If this is
+                       0, there is no References section.
+    :type references: int
+    :param markup: The fraction of words with inline markup, from 0
+                   to 1
+    :type markup: float
+    :param seed: The random seed
+    :type seed: int
+    :returns: str - The reST source of the resume
+    """
+    gen = _Generator(markup, seed)
+    parts = [_heading("Benchmark McBenchface", "=", overline=True),
+             gen.address(0)]
+    for idx in range(sections):
+        kind = idx % 3
+        if kind == 0:
+            parts.append(gen.experience("Experience %d" % idx, idx, jobs,
+                                        bullets))
+        elif kind == 1:
+            parts.append(gen.list("Skills %d" % idx, bullets))
+        else:
+            parts.append(gen.text("Summary %d" % idx))
+    if references:
+        parts.append(gen.references(references))
+    return "\n".join(parts)
+
+
+def main():
+    """ Write a generated resume to stdout """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    for axis in AXES:
+        parser.add_argument("--%s" % axis, default=DEFAULTS[axis],
+                            type=type(DEFAULTS[axis]))
+    parser.add_argument("--seed", default=0, type=int)
+    sys.stdout.write(generate(**vars(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+""" Measure the memory used to hold parsed dmr documents, per 10,000
+jobs.
+
+Documents generated by :mod:`generate` are parsed and kept in memory
+until they hold at least the given number of jobs, and the growth in
+the resident set size of the process is measured, along with the size
+of the dmr data model objects themselves (not counting the docutils
+nodes they refer to).  Each measurement runs in a fresh process.  Two
+representations are measured:
+
+* ``doctree``: Documents as returned by
+  :func:`dmr.input.parse_source`, which refer to the doctree they
+  were parsed from; and
+* ``compact``: Documents converted with
+  :func:`dmr.data.Document.compact`, which keep rendered strings
+  instead.
+
+This requires ``/proc/self/statm``, so it only runs on Linux.  Run
+from the top of the source tree::
+
+    PYTHONPATH=lib python benchmarks/memory.py
+"""
+
+import gc
+import sys
+import json
+import types
+import resource
+import argparse
+import multiprocessing
+import docutils.nodes
+import dmr.input
+from dmr.config import Settings
+from dmr.render import WhitespaceRemovingRenderer, ReferenceTransformer
+from generate import generate
+
+#: The representations of a document that can be measured
+MODES = ["doctree", "compact"]
+
+
+def rss():
+    """ Get the resident set size of this process, in bytes """
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+def model_size(obj):
+    """ Get the total size of an object and all of the objects it
+    refers to, except for docutils nodes, settings, and classes.
+
+    :returns: int - The size in bytes
+    """
+    skip = (type, types.ModuleType, types.FunctionType, docutils.nodes.Node,
+            Settings)
+    seen = set()
+    stack = [obj]
+    rv = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, skip):
+            continue
+        seen.add(id(obj))
+        rv += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return rv
+
+
+def measure(args):
+    """ Measure the memory used by documents in one representation.
+
+    :param args: tuple of ``(mode, jobs, per_document)``: the
+                 representation to measure, the minimum total number
+                 of jobs to hold, and the number of jobs in each
+                 document
+    :returns: dict
+    """
+    mode, jobs, per_document = args
+    settings = Settings.default("json", dict(cache=False))
+    # one Experience section per document
+    sources = [generate(sections=1, jobs=per_document, references=0,
+                        seed=i)
+               for i in range(-(-jobs // per_document))]
+
+    documents = []
+    gc.collect()
+    start = rss()
+    for source in sources:
+        document = dmr.input.parse_source(source, settings=settings)
+        if mode == "compact":
+            document = document.compact(
+                WhitespaceRemovingRenderer(document.source,
+                                           ReferenceTransformer, cache=None))
+        documents.append(document)
+    gc.collect()
+    used = rss() - start
+
+    model = model_size(documents)
+
+    total = sum(len(s) for d in documents for s in d
+                if s.type == "experience")
+    return dict(mode=mode, documents=len(documents), jobs=total,
+                bytes=used, bytes_per_10k_jobs=used * 10000 // total,
+                model_bytes=model,
+                model_bytes_per_10k_jobs=model * 10000 // total)
+
+
+def main():
+    """ Run the measurements and write the report """
+    parser = argparse.ArgumentParser(description="Measure dmr memory use")
+    parser.add_argument("-o", "--outfile", default="-",
+                        help="File to write the JSON report to")
+    parser.add_argument("-j", "--jobs", default=10000, type=int,
+                        help="Minimum number of jobs to hold in memory")
+    parser.add_argument("--per-document", default=100, type=int,
+                        help="Number of jobs in each document")
+    parser.add_argument("--mode", action="append", choices=MODES,
+                        help="Representation to measure (default: all)")
+    args = parser.parse_args()
+
+    report = []
+    for mode in args.mode or MODES:
+        sys.stderr.write("Measuring %s\n" % mode)
+        pool = multiprocessing.Pool(1)
+        try:
+            report.append(pool.apply(measure, ((mode, args.jobs,
+                                                args.per_document),)))
+        finally:
+            pool.terminate()
+
+    if args.outfile == "-":
+        outfile = sys.stdout
+    else:
+        outfile = open(args.outfile, "w")
+    json.dump(report, outfile, indent=2, sort_keys=True)
+    outfile.write("\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+""" Benchmark dmr on synthetic resumes generated by
+:mod:`generate`.
+
+Each axis of the generator is scaled in turn by each of the given
+factors, with all other axes at their defaults.  For each resulting
+document, this times:
+
+* ``parse``: Parsing the document with :func:`dmr.input.parse_source`
+  (docutils parsing and building the :class:`dmr.data.Document`);
+* ``render``: Rendering the contact and every section with the
+  output format's renderer, for formats that have one; and
+* ``output``: Producing the complete output with
+  :func:`dmr.output.base.BaseOutput.output`
+
+for every output format in :data:`dmr.output.__all__`.  Each
+measurement is the best of several repeats, with the parse cache
+disabled; each repeat renders with a new output object, and so with
+an empty snippet cache.  Results are written as JSON.
+
+Run from the top of the source tree::
+
+    PYTHONPATH=lib python benchmarks/run.py -o report.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import docutils
+import dmr.input
+import dmr.output
+import dmr.version
+from dmr.config import Settings
+from generate import generate, AXES, DEFAULTS
+
+#: The templates in the source tree, used by Genshi output formats
+TEMPLATES = os.path.abspath(os.path.join(os.path.dirname(__file__), "..",
+                                         "templates"))
+
+
+def best_time(func, repeat):
+    """ Call ``func`` ``repeat`` times, and get the shortest time it
+    took and its last return value. """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        rv = func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, rv
+
+
+def get_settings(fmt):
+    """ Get the settings to benchmark the given output format with """
+    return Settings.default(fmt, dict(cache=False,
+                                      template_path=TEMPLATES))
+
+
+def render_all(output):
+    """ Render the contact and every section of a document with the
+    output format's renderer """
+    renderer = output.renderer
+    output.document.contact.render(renderer)
+    for section in output.document:
+        section.render(renderer)
+
+
+def bench_document(source, formats, repeat):
+    """ Benchmark a single document in each of the given formats.
+
+    :returns: dict
+    """
+    rv = dict(size=len(source), formats=dict())
+    parse_time, document = best_time(
+        lambda: dmr.input.parse_source(source,
+                                       settings=get_settings(formats[0])),
+        repeat)
+    rv['parse'] = parse_time
+    rv['sections'] = len(document)
+    rv['jobs'] = sum(len(s) for s in document if s.type == "experience")
+
+    for fmt in formats:
+        result = rv['formats'][fmt] = dict(render=None, output=None,
+                                           error=None)
+        try:
+            document = dmr.input.parse_source(source,
+                                              settings=get_settings(fmt))
+            output_class = document.settings.output_class
+            if hasattr(output_class(document), "renderer"):
+                result['render'] = best_time(
+                    lambda: render_all(output_class(document)), repeat)[0]
+            result['output'], text = best_time(
+                lambda: output_class(document).output(), repeat)
+            result['output_size'] = len(text)
+        except Exception:  # pylint: disable=W0703
+            result['error'] = "%s: %s" % (sys.exc_info()[0].__name__,
+                                          sys.exc_info()[1])
+    return rv
+
+
+def main():
+    """ Run the benchmarks and write the report """
+    formats = [m.rsplit('.', 1)[-1] for m in dmr.output.__all__]
+    parser = argparse.ArgumentParser(description="Benchmark dmr")
+    parser.add_argument("-o", "--outfile", default="-",
+                        help="File to write the JSON report to")
+    parser.add_argument("-r", "--repeat", default=3, type=int,
+                        help="Number of times to repeat each measurement")
+    parser.add_argument("--scale", default="1,2,4,8",
+                        help="Comma-separated factors to scale each axis by")
+    parser.add_argument("--axis", action="append", choices=AXES,
+                        help="Axis to scale (default: all)")
+    parser.add_argument("-f", "--format", action="append", choices=formats,
+                        help="Output format to benchmark (default: all)")
+    args = parser.parse_args()
+
+    report = dict(dmr=dmr.version.__version__,
+                  docutils=docutils.__version__,
+                  python=platform.python_version(),
+                  defaults=DEFAULTS,
+                  repeat=args.repeat,
+                  results=[])
+    for axis in args.axis or AXES:
+        for factor in [float(f) for f in args.scale.split(",")]:
+            params = dict(DEFAULTS)
+            params[axis] = type(DEFAULTS[axis])(DEFAULTS[axis] * factor)
+            if axis == "markup":
+                params[axis] = min(params[axis], 1.0)
+            sys.stderr.write("Benchmarking %s=%s\n" % (axis, params[axis]))
+            result = bench_document(generate(**params),
+                                    args.format or formats, args.repeat)
+            result.update(axis=axis, factor=factor, params=params)
+            report['results'].append(result)
+
+    if args.outfile == "-":
+        outfile = sys.stdout
+    else:
+        outfile = open(args.outfile, "w")
+    json.dump(report, outfile, indent=2, sort_keys=True)
+    outfile.write("\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
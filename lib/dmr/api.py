@@ -0,0 +1,55 @@
+""" A library API for rendering dmr documents from other programs.
+
+The command-line program keeps its configuration in the module-level
+:attr:`dmr.config.config`, which makes it unsuitable for rendering
+several documents at once in a single process.
+:func:`dmr.api.render` instead gives each call its own immutable
+:class:`dmr.config.Settings`, which is passed down through
+:mod:`dmr.input`, :mod:`dmr.data`, and :mod:`dmr.output`, so
+concurrent calls in different threads do not interfere with each
+other.  Config files and the command line are not read, and nothing
+is written to disk unless the parse cache is enabled.
+
+.. code-block:: python
+
+    import dmr.api
+
+    html = dmr.api.render(open("resume.rst").read(), "html")
+    data = dmr.api.render(source, "json",
+                          dict(pretty=True, exclude=["References"]))
+"""
+
+import dmr.input
+from dmr.config import Settings
+
+__all__ = ["render"]
+
+
+def render(source, fmt="html", options=None):  # pylint: disable=W0621
+    """ Render a document in the given output format.
+
+    :param source: The reStructuredText source of the document
+    :type source: str
+    :param fmt: The name of the output format
+    :type fmt: str
+    :param options: Option values to use instead of the defaults,
+                    keyed by the option's ``dest`` as given in
+                    :ref:`configuration` (e.g., ``include``,
+                    ``exclude``, ``pretty``, ``template``).
+                    ``footer`` may be given as a boolean.  Unlike the
+                    command-line program, the on-disk parse cache (see
+                    :mod:`dmr.cache`) is only used if ``cache`` is
+                    True, in which case it is stored in ``cache_dir``.
+                    In-document options are applied on top of these.
+    :type options: dict
+    :returns: str - The rendered document
+    :raises: ValueError if the output format does not exist, or
+             :exc:`dmr.input.DocumentError` (a subclass of
+             ValueError) if the document cannot be parsed, e.g.,
+             because it does not have exactly one top-level heading
+    """
+    defaults = dict(cache=False)
+    defaults.update(options or dict())
+    settings = Settings.default(fmt, defaults)
+    document = dmr.input.parse_source(source, settings=settings)
+    return document.settings.output_class(document).output()
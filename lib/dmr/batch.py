@@ -0,0 +1,308 @@
+""" Render many documents in a single run with ``dmr batch``:
+
+.. code-block:: bash
+
+    dmr batch resumes/ -f json -o rendered/
+    dmr batch "resumes/*/resume.rst" -f html,json -o rendered/
+
+Each source may be a directory, which is searched recursively for
+``*.rst`` files, or a glob pattern.  Compiled documents (see
+:mod:`dmr.compiled`) are only loaded when a glob pattern matches
+``*.dmrc`` files.  Documents are parsed and rendered
+in a pool of worker processes.  An error in one document is reported
+without stopping the rest of the batch, and a summary of timings and
+failures is written when the batch is done.
+
+Output files are named with the ``output_pattern`` option (see
+:ref:`configuration`), relative to the output directory; ``%(base)s``
+is the path of the document relative to the directory it was found
+in, without its extension.  Output formats that can be appended to
+(e.g., :mod:`dmr.output.jsonl`) append every document to the same file
+if the pattern does not include ``%(base)s``:
+
+.. code-block:: bash
+
+    dmr batch resumes/ -f jsonl --output-pattern corpus.jsonl
+
+Existing output files for appendable formats are removed when the
+batch starts, so each batch writes them from scratch.
+
+Every document is rendered with the configuration that was given on
+the command line and in the config files; in-document options only
+apply to the document they are found in.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import traceback
+import multiprocessing
+import dmr.config
+import dmr.cli
+import dmr.input
+from dmr.config import config, DMROption
+from dmr.logger import logger
+
+__all__ = ["main", "options", "find_sources", "clear_outputs", "render_file",
+           "run", "summarize"]
+
+#: Options that only apply to ``dmr batch``
+_OPTIONS = []
+
+#: Core options that do not apply to ``dmr batch``
+_EXCLUDED = ["infile", "--outfile", "--serve", "--watch",
+             "--watch-interval", "--parse-processes"]
+
+
+def options():
+    """ Get the list of options that ``dmr batch`` accepts: the core
+    options from :func:`dmr.config.options`, except for those that
+    name a single input or output file, plus options specific to
+    batches.
+
+    :returns: list of :class:`dmr.config.DMROption` objects
+    """
+    if not _OPTIONS:
+        _OPTIONS.extend(
+            [DMROption("sources",
+                       help="Directories to search for *.rst files, or glob "
+                       "patterns matching the documents to render",
+                       nargs='+'),
+             DMROption("-o", "--outdir",
+                       help="Directory to write output files to",
+                       default=".",
+                       cf=('batch', 'outdir')),
+             DMROption("-j", "--processes",
+                       help="Number of worker processes (default: the "
+                       "number of CPUs)",
+                       type=int,
+                       cf=('batch', 'processes')),
+             DMROption("--summary",
+                       help="Write a JSON summary of the batch to the "
+                       "given file",
+                       cf=('batch', 'summary'))])
+    return [opt for opt in dmr.config.options()
+            if opt.args[-1] not in _EXCLUDED] + _OPTIONS
+
+
+def find_sources(spec, outdir):
+    """ Find the documents to render for a single source given on the
+    command line.
+
+    :param spec: A directory to search recursively for ``*.rst``
+                 files, or a glob pattern
+    :type spec: str
+    :param outdir: The directory to write output to
+    :type outdir: str
+    :returns: list of ``(path, base)`` tuples, where ``base`` is the
+              base name to use for output files (see
+              :func:`dmr.config.output_filename`)
+    """
+    if os.path.isdir(spec):
+        root = spec
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(spec):
+            dirnames.sort()
+            paths.extend(os.path.join(dirpath, fname)
+                         for fname in sorted(filenames)
+                         if fname.endswith(".rst"))
+    else:
+        paths = [p for p in sorted(glob.glob(spec)) if os.path.isfile(p)]
+        root = os.path.dirname(os.path.commonprefix(
+            [os.path.dirname(p) + os.sep for p in paths]))
+    return [(path,
+             os.path.join(outdir,
+                          os.path.splitext(os.path.relpath(path, root))[0]))
+            for path in paths]
+
+
+def clear_outputs(sources):
+    """ Remove the existing output files of the selected output
+    formats that are appended to (see
+    :attr:`dmr.output.base.BaseOutput.appendable`), so that a batch
+    does not append to the output of a previous batch.
+
+    :param sources: A list of ``(path, base)`` tuples, as returned by
+                    :func:`dmr.batch.find_sources`
+    :type sources: list
+    """
+    for fmt in config.formats:
+        dmr.config.select_format(fmt)
+        if not config.output_class.appendable:
+            continue
+        for outfile in set(dmr.config.output_filename(base)
+                           for _, base in sources):
+            if os.path.exists(outfile):
+                logger.info("Removing existing output %s" % outfile)
+                os.unlink(outfile)
+
+
+class _ErrorCollector(logging.Handler):
+    """ A logging handler that remembers errors logged while a
+    document is rendered, so that they can be included in the batch
+    summary. """
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def render_file(source):
+    """ Parse a single document and render it in each of the selected
+    output formats.  The configuration is reset before the document
+    is parsed, so the in-document options of a previously rendered
+    document do not apply.
+
+    :param source: A ``(path, base)`` tuple, as returned by
+                   :func:`dmr.batch.find_sources`
+    :type source: tuple
+    :returns: dict with the keys ``source``, ``outputs`` (a list of
+              output filenames), ``time`` (in seconds), and ``error``
+              (an error message, or None on success)
+    """
+    path, base = source
+    rv = dict(source=path, outputs=[], error=None)
+    start = time.time()
+    errors = _ErrorCollector()
+    logger.addHandler(errors)
+    try:
+        dmr.config.select_format(config.formats[0])
+        infile = open(path)
+        try:
+            document = dmr.cli.load_document(infile)
+        finally:
+            infile.close()
+        for fmt in config.formats:
+            dmr.config.select_format(fmt)
+            output = config.output_class(dmr.input.for_format(document))
+            outfile = dmr.config.output_filename(base)
+            if not os.path.isdir(os.path.dirname(outfile) or "."):
+                try:
+                    os.makedirs(os.path.dirname(outfile))
+                except OSError:
+                    # another worker may have created it
+                    if not os.path.isdir(os.path.dirname(outfile)):
+                        raise
+            if output.appendable:
+                # unbuffered, so that each document is appended with
+                # a single write and documents from several workers
+                # are not interleaved
+                logger.info("Appending output to %s" % outfile)
+                fileobj = open(outfile, "a", 0)
+            else:
+                logger.info("Writing output to %s" % outfile)
+                fileobj = open(outfile, "w")
+            with fileobj:
+                output.output_to(fileobj)
+            rv['outputs'].append(outfile)
+    except SystemExit:
+        # dmr.logger.fatal() has already logged the reason
+        rv['error'] = (errors.messages[-1:] or
+                       ["Exited with status %s" % sys.exc_info()[1].code])[0]
+    except Exception:  # pylint: disable=W0703
+        rv['error'] = str(sys.exc_info()[1])
+        logger.error("Failed to render %s: %s" % (path, rv['error']))
+        logger.debug(traceback.format_exc())
+    finally:
+        logger.removeHandler(errors)
+    rv['time'] = time.time() - start
+    return rv
+
+
+def run(sources, processes=None):
+    """ Render a list of documents.
+
+    :param sources: A list of ``(path, base)`` tuples, as returned by
+                    :func:`dmr.batch.find_sources`
+    :type sources: list
+    :param processes: The number of worker processes to use.  If this
+                      is None, one worker per CPU is used; if it is 1,
+                      documents are rendered in this process.
+    :type processes: int
+    :returns: list of dicts, as returned by
+              :func:`dmr.batch.render_file`, in the order the
+              documents finished in
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes == 1 or len(sources) < 2:
+        return [render_file(s) for s in sources]
+    # workers are forked, so they inherit the parsed configuration
+    pool = multiprocessing.Pool(processes)
+    try:
+        chunksize = max(1, min(16, len(sources) // (processes * 4)))
+        return list(pool.imap_unordered(render_file, sources, chunksize))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def summarize(results, elapsed):
+    """ Produce a human-readable summary of a batch.
+
+    :param results: The results returned by :func:`dmr.batch.run`
+    :type results: list
+    :param elapsed: The wall clock time the batch took, in seconds
+    :type elapsed: float
+    :returns: str
+    """
+    failed = [r for r in results if r['error']]
+    total = sum(r['time'] for r in results)
+    lines = ["Rendered %d of %d documents in %.2fs" %
+             (len(results) - len(failed), len(results), elapsed)]
+    if results:
+        slowest = max(results, key=lambda r: r['time'])
+        lines.append("Time per document: %.3fs average, %.3fs maximum (%s)"
+                     % (total / len(results), slowest['time'],
+                        slowest['source']))
+    if failed:
+        lines.append("Failed:")
+        lines.extend("  %s: %s" % (r['source'], r['error'])
+                     for r in sorted(failed, key=lambda r: r['source']))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    """ Parse the configuration for ``dmr batch``, render every
+    document found, and write a summary.
+
+    :param argv: The argument list to parse, instead of
+                 :attr:`sys.argv`.  The ``batch`` command itself is
+                 the first argument after the program name.
+    :type argv: list
+    :returns: int - 0 if every document was rendered, 1 otherwise
+    """
+    if argv is None:
+        argv = sys.argv
+    dmr.config.parse([argv[0]] + argv[2:], core=options())
+
+    sources = []
+    for spec in config.sources:
+        found = find_sources(spec, config.outdir)
+        if not found:
+            logger.warning("No documents found in %s" % spec)
+        sources.extend(found)
+    logger.info("Rendering %d documents" % len(sources))
+    clear_outputs(sources)
+
+    processes = None
+    if config.processes is not None:
+        processes = int(config.processes)
+    start = time.time()
+    results = run(sources, processes=processes)
+    elapsed = time.time() - start
+
+    sys.stdout.write(summarize(results, elapsed))
+    if config.summary:
+        json.dump(dict(elapsed=elapsed,
+                       documents=sorted(results, key=lambda r: r['source'])),
+                  open(config.summary, "w"), indent=4)
+    if any(r['error'] for r in results):
+        return 1
+    return 0
@@ -0,0 +1,254 @@
+""" On-disk cache of parsed dmr documents.
+
+Parsing a document with docutils is by far the most expensive part of
+a dmr run, and it is wasted effort when the source hasn't changed
+since the last run.  :class:`dmr.cache.ParseCache` stores the parsed
+doctree and the :class:`dmr.data.Document` built from it, keyed by a
+hash of the source bytes and of everything else that can affect the
+result of the parse, so that repeat runs can skip parsing entirely.
+
+The cache is bounded in size; when it grows larger than the
+configured maximum, the least recently used entries are evicted.
+Recently used entries are also kept in memory, which helps
+long-running processes such as :func:`dmr.server.serve`.
+
+:class:`dmr.cache.ChunkCache` stores the parse results for the parts
+of a document that :mod:`dmr.incremental` parses separately.
+"""
+
+import os
+import sys
+import errno
+import hashlib
+import tempfile
+import cPickle as pickle
+import docutils
+from docutils.utils import new_reporter
+from docutils.transforms import Transformer
+import dmr.version
+from dmr.logger import logger
+from dmr.render import LRUCache
+
+__all__ = ["ParseCache", "ChunkCache", "dumps", "loads"]
+
+
+def dumps(data, document):
+    """ Serialize parse results to a string.  The
+    :class:`docutils.nodes.document` that the results refer to
+    carries a reporter and a transformer that cannot be pickled, so
+    they are stripped before pickling and restored afterwards.
+
+    :param data: The data to serialize.  It may refer to ``document``
+                 and any nodes in it.
+    :param document: The docutils document the data was parsed from
+    :type document: docutils.nodes.document
+    :returns: str
+    """
+    reporter = document.reporter
+    transformer = document.transformer
+    document.reporter = None
+    document.transformer = None
+    try:
+        return pickle.dumps((data, document), pickle.HIGHEST_PROTOCOL)
+    finally:
+        document.reporter = reporter
+        document.transformer = transformer
+
+
+def loads(serialized):
+    """ Deserialize parse results that were serialized with
+    :func:`dmr.cache.dumps`, and give the docutils document a new
+    reporter and transformer.
+
+    :param serialized: The serialized parse results
+    :type serialized: str
+    :returns: The ``data`` that was passed to :func:`dmr.cache.dumps`
+    """
+    data, document = pickle.loads(serialized)
+    document.reporter = new_reporter(document.get('source', ''),
+                                     document.settings)
+    document.transformer = Transformer(document)
+    return data
+
+
+class ParseCache(object):
+    """ A size-bounded, on-disk cache of parse results.  Each entry is
+    stored in a separate file named after its key; the modification
+    time of the file is updated whenever the entry is used, so that
+    the least recently used entries can be evicted first. """
+
+    #: The suffix of cache entry files
+    suffix = ".cache"
+
+    #: Serialized entries that have been used recently by this
+    #: process, shared by all ParseCache objects.  Entries are kept
+    #: serialized so that every :func:`dmr.cache.ParseCache.get`
+    #: returns new objects that the caller is free to modify.
+    memory = LRUCache(maxsize=16)
+
+    def __init__(self, path, maxsize=None):
+        """
+        :param path: The directory to store cache entries in, or None
+                     to keep entries in memory only.  It is created
+                     if it does not exist.
+        :type path: str
+        :param maxsize: The maximum total size of the cache in bytes,
+                        or None for no limit.
+        :type maxsize: int
+        """
+        self.path = path
+        if path is not None:
+            self.path = os.path.expanduser(path)
+        self.maxsize = maxsize
+
+    @staticmethod
+    def key(source, *args):
+        """ Get the cache key for the given document source.  The key
+        includes the dmr and docutils versions, since either one can
+        change the result of a parse.
+
+        :param source: The raw bytes of the document to parse
+        :type source: str
+        :param args: Any other data that affects the result of the
+                     parse.  Each element will be converted to a
+                     string with :func:`repr`.
+        :returns: str
+        """
+        digest = hashlib.sha1()
+        digest.update(source)
+        for extra in (dmr.version.__version__, docutils.__version__) + args:
+            digest.update("\0%r" % (extra,))
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        """ Get the path to the cache entry file for the given key """
+        if self.path is None:
+            return key
+        return os.path.join(self.path, key + self.suffix)
+
+    def get(self, key):
+        """ Get the parse results cached under the given key.
+
+        :param key: The cache key, as returned by
+                    :func:`dmr.cache.ParseCache.key`
+        :type key: str
+        :returns: The cached data, or None if there is no usable
+                  entry for the key
+        """
+        entry = self._entry(key)
+        serialized = self.memory.get(entry)
+        try:
+            if serialized is None:
+                if self.path is None:
+                    raise IOError("Not in memory")
+                serialized = open(entry, "rb").read()
+            data = loads(serialized)
+        except IOError:
+            logger.debug("No parse cache entry at %s" % entry)
+            return None
+        except:  # pylint: disable=W0702
+            logger.info("Discarding unreadable parse cache entry %s: %s" %
+                        (entry, sys.exc_info()[1]))
+            self._remove(entry)
+            return None
+        logger.debug("Loaded parse results from cache entry %s" % entry)
+        self.memory[entry] = serialized
+        if self.path is not None:
+            try:
+                os.utime(entry, None)
+            except OSError:
+                pass
+        return data
+
+    def put(self, key, data, document):
+        """ Store parse results in the cache, and evict old entries if
+        the cache has grown too large.  Failure to write to the cache
+        is logged, but is not fatal.
+
+        :param key: The cache key, as returned by
+                    :func:`dmr.cache.ParseCache.key`
+        :type key: str
+        :param data: The parse results to cache
+        :param document: The docutils document the data was parsed
+                         from.  See :func:`dmr.cache.dumps`.
+        :type document: docutils.nodes.document
+        """
+        entry = self._entry(key)
+        try:
+            serialized = dumps(data, document)
+        except (pickle.PicklingError, TypeError):
+            logger.warning("Could not serialize parse results: %s" %
+                           sys.exc_info()[1])
+            return
+        if self.path is None:
+            self.memory[entry] = serialized
+            return
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            # write to a temp file and rename it into place so that a
+            # concurrent reader never sees a partial entry
+            fd, tmpfile = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            try:
+                os.write(fd, serialized)
+            finally:
+                os.close(fd)
+            os.rename(tmpfile, entry)
+        except (IOError, OSError):
+            logger.warning("Could not write parse cache entry %s: %s" %
+                           (entry, sys.exc_info()[1]))
+            return
+        logger.debug("Wrote parse results to cache entry %s" % entry)
+        self.memory[entry] = serialized
+        self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries until the total
+        size of the cache is no larger than the maximum size. """
+        if self.maxsize is None or self.path is None:
+            return
+        entries = []
+        total = 0
+        try:
+            for fname in os.listdir(self.path):
+                if not fname.endswith(self.suffix):
+                    continue
+                entry = os.path.join(self.path, fname)
+                stat = os.stat(entry)
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                total += stat.st_size
+        except OSError:
+            logger.info("Could not list parse cache %s: %s" %
+                        (self.path, sys.exc_info()[1]))
+            return
+        entries.sort()
+        while total > self.maxsize and entries:
+            _, size, entry = entries.pop(0)
+            logger.debug("Evicting parse cache entry %s" % entry)
+            self._remove(entry)
+            total -= size
+
+    def _remove(self, entry):
+        """ Remove a cache entry file, ignoring missing files """
+        self.memory.pop(entry)
+        if self.path is None:
+            return
+        try:
+            os.unlink(entry)
+        except OSError:
+            err = sys.exc_info()[1]
+            if err.errno != errno.ENOENT:
+                logger.info("Could not remove parse cache entry %s: %s" %
+                            (entry, err))
+
+
+class ChunkCache(ParseCache):
+    """ A :class:`dmr.cache.ParseCache` for the separately parsed
+    parts of documents (see :mod:`dmr.incremental`).  Chunk entries
+    are stored alongside whole documents, with a different suffix, and
+    count against the maximum size separately.  A document has many
+    chunks, so more of them are kept in memory. """
+
+    suffix = ".chunk"
+
+    memory = LRUCache(maxsize=256)
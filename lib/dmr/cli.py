@@ -0,0 +1,130 @@
+""" The dmr command-line program.  This is kept separate from
+``bin/dmr`` so that :mod:`dmr.server` can run exactly the same code
+to handle requests from clients. """
+
+import os
+import sys
+import dmr.config
+import dmr.input
+import dmr.compiled
+import dmr.profile
+from dmr.profile import phase
+from dmr.logger import logger, fatal
+
+__all__ = ["main", "load_document", "render", "write_profile"]
+
+
+def main(argv=None):
+    """ Parse the configuration, then render the input document in
+    each of the selected output formats, or start a dmr server if
+    ``--serve`` was given, or keep rendering the document as it
+    changes if ``--watch`` was given (see :mod:`dmr.watch`).  ``dmr
+    batch`` is handled by :func:`dmr.batch.main`, and ``dmr compile``
+    by :func:`dmr.compiled.main`.
+
+    :param argv: The argument list to parse, instead of
+                 :attr:`sys.argv`
+    :type argv: list
+    :returns: int - The return value of the program, or None
+    """
+    if (argv or sys.argv)[1:2] == ["batch"]:
+        from dmr.batch import main as batch
+        return batch(argv)
+    if (argv or sys.argv)[1:2] == ["compile"]:
+        from dmr.compiled import main as compile_document
+        return compile_document(argv)
+
+    # the profiler is started before we know whether --profile was
+    # given, so that the time spent parsing the configuration counts
+    profiler = dmr.profile.Profiler()
+    dmr.profile.activate(profiler)
+    try:
+        with phase("Parsing configuration"):
+            config = dmr.config.parse(argv)
+        if not config.profile:
+            dmr.profile.deactivate()
+        if config.serve:
+            from dmr.server import serve
+            return serve(os.path.expanduser(config.socket))
+        if config.watch:
+            from dmr.watch import watch
+            return watch(config, argv)
+        render(config)
+    finally:
+        dmr.profile.deactivate()
+    if config.profile:
+        profiler.stop()
+        write_profile(profiler, config)
+
+
+def load_document(filehandle):
+    """ Parse the input document read from the given filehandle, or
+    load it with :func:`dmr.compiled.load_file` if its filename has
+    the ``.dmrc`` extension of compiled documents.  Compiled documents
+    are never recognized by their contents, since loading one can run
+    arbitrary code.
+
+    :param filehandle: The file-like object to read the document from
+    :type filehandle: file
+    :returns: :class:`dmr.data.Document`
+    """
+    if os.path.splitext(filehandle.name)[1] == dmr.compiled.EXTENSION:
+        return dmr.compiled.load_file(filehandle)
+    return dmr.input.parse(filehandle)
+
+
+def render(config, document=None, formats=None):
+    """ Render the input document in each of the selected output
+    formats.
+
+    :param config: The parsed configuration
+    :type config: argparse.Namespace
+    :param document: The document to render, or None to parse the
+                     input file
+    :type document: dmr.data.Document
+    :param formats: The output formats to render, or None to render
+                    all of the selected formats
+    :type formats: list of str
+    """
+    if len(config.formats) > 1 and config.outfile is not sys.stdout:
+        fatal("Use --output-pattern instead of --outfile to write "
+              "multiple formats")
+    if document is None:
+        document = load_document(config.infile)
+    for fmt in formats or config.formats:
+        with phase("Output %s" % fmt):
+            dmr.config.select_format(fmt)
+            output = config.output_class(dmr.input.for_format(document))
+            if len(config.formats) > 1:
+                outfile = open(dmr.config.output_filename(), "w")
+            else:
+                outfile = config.outfile
+            logger.info("Writing %s output to %s" % (output.name,
+                                                     outfile.name))
+            with phase("Writing output"):
+                output.output_to(outfile)
+                if outfile is not config.outfile:
+                    outfile.close()
+
+
+def write_profile(profiler, config):
+    """ Write the report from a profiled run, as configured by the
+    ``--profile-output`` and ``--profile-format`` options.
+
+    :param profiler: The profiler that recorded the run
+    :type profiler: dmr.profile.Profiler
+    :param config: The parsed configuration
+    :type config: argparse.Namespace
+    """
+    if config.profile_format == "json":
+        report = profiler.to_json()
+    else:
+        report = profiler.report()
+    if config.profile_output == "-":
+        sys.stderr.write(report)
+    else:
+        try:
+            open(config.profile_output, "w").write(report)
+        except IOError:
+            logger.error("Could not write profile to %s: %s" %
+                         (config.profile_output, sys.exc_info()[1]))
@@ -0,0 +1,229 @@
+""" Compile documents to ``.dmrc`` snapshots with ``dmr compile``:
+
+.. code-block:: bash
+
+    dmr compile resume.rst -o resume.dmrc
+    dmr -f html resume.dmrc
+    dmr -f latex --exclude references resume.dmrc
+
+A compiled document holds the parsed :class:`dmr.data.Document`,
+including the doctree that output formats render it from, and its
+in-document options.  ``dmr`` and ``dmr --watch`` load an input file
+whose name ends in ``.dmrc`` with :func:`dmr.compiled.load_file`,
+without running the docutils parser, which is much faster than
+parsing the reST source.  So does ``dmr batch``, for files that a
+glob pattern matches (e.g., ``dmr batch "resumes/*.dmrc"``);
+directories are only searched for ``*.rst`` files.  This helps when
+the same document is rendered in many output formats or with many
+different options, e.g., by separate runs in a CI job.
+
+Every section and job is compiled, so ``--include`` and ``--exclude``
+apply to a compiled document just as they do to its source, and so
+do the in-document options.  A compiled document can only be loaded
+by the versions of dmr and docutils that compiled it; compile it
+again after upgrading either one.
+
+.. warning::
+
+   Compiled documents are Python pickles, and loading one can run
+   arbitrary code.  Only load compiled documents that you created
+   yourself.  Compiled documents are only loaded from files with a
+   ``.dmrc`` extension given to the command-line program, or with
+   :func:`dmr.compiled.load_file`; :func:`dmr.input.parse` and
+   :func:`dmr.api.render` only ever parse reST.
+
+A compiled document starts with the bytes ``DMRC`` and the version of
+the file format, followed by the dmr and docutils versions and by the
+compressed document.
+"""
+
+import os
+import sys
+import zlib
+import struct
+import docutils
+import dmr.version
+import dmr.config
+from dmr.cache import dumps as _dumps, loads as _loads
+from dmr.input import parse, _apply_document_options, _view
+from dmr.config import config, DMROption
+from dmr.logger import logger, fatal
+from dmr.profile import phase
+
+__all__ = ["MAGIC", "FORMAT_VERSION", "EXTENSION", "is_compiled", "dumps",
+           "loads", "load_file", "options", "main"]
+
+#: The bytes that every compiled document starts with
+MAGIC = "DMRC"
+
+#: The filename extension of compiled documents
+EXTENSION = ".dmrc"
+
+#: The version of the compiled document format.  This must change
+#: whenever the layout of the file does.
+FORMAT_VERSION = 1
+
+# the format version, and the length of the version string that
+# follows it
+_HEADER = struct.Struct("!HH")
+
+#: Options that only apply to ``dmr compile``
+_OPTIONS = []
+
+#: Core options that do not apply to ``dmr compile``
+_EXCLUDED = ["--outfile", "--output-pattern", "--serve", "--watch",
+             "--watch-interval"]
+
+
+def _versions():
+    """ Get the versions that a compiled document must be loaded with,
+    as stored in its header """
+    return "%s\0%s" % (dmr.version.__version__, docutils.__version__)
+
+
+def is_compiled(data):
+    """ Determine whether the given data is a compiled document.
+
+    :param data: The contents of a file
+    :type data: str
+    :returns: bool
+    """
+    return data.startswith(MAGIC)
+
+
+def dumps(doc):
+    """ Compile a parsed document.
+
+    :param doc: A document returned by :func:`dmr.input.parse`
+    :type doc: dmr.data.Document
+    :returns: str - The compiled document
+    """
+    # settings may hold open files, and are given again when the
+    # document is loaded
+    settings = doc.settings
+    doc.settings = None
+    try:
+        serialized = _dumps((doc.options, doc), doc.source)
+    finally:
+        doc.settings = settings
+    versions = _versions()
+    return "".join([MAGIC, _HEADER.pack(FORMAT_VERSION, len(versions)),
+                    versions, zlib.compress(serialized)])
+
+
+def loads(data):
+    """ Load a compiled document.
+
+    :param data: A compiled document, as returned by
+                 :func:`dmr.compiled.dumps`
+    :type data: str
+    :returns: :class:`dmr.data.Document` - The document, with its
+              in-document options in the ``options`` attribute, but
+              without settings
+    :raises ValueError: If the data is not a compiled document, or was
+                        compiled by a different version of dmr,
+                        docutils, or the file format
+    """
+    if not is_compiled(data):
+        raise ValueError("Not a compiled dmr document")
+    start = len(MAGIC) + _HEADER.size
+    try:
+        version, length = _HEADER.unpack(data[len(MAGIC):start])
+    except struct.error:
+        raise ValueError("Truncated compiled dmr document")
+    if version != FORMAT_VERSION:
+        raise ValueError("Compiled document format version %s is not "
+                         "supported (expected %s); compile it again" %
+                         (version, FORMAT_VERSION))
+    versions = data[start:start + length]
+    if versions != _versions():
+        dmr_version, _, docutils_version = versions.partition("\0")
+        raise ValueError("Compiled with dmr %s and docutils %s; compile "
+                         "it again" % (dmr_version, docutils_version))
+    try:
+        options, doc = _loads(zlib.decompress(data[start + length:]))
+    except Exception:  # pylint: disable=W0703
+        raise ValueError("Corrupt compiled dmr document: %s" %
+                         sys.exc_info()[1])
+    doc.options = options
+    return doc
+
+
+def load_file(filehandle, settings=None):
+    """ Load a compiled document from the given filehandle, and get a
+    view of it with its in-document options applied, as
+    :func:`dmr.input.parse` does for a reST document.  Loading a
+    compiled document can run arbitrary code, so it must come from a
+    trusted source.
+
+    :param filehandle: The file-like object to load the document from
+    :type filehandle: file
+    :param settings: The settings to render the document with, as
+                     for :func:`dmr.input.parse`
+    :type settings: dmr.config.Settings
+    :returns: :class:`dmr.data.Document`
+    """
+    logger.info("Loading compiled document from %s" % filehandle.name)
+    try:
+        with phase("Reading input"):
+            data = filehandle.read()
+    except IOError:
+        fatal("Could not read %s: %s" % (filehandle.name, sys.exc_info()[1]))
+    try:
+        with phase("Loading compiled document"):
+            doc = loads(data)
+    except ValueError:
+        fatal("Could not load %s: %s" % (filehandle.name, sys.exc_info()[1]))
+    return _view(doc, _apply_document_options(doc.options, settings))
+
+
+def options():
+    """ Get the list of options that ``dmr compile`` accepts: the core
+    options from :func:`dmr.config.options`, except for those that
+    only apply to rendering output, plus options specific to
+    compiling.
+
+    :returns: list of :class:`dmr.config.DMROption` objects
+    """
+    if not _OPTIONS:
+        _OPTIONS.extend(
+            [DMROption("-o", "--output",
+                       help="Compiled document filename (default: the "
+                       "input filename with a .dmrc extension)")])
+    return [opt for opt in dmr.config.options()
+            if opt.args[-1] not in _EXCLUDED] + _OPTIONS
+
+
+def main(argv=None):
+    """ Parse the configuration for ``dmr compile``, then parse the
+    input document and write it out compiled.
+
+    :param argv: The argument list to parse, instead of
+                 :attr:`sys.argv`.  The ``compile`` command itself is
+                 the first argument after the program name.
+    :type argv: list
+    :returns: int - 0
+    """
+    if argv is None:
+        argv = sys.argv
+    dmr.config.parse([argv[0]] + argv[2:], core=options())
+
+    output = config.output
+    if output is None:
+        if config.infile is sys.stdin:
+            fatal("Give the compiled document filename with --output "
+                  "when reading from stdin")
+        output = os.path.splitext(config.infile.name)[0] + EXTENSION
+    # every section is compiled, whatever is excluded from this view
+    doc = parse(config.infile)
+    with phase("Compiling document"):
+        data = dumps(doc)
+    logger.info("Writing compiled document to %s" % output)
+    try:
+        if output == "-":
+            sys.stdout.write(data)
+        else:
+            open(output, "wb").write(data)
+    except IOError:
+        fatal("Could not write %s: %s" % (output, sys.exc_info()[1]))
+    return 0
@@ -62,24 +62,39 @@ values for boolean configuration options.
 
 import os
 import sys
+import copy
 import shlex
 import argparse
+import threading
 import dmr.version
 from dmr.logger import setup_logging, logger
 import docutils.nodes
 import ConfigParser
 
 
-__all__ = ["config", "parse", "options", "DMROption"]
+__all__ = ["config", "parse", "options", "DMROption", "Settings"]
 
 _OPTIONS = []
 
+#: State saved by :func:`dmr.config.parse` so that the configuration
+#: can later be reset for each output format by
+#: :func:`dmr.config.select_format`.
+_FORMAT_STATE = dict()
+
 #: A module-level :class:`argparse.Namespace` object that stores all
 #: configuration for dmr.
 config = argparse.Namespace(version=dmr.version.__version__,
                             name="dmr",
                             uri='http://github.com/stpierre/dmr')
 
+#: The initial contents of :attr:`dmr.config.config`, used by
+#: :func:`dmr.config.reset`
+_INITIAL = dict(vars(config))
+
+#: Lock that serializes setting up the shared option objects for
+#: :class:`dmr.config.Settings`
+_LOCK = threading.Lock()
+
 
 class UnsetAction(argparse.Action):
     """ An argparse Action that unsets another item in the namespace. """
@@ -171,18 +186,23 @@ class DMROption(object):
                 ConfigParser.NoSectionError, ConfigParser.NoOptionError):
             pass
 
-    def parse_value(self, value):
+    def parse_value(self, value, namespace=None):
         """ Manually set or append the given value.
 
         :param value: The value to set, append, or otherwise
                       appropriately handle.
+        :param namespace: The namespace to set the value in, instead
+                          of :attr:`dmr.config.config`
+        :type namespace: argparse.Namespace
         """
         if self.action is None:
             # logging may not have been set up yet
             print("Options must be added to parsers before they can be parsed "
                   "from config")
             return
-        return self.action(self.parser, config, value)
+        if namespace is None:
+            namespace = config
+        return self.action(self.parser, namespace, value)
 
 
 def options():
@@ -191,7 +211,6 @@ def options():
     dmr.output, which itself imports dmr.config, so this list must be
     generated at run-time rather than at compile-time, or we get
     circular imports. """
-    import dmr.output  # pylint: disable=W0621
     if not _OPTIONS:
         _OPTIONS.extend(
             [DMROption("-c", "--config",
@@ -220,15 +239,82 @@ def options():
                        default=[],
                        cf=('global', 'include'),
                        inline='include'),
+             DMROption("--no-cache",
+                       help="Do not use the parse cache",
+                       dest="cache",
+                       action="store_false",
+                       default=True),
+             DMROption("--cache-dir",
+                       help="Directory to store the parse cache in",
+                       default="~/.dmr/cache",
+                       cf=('cache', 'directory')),
+             DMROption("--cache-size",
+                       help="Maximum size of the parse cache, in megabytes",
+                       default=64,
+                       type=int,
+                       cf=('cache', 'size')),
+             DMROption("--incremental",
+                       help="Parse only the top-level sections that "
+                       "changed since the document was last parsed",
+                       action="store_true",
+                       default=False,
+                       cf=('cache', 'incremental')),
+             DMROption("--parse-processes",
+                       help="Parse the top-level sections of the document "
+                       "in this many worker processes",
+                       default=1,
+                       type=int,
+                       cf=('parse', 'processes')),
+             DMROption("--serve",
+                       help="Run a dmr server that listens on a socket for "
+                       "requests from dmr --client",
+                       action="store_true",
+                       default=False),
+             DMROption("--client",
+                       help="Send the request to a dmr server instead of "
+                       "rendering the document in this process",
+                       action="store_true",
+                       default=False),
+             DMROption("--socket",
+                       help="Path to the socket used by dmr --serve and "
+                       "dmr --client",
+                       default="~/.dmr/socket",
+                       cf=('server', 'socket')),
+             DMROption("--watch",
+                       help="Render the document again whenever it, the "
+                       "templates, or the config files change",
+                       action="store_true",
+                       default=False),
+             DMROption("--watch-interval",
+                       help="Seconds between checks for changes with "
+                       "--watch, when inotify is not available",
+                       default=1.0,
+                       type=float,
+                       cf=('watch', 'interval')),
+             DMROption("--profile",
+                       help="Report the time spent in each phase of the run",
+                       action="store_true",
+                       default=False,
+                       cf=('global', 'profile')),
+             DMROption("--profile-output",
+                       help="File to write the --profile report to, or - "
+                       "for stderr",
+                       default="-",
+                       cf=('profile', 'output')),
+             DMROption("--profile-format",
+                       help="Format of the --profile report",
+                       choices=["text", "json"],
+                       default="text",
+                       cf=('profile', 'format')),
              DMROption("-v", "--verbose",
                        help="Be verbose",
                        action='count',
                        cf=('global', 'verbose')),
              DMROption("-f", "--format",
-                       help="Output format",
+                       help="Output format, or a comma-separated list of "
+                       "output formats (choose from %s)" %
+                       ", ".join(_get_formats()),
                        default="html",
-                       choices=[m.rsplit('.', 1)[-1]
-                                for m in dmr.output.__all__],
                        cf=('global', 'output_format')),
              DMROption("infile",
                        help="Input filename, or - to read from stdin",
@@ -240,11 +326,27 @@ def options():
                        help="Output filename, or - to write to stdout",
                        default=sys.stdout,
                        nargs='?',
-                       type=argparse.FileType('w'),
-                       cf=('global', 'outfile'))])
+                       cf=('global', 'outfile')),
+             DMROption("--output-pattern",
+                       help="Output filename pattern to use when writing "
+                       "multiple formats.  %%(base)s is replaced with the "
+                       "input filename without its extension, %%(format)s "
+                       "with the format name, and %%(extension)s with the "
+                       "usual file extension for the format",
+                       default="%(base)s.%(extension)s",
+                       cf=('global', 'output_pattern'))])
     return _OPTIONS
 
 
+def _get_formats():
+    """ Get a list of the names of all available output formats.
+
+    :returns: list of strings
+    """
+    import dmr.output  # pylint: disable=W0621
+    return [m.rsplit('.', 1)[-1] for m in dmr.output.__all__]
+
+
 def _get_output_class(modname):
     """ Given the name of a module in :mod:`dmr.output`, get the
     output format class from that module.
@@ -260,15 +362,20 @@ def _get_output_class(modname):
                                    "output"), modname), classname)
 
 
-def _get_parser():
+def _get_parser(core=None):
     """ Get an argument parser with all options (from
     :func:`dmr.config.options`) pre-loaded.
 
+    :param core: A list of :class:`dmr.config.DMROption` objects to
+                 use instead of :func:`dmr.config.options`
+    :type core: list
     :returns: :class:`argparse.ArgumentParser`
     """
+    if core is None:
+        core = options()
     parser = argparse.ArgumentParser(
         description="Render a resume in different formats")
-    for opt in options():
+    for opt in core:
         opt.add_to_parser(parser)
     return parser
 
@@ -286,60 +393,201 @@ def _get_default_config(fmt, opts=None):
     config.output_class = _get_output_class(fmt)
     for opt in config.output_class.get_options():
         opt.add_to_parser(parser)
-        opt.parse_value(None)
+        # calling the action would set boolean options to True
+        setattr(config, opt.action.dest, opt.action.default)
+    config.formats = [fmt]
     for opt, val in opts.items():
         setattr(config, opt, val)
+    _FORMAT_STATE.update(cfp=ConfigParser.SafeConfigParser(), remaining=[],
+                         base=_copy_namespace(vars(config)))
     return config
 
 
-def parse(argv=None):
+def parse(argv=None, core=None):
     """ Parse command-line arguments and config file(s).
 
     :param argv: The argument list to parse, instead of
                  :attr:`sys.argv`
     :type argv: list
+    :param core: A list of :class:`dmr.config.DMROption` objects to
+                 parse instead of :func:`dmr.config.options`, for
+                 commands that take different arguments (e.g.,
+                 :func:`dmr.batch.main`)
+    :type core: list
     :returns: :class:`argparse.Namespace`
     """
     if argv is None:
         argv = sys.argv
+    if core is None:
+        core = options()
     # phase 1: get config file
-    bootstrap = _get_parser().parse_known_args(namespace=config)[0]
+    bootstrap = _get_parser(core).parse_known_args(argv[1:],
+                                                   namespace=config)[0]
 
     # phase 2: read config files
     cfp = ConfigParser.SafeConfigParser()
     cfp.read([bootstrap.config, os.path.expanduser('~/.dmr/config')])
-    for opt in options():
+    for opt in core:
         opt.from_config(cfp)
 
     # phase 3: re-parse command line. verbose is a 'count' flag, so we
     # reset it so it doesn't just keep incrementing and incrementing.
     config.verbose = 0
-    remaining = _get_parser().parse_known_args(namespace=config)[1]
+    remaining = _get_parser(core).parse_known_args(argv[1:],
+                                                   namespace=config)[1]
+
+    config.formats = [f.strip() for f in config.format.split(",")
+                      if f.strip()]
+    parser = _get_parser(core)
+    if not config.formats:
+        parser.error("argument -f/--format: no output format given")
+    for fmt in config.formats:
+        if fmt not in _get_formats():
+            parser.error("argument -f/--format: invalid choice: %r "
+                         "(choose from %s)" %
+                         (fmt, ", ".join(_get_formats())))
+    if isinstance(getattr(config, "outfile", None), basestring):
+        # the output file is only opened once the rest of the command
+        # line is known to be good, since opening it truncates it
+        if len(config.formats) > 1 and config.outfile != "-":
+            parser.error("Use --output-pattern instead of --outfile to "
+                         "write multiple formats")
+        try:
+            config.outfile = argparse.FileType('w')(config.outfile)
+        except argparse.ArgumentTypeError:
+            parser.error("argument -o/--outfile: %s" % sys.exc_info()[1])
+
+    # save the configuration as it stands so that it can be reset
+    # before output format options are parsed for each format
+    _FORMAT_STATE.update(cfp=cfp, remaining=remaining,
+                         base=_copy_namespace(vars(config)))
+
+    if len(config.formats) > 1:
+        # each format only knows about its own options, so make sure
+        # that every remaining command-line argument is known to at
+        # least one of the selected formats
+        parser = argparse.ArgumentParser(conflict_handler='resolve')
+        for fmt in config.formats:
+            for opt in _get_output_class(fmt).get_options():
+                opt.add_to_parser(parser)
+        parser.parse_args(remaining, namespace=argparse.Namespace())
+
+    # phases 4 and 5: parse output format class options
+    select_format(config.formats[0])
+
+    # phase 5 + 1: setup logging
+    setup_logging(config.verbose)
+    return config
+
+
+def _copy_namespace(data):
+    """ Copy a dict of configuration data, copying mutable list values
+    (e.g., ``exclude``) so that appending to them later does not
+    change the copy.  Other values (including open files) are not
+    copied.
+
+    :param data: The configuration data to copy
+    :type data: dict
+    :returns: dict
+    """
+    return dict((key, copy.copy(val) if isinstance(val, list) else val)
+                for key, val in data.items())
+
+
+def select_format(fmt):
+    """ Configure dmr to produce the given output format.  This resets
+    the configuration to the state it was in after the global options
+    were parsed by :func:`dmr.config.parse`, which discards any
+    options set by a previously selected format or by the document,
+    and then parses the options for the given output format from the
+    config files and the command line.  This lets a single run render
+    several output formats.
+
+    :param fmt: The name of the output format to select
+    :type fmt: str
+    :returns: :class:`argparse.Namespace`
+    """
+    vars(config).clear()
+    vars(config).update(_copy_namespace(_FORMAT_STATE['base']))
+    config.format = fmt
 
     # phase 4: parse output format class options from config files
     parser = argparse.ArgumentParser()
-    config.output_class = _get_output_class(config.format)
+    config.output_class = _get_output_class(fmt)
     for opt in config.output_class.get_options():
         opt.add_to_parser(parser)
-        opt.from_config(cfp)
+        opt.from_config(_FORMAT_STATE['cfp'])
 
     # phase 5: parse output format class options from command line
-    parser.parse_args(remaining, namespace=config)
-
-    # phase 5 + 1: setup logging
-    setup_logging(config.verbose)
+    if len(config.formats) > 1:
+        # arguments for other formats were validated by parse()
+        parser.parse_known_args(_FORMAT_STATE['remaining'], namespace=config)
+    else:
+        parser.parse_args(_FORMAT_STATE['remaining'], namespace=config)
     return config
 
 
-def parse_document_options(opts):
+def override(**options):
+    """ Set options in the configuration for every output format.
+    Setting an attribute of :attr:`dmr.config.config` directly only
+    lasts until the next call to :func:`dmr.config.select_format`;
+    this also sets the options in the state that it resets the
+    configuration to.
+
+    :param options: The option values to set, keyed by the option's
+                    ``dest``
+    """
+    for key, val in options.items():
+        setattr(config, key, val)
+        if 'base' in _FORMAT_STATE:
+            _FORMAT_STATE['base'][key] = val
+
+
+def output_filename(base=None):
+    """ Get the name of the file to write output for the currently
+    selected format to when writing multiple formats, according to
+    the ``output_pattern`` option.
+
+    :param base: The base name to use in the pattern, instead of the
+                 input filename without its extension
+    :type base: str
+    :returns: str
+    """
+    if base is None:
+        base = "resume"
+        if config.infile is not sys.stdin:
+            base = os.path.splitext(config.infile.name)[0]
+    return config.output_pattern % dict(
+        base=base, format=config.format,
+        extension=config.output_class.extension or config.format)
+
+
+def reset():
+    """ Reset the configuration to its initial state, discarding all
+    options parsed so far.  Options are only given default values when
+    they have not already been set, so a long-running process (e.g.,
+    :func:`dmr.server.serve`) must reset the configuration before
+    parsing it again. """
+    vars(config).clear()
+    vars(config).update(_INITIAL)
+    del _OPTIONS[:]
+    _FORMAT_STATE.clear()
+
+
+def parse_document_options(opts, namespace=None):
     """ Parse local options from a document.
 
     :param opts: A list of option strings.  Each string should consist
                  of an option keyword and its value, separated by
                  whitespace.
     :type opts: list of strings
+    :param namespace: The namespace to set options in, instead of
+                      :attr:`dmr.config.config`
+    :type namespace: argparse.Namespace
     """
-    all_options = options() + config.output_class.get_options()
+    if namespace is None:
+        namespace = config
+    all_options = options() + namespace.output_class.get_options()
     for opt in opts:
         try:
             name, val = opt.split(None, 1)
@@ -349,7 +597,100 @@ def parse_document_options(opts):
             val = True
         for opt in all_options:
             if name == opt.inline:
-                opt.parse_value(val)
+                opt.parse_value(val, namespace)
                 break
         else:
             logger.error("Skipping unknown document option: %s" % opt)
+
+
+class Settings(object):
+    """ An immutable snapshot of dmr configuration.  Unlike
+    :attr:`dmr.config.config`, a Settings object can be passed down
+    through :mod:`dmr.input`, :mod:`dmr.data` and :mod:`dmr.output`
+    for a single document, so that several documents can be rendered
+    concurrently with different options (see :func:`dmr.api.render`).
+
+    Options are read as attributes.  List values are stored as
+    tuples. """
+
+    def __init__(self, **kwargs):
+        self.__dict__['_data'] = dict(
+            (key, tuple(val) if isinstance(val, list) else val)
+            for key, val in kwargs.items())
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_data'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s objects are immutable" %
+                             self.__class__.__name__)
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join("%s=%r" % item
+                                     for item in sorted(self._data.items())))
+
+    @classmethod
+    def default(cls, fmt, options=None):  # pylint: disable=W0621
+        """ Get the default settings for the given output format,
+        without reading any config files or the command line.
+
+        :param fmt: The name of the output format
+        :type fmt: str
+        :param options: Option values to override the defaults with,
+                        keyed by the option's ``dest`` (e.g.,
+                        ``dict(pretty=True, exclude=["References"])``).
+                        ``footer`` may be given as a boolean.
+        :type options: dict
+        :returns: :class:`dmr.config.Settings`
+        """
+        if fmt not in _get_formats():
+            raise ValueError("Unknown output format %r (choose from %s)" %
+                             (fmt, ", ".join(_get_formats())))
+        with _LOCK:
+            # in-document options are parsed with the actions of the
+            # core options, so they must have been added to a parser
+            if not _OPTIONS or any(opt.action is None for opt in _OPTIONS):
+                _get_parser()
+            core = list(_OPTIONS)
+        output_class = _get_output_class(fmt)
+        parser = argparse.ArgumentParser(add_help=False)
+        for opt in core + output_class.get_options():
+            if opt.args[-1] not in ("infile", "--outfile"):
+                parser.add_argument(*opt.args, **opt.kwargs)
+        namespace = parser.parse_args([], namespace=argparse.Namespace(
+            format=fmt, formats=[fmt], output_class=output_class,
+            **_INITIAL))
+        for key, val in (options or dict()).items():
+            if key == "footer" and val is True:
+                val = _get_footer()
+            setattr(namespace, key, val)
+        return cls(**vars(namespace))
+
+    def namespace(self):
+        """ Get a mutable copy of these settings.
+
+        :returns: :class:`argparse.Namespace`
+        """
+        return argparse.Namespace(**dict(
+            (key, list(val) if isinstance(val, tuple) else val)
+            for key, val in self._data.items()))
+
+    def with_document_options(self, opts):
+        """ Get a copy of these settings with the in-document options
+        for the selected output format applied.
+
+        :param opts: A dict of format name (or None for options that
+                     apply to all formats) to a list of option
+                     strings, as found by :func:`dmr.input.parse`
+        :type opts: dict
+        :returns: :class:`dmr.config.Settings`
+        """
+        namespace = self.namespace()
+        for ofmt in [None, self.format]:
+            if ofmt in opts:
+                parse_document_options(opts[ofmt], namespace=namespace)
+        return self.__class__(**vars(namespace))
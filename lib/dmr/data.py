@@ -3,11 +3,34 @@
 
 import re
 import abc
+import datetime
 from dmr.config import config
 from dmr.logger import logger
+from dmr.profile import phase
+from dmr.render import LRUCache
 import docutils.nodes
 from collections import namedtuple, MutableSequence
 
+#: The names most recently interned with :func:`dmr.data.intern_name`
+_names = LRUCache(maxsize=4096)  # pylint: disable=C0103
+
+#: The sort key of a date that is still open-ended (e.g., "Present"),
+#: which sorts after every other date.  See :func:`dmr.data.date_key`.
+PRESENT = (datetime.MAXYEAR, 12, 31)
+
+_MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+           "august", "september", "october", "november", "december"]
+_PRESENT_WORDS = ["present", "current", "now", "today", "ongoing"]
+_DATE_TOKEN = re.compile(r'[^\W\d_]+|\d+', re.UNICODE)
+
+#: The most recently used date texts, mapped to the keys parsed from
+#: them by :func:`dmr.data.date_key`
+_date_keys = LRUCache(maxsize=4096)  # pylint: disable=C0103
+
+# distinguishes a date that is not in _date_keys from one whose key is
+# None
+_MISSING = object()
+
 
 def child_by_class(parent, nodecls):
     """ Get the first child of ``parent`` that is a member of
@@ -47,21 +70,61 @@ def _contain(parent):
         return parent.children[0]
 
 
-def exclude(node):
-    """ Return True if the node should be skipped.
+def intern_name(name):
+    """ Get a single shared copy of a name, such as the title of a
+    section or the name of an employer, which may occur many times
+    among the documents in memory.  Unlike :func:`intern`, this
+    works with unicode.  Only the most recently used names are kept,
+    so that a long-lived process (e.g., a :mod:`dmr.server`) does not
+    keep every name it has ever seen.
 
-    :param node: The node to check
+    :param name: The name to intern
+    :type name: unicode
+    :returns: unicode
+    """
+    rv = _names.get(name)
+    if rv is None:
+        _names[name] = rv = name
+    return rv
+
+
+def filter_names(node):
+    """ Get the names that ``--include`` and ``--exclude`` match for a
+    node: the text of its title, and the names of the groups it is in.
+
+    :param node: The node to get the names of
     :type node: docutils.nodes.Node
-    :returns: bool """
-    names = [get_title(node)]
+    :returns: list of unicode """
+    names = [intern_name(get_title(node).astext())]
     for child in node.children:
         if isinstance(child, docutils.nodes.comment):
             contents = child_by_class(child, docutils.nodes.Text)
             if contents.startswith("group "):
-                names.append(contents.split(None, 1)[-1])
-    # if title or group name is explicitly included, override all excludes
-    return (not any(n in config.include for n in names) and
-            any(n in config.exclude for n in names))
+                names.append(intern_name(contents.split(None, 1)[-1]))
+    return names
+
+
+def is_excluded(names, include, exclude):  # pylint: disable=W0621
+    """ Return True if a section or job with the given filter names
+    should be skipped.
+
+    :param names: The filter names of the section or job, as a list
+                  with one list of names (see
+                  :func:`dmr.data.filter_names`) for each level of
+                  nesting; e.g., for a job, the names of the employer
+                  and of the position.  The object is skipped if any
+                  level is excluded.
+    :type names: list of lists
+    :param include: The names to include
+    :type include: list
+    :param exclude: The names to exclude
+    :type exclude: list
+    :returns: bool """
+    # if title or group name is explicitly included, override all
+    # excludes at that level
+    return any(not any(n in include for n in level) and
+               any(n in exclude for n in level)
+               for level in names)
 
 
 def get_title(node):
@@ -75,12 +138,94 @@ def get_title(node):
     return _contain(child_by_class(node, docutils.nodes.Titular))
 
 
+#: The registered :class:`dmr.data.Section` subclasses, in the order
+#: in which they were registered with
+#: :func:`dmr.data.register_section`.
+sections = []  # pylint: disable=C0103
+
+#: A dict of the child-class signature of a node (see
+#: :func:`dmr.data.section_signature`) to the registered section type
+#: that the node is a valid section of, or None.
+_dispatch = dict()  # pylint: disable=C0103
+
+
+def register_section(cls):
+    """ Register a :class:`dmr.data.Section` subclass, so that
+    :func:`dmr.data.Document.parse` parses sections of that type.
+    This can be used as a class decorator, so plugins can add new
+    section types without changing :mod:`dmr.data`:
+
+    .. code-block:: python
+
+        @dmr.data.register_section
+        class Table(dmr.data.Section):
+            allowed_child_node_types = (
+                dmr.data.Section.allowed_child_node_types +
+                [docutils.nodes.table])
+            required_child_node_types = [docutils.nodes.table]
+
+    The ``is_valid`` method of a registered section type must only
+    depend on the classes of the children of the node it checks,
+    since its result is reused for every node with the same
+    :func:`dmr.data.section_signature`.
+
+    :param cls: The section type to register
+    :type cls: type
+    :returns: ``cls``
+    """
+    if cls not in sections:
+        sections.append(cls)
+        _dispatch.clear()
+    return cls
+
+
+def section_signature(node):
+    """ Get the child-class signature of a node: the class of its
+    first child (the title) and the set of the classes of its other
+    children.  Nodes with the same signature are valid sections of the
+    same type.
+
+    :param node: The node to get the signature of
+    :type node: docutils.nodes.Node
+    :returns: tuple of ``(type, frozenset)``
+    """
+    if not node.children:
+        return (None, frozenset())
+    return (node.children[0].__class__,
+            frozenset(c.__class__ for c in node.children[1:]))
+
+
+def section_type(node):
+    """ Get the registered section type that the given node is a valid
+    section of.  The registered types are only checked once for each
+    :func:`dmr.data.section_signature`.
+
+    :param node: The node to get the section type of
+    :type node: docutils.nodes.Node
+    :returns: :class:`dmr.data.Section` subclass, or None if the node
+              is not a valid section of any registered type
+    """
+    signature = section_signature(node)
+    try:
+        return _dispatch[signature]
+    except KeyError:
+        pass
+    rv = None
+    for sectiontype in sections:
+        if sectiontype.is_valid(node):
+            rv = sectiontype
+            break
+    _dispatch[signature] = rv
+    return rv
+
+
 class Renderable(object):
     """ An abstract base class that provides a ``render`` method,
     which returns a new object of the given type with all internal
     data replaced by simple strings (as opposed to doctrees).
     """
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     @abc.abstractmethod
     def render(self, func):
@@ -101,6 +246,7 @@ class Parseable(object):
     given type from the data in it.
     """
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     @classmethod
     @abc.abstractmethod
@@ -119,6 +265,7 @@ class RenderableNamedTuple(Renderable):
     (as per :func:`dmr.data.Renderable.render` for namedtuple
     subclasses."""
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     def render(self, func):
         args = []
@@ -256,6 +403,7 @@ class Contact(ContactBase, RenderableNamedTuple, Parseable):
         | dmr@lucent.com
         | "I invented C."
     """
+    __slots__ = ()
     phone_re = re.compile(r'(?:.*:\s*)?[-\s.()+0-9]+$')
 
     @classmethod
@@ -314,6 +462,84 @@ class Contact(ContactBase, RenderableNamedTuple, Parseable):
         return cls(name, address, phone, email, url, other)
 
 
+def _parse_date_key(text):
+    """ Parse a sortable key out of the text of a date.  See
+    :func:`dmr.data.date_key`. """
+    tokens = _DATE_TOKEN.findall(text.lower())
+    numbers = [t for t in tokens if t.isdigit()]
+    if not numbers:
+        if any(t in _PRESENT_WORDS for t in tokens):
+            return PRESENT
+        return None
+    years = [i for i, n in enumerate(numbers) if len(n) == 4]
+    if not years:
+        return None
+    year = int(numbers[years[0]])
+    others = [int(n) for i, n in enumerate(numbers) if i != years[0]]
+
+    month = 0
+    day = 0
+    names = [idx for t in tokens if len(t) >= 3
+             for idx, name in enumerate(_MONTHS) if name.startswith(t)]
+    if names:
+        month = names[0] + 1
+        if others:
+            day = others[0]
+    elif years[0] == 0:
+        # year-month-day
+        others.extend([0, 0])
+        month, day = others[:2]
+    elif len(others) == 1:
+        # month/year
+        month = others[0]
+    elif others:
+        # month/day/year
+        month, day = others[:2]
+    if month > 12 >= day:
+        # the month and day were given the other way around
+        month, day = day, month
+
+    if not 1 <= month <= 12:
+        return (year, 0, 0)
+    if not 1 <= day <= 31:
+        day = 0
+    return (year, month, day)
+
+
+def date_key(text):
+    """ Get a sortable key for the text of a date, such as the start
+    or end of a :class:`dmr.data.Dates` range.  The key is a tuple of
+    ``(year, month, day)``, with 0 for the month or day if it is not
+    given, so that dates compare in chronological order.  For
+    example:
+
+    * ``1 February 2013``, ``Feb. 1, 2013``, ``2013-2-1``, and
+      ``2/1/2013`` all give ``(2013, 2, 1)``;
+    * ``March 2012`` and ``3/2012`` give ``(2012, 3, 0)``;
+    * ``1999`` and ``Summer 1999`` give ``(1999, 0, 0)``; and
+    * ``Present``, ``Current``, ``Now``, ``Today``, and ``Ongoing``
+      give :data:`dmr.data.PRESENT`, which sorts after every other
+      date.
+
+    Numeric dates are taken to be year-month-day if they start with
+    the year, and month/day/year otherwise, unless only the other
+    order gives a valid month (e.g., ``2013-27-2`` or
+    ``27/2/2013``).  The most recently parsed keys are memoized, since
+    the same dates occur many times in a corpus.
+
+    :param text: The text of the date
+    :type text: unicode
+    :returns: tuple of ``(year, month, day)``, or None if no year can
+              be found in the text
+    """
+    if text is None:
+        return None
+    rv = _date_keys.get(text, _MISSING)
+    if rv is _MISSING:
+        rv = _date_keys[text] = _parse_date_key(text)
+    return rv
+
+
 class Dates(DateBase, RenderableNamedTuple, Parseable):
     """ A date range is a one-line paragraph giving a range of dates.
     The dates themselves are not parsed; only the start and end of the
@@ -346,6 +572,7 @@ class Dates(DateBase, RenderableNamedTuple, Parseable):
     use the hyphen as a separator, and the appropriate word or
     separator in the output formatter.)
     """
+    __slots__ = ()
     regexes = [re.compile(r'\s+(?:-|to)\s+'),
                re.compile(r'\s*-\s*')]
 
@@ -364,6 +591,18 @@ class Dates(DateBase, RenderableNamedTuple, Parseable):
                     node.astext())
         return cls(node.astext(), None)
 
+    @property
+    def start_key(self):
+        """ A sortable key for the start of the range, as returned by
+        :func:`dmr.data.date_key` """
+        return date_key(self.start)
+
+    @property
+    def end_key(self):
+        """ A sortable key for the end of the range, as returned by
+        :func:`dmr.data.date_key` """
+        return date_key(self.end)
+
     def render(self, func):
         # a Dates object already stores strings, not doctrees, so just
         # return this object.  This should be fixed some day, but
@@ -371,7 +610,7 @@ class Dates(DateBase, RenderableNamedTuple, Parseable):
         return self
 
 
-class Job(MutableSequence, Renderable, Parseable):  # pylint: disable=R0901
+class Job(Renderable, Parseable):
     """ Representation of an element in a :ref:`input-experience`
     section.  We call it a "Job," but it could be schooling or
     anything else with dates and a bullet list description.  It
@@ -382,7 +621,14 @@ class Job(MutableSequence, Renderable, Parseable):  # pylint: disable=R0901
     * A :ref:`input-dates` (optional), giving the dates in the
       position; and
     * A bulleted list of your duties at that employer.
+
+    A Job is a :class:`collections.MutableSequence` of the items in
+    its description.  It is registered as one rather than inheriting
+    from it so that it can use ``__slots__``, since there may be very
+    many jobs in memory at once.
     """
+    __slots__ = ("employer", "position", "dates", "description",
+                 "filter_names")
 
     def __init__(self, employer=None, position=None, dates=None, start=None,
                  end="Present", description=None):
@@ -430,6 +676,10 @@ class Job(MutableSequence, Renderable, Parseable):  # pylint: disable=R0901
         else:
             self.description = description
 
+        #: The names that ``--include`` and ``--exclude`` match for
+        #: this job; see :func:`dmr.data.is_excluded`.
+        self.filter_names = []
+
     @classmethod
     def parse(cls, node, employer=None):  # pylint: disable=W0221
         """
@@ -468,6 +718,7 @@ class Job(MutableSequence, Renderable, Parseable):  # pylint: disable=R0901
                             description=[func(l) for l in self.description])
         if self.position:
             rv.position = func(self.position)
+        rv.filter_names = self.filter_names
         return rv
 
     def _get_start(self):
@@ -502,12 +753,40 @@ class Job(MutableSequence, Renderable, Parseable):  # pylint: disable=R0901
     def insert(self, idx, value):
         self.description.insert(idx, value)
 
+    def append(self, value):
+        self.description.append(value)
+
+    def extend(self, values):
+        self.description.extend(values)
+
+    def pop(self, idx=-1):
+        return self.description.pop(idx)
+
+    def remove(self, value):
+        self.description.remove(value)
+
+    def reverse(self):
+        self.description.reverse()
+
+    def index(self, value):
+        return self.description.index(value)
+
+    def count(self, value):
+        return self.description.count(value)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
     def __len__(self):
         return len(self.description)
 
     def __iter__(self):
         return iter(self.description)
 
+    def __reversed__(self):
+        return reversed(self.description)
+
     def __contains__(self, other):
         return other in self.description
 
@@ -520,6 +799,9 @@ class Job(MutableSequence, Renderable, Parseable):  # pylint: disable=R0901
             desc_str)
 
 
+MutableSequence.register(Job)
+
+
 class SectionType(object):
     """ This very simple descriptor class exists only to get the name
     of the owner class.  This way, every section can have a ``type``
@@ -532,7 +814,11 @@ class SectionType(object):
 
 
 class Section(list, Renderable, Parseable):
-    """ Abstract representation of a resume section """
+    """ Abstract representation of a resume section.  Section types
+    use ``__slots__``, since there may be very many sections in
+    memory at once; subclasses should declare their own (possibly
+    empty) ``__slots__``. """
+    __slots__ = ("name", "filter_names")
     allowed_child_node_types = [docutils.nodes.comment]
     required_child_node_types = []
     type = SectionType()
@@ -549,8 +835,13 @@ class Section(list, Renderable, Parseable):
         self.name = name
         list.__init__(self, [])
 
+        #: The names that ``--include`` and ``--exclude`` match for
+        #: this section; see :func:`dmr.data.is_excluded`.
+        self.filter_names = []
+
     def render(self, func):
         rv = self.__class__(func(self.name))
+        rv.filter_names = self.filter_names
         rv.extend([func(p) for p in self])
         return rv
 
@@ -562,14 +853,31 @@ class Section(list, Renderable, Parseable):
         :type node: docutils.nodes.Node
         :returns: An object of this type
         """
-        return cls(get_title(node))
+        rv = cls(get_title(node))
+        rv.filter_names = [filter_names(node)]
+        return rv
+
+    def view(self, include, exclude):  # pylint: disable=W0613,W0621
+        """ Get a view of this section that only contains the parts
+        that are not excluded by the given filters.  The view shares
+        its data with this section.
+
+        :param include: The names to include
+        :type include: list
+        :param exclude: The names to exclude
+        :type exclude: list
+        :returns: An object of this type
+        """
+        return self
 
     @classmethod
     def is_valid(cls, node):
         """ Return True if the node contains a valid section of this
         type, False otherwise.  Subclasses must not return false
-        positives in any case, since :func:`dmr.input.parse` does not
-        necessarily check sections in any particular order.
+        positives in any case, since a node is parsed as the first
+        registered section type that it is valid for.  The result
+        must only depend on the classes of the children of the node;
+        see :func:`dmr.data.register_section`.
 
         :param node: The node to check
         :type node: docutils.nodes.Node
@@ -585,6 +893,7 @@ class Section(list, Renderable, Parseable):
                              list.__repr__(self))
 
 
+@register_section
 class Text(Section):
     """ A Text section contains *only* freeform text -- an objective,
     for instance.  This is the simplest section.
@@ -606,6 +915,7 @@ class Text(Section):
         References Available Upon Request
         =================================
     """
+    __slots__ = ()
     allowed_child_node_types = Section.allowed_child_node_types + \
         [docutils.nodes.paragraph]
 
@@ -617,6 +927,7 @@ class Text(Section):
         return section
 
 
+@register_section
 class Experience(Section):
     """
     The Experience section is by far the most complex section.  It is
@@ -729,6 +1040,7 @@ class Experience(Section):
         * Dissertation: "Program Structure and Computational
           Complexity"
     """
+    __slots__ = ()
     allowed_child_node_types = Section.allowed_child_node_types + \
         [docutils.nodes.Structural, docutils.nodes.Titular,
          docutils.nodes.line_block]
@@ -736,9 +1048,22 @@ class Experience(Section):
 
     def render(self, func):
         rv = self.__class__(func(self.name))
+        rv.filter_names = self.filter_names
         rv.extend([job.render(func) for job in self])
         return rv
 
+    def view(self, include, exclude):  # pylint: disable=W0621
+        jobs = [j for j in self
+                if not is_excluded(j.filter_names, include, exclude)]
+        if len(jobs) == len(self):
+            return self
+        logger.debug("Skipping %s excluded jobs in %s" %
+                     (len(self) - len(jobs), self.name))
+        rv = self.__class__(self.name)
+        rv.filter_names = self.filter_names
+        rv.extend(jobs)
+        return rv
+
     @classmethod
     def parse(cls, node):
         section = super(Experience, cls).parse(node)
@@ -746,11 +1071,7 @@ class Experience(Section):
         for employernode in node.children:
             if not isinstance(employernode, docutils.nodes.Structural):
                 continue
-
-            if exclude(employernode):
-                logger.debug("Skipping excluded employer %s" %
-                             get_title(employernode))
-                continue
+            employer_names = filter_names(employernode)
 
             # Two ways this could be structured:
             # * With just employer (e.g., an Education section, which
@@ -768,18 +1089,18 @@ class Experience(Section):
                             logger.info("Skipping unknown node %s in job node"
                                         % jobnode)
                         continue
-                    if exclude(jobnode):
-                        logger.debug("Skipping excluded job %s" %
-                                     get_title(jobnode))
-                        continue
-
                     job = Job.parse(jobnode, employer=address)
+                    job.filter_names = [employer_names,
+                                        filter_names(jobnode)]
                     section.append(job)
             else:
-                section.append(Job.parse(employernode))
+                job = Job.parse(employernode)
+                job.filter_names = [employer_names]
+                section.append(job)
         return section
 
 
+@register_section
 class List(Section):
     """ A List section contains *only* a bulleted list -- for example,
     a list of publications, or related experience.
@@ -795,6 +1116,7 @@ class List(Section):
         * No seriously.
         * Invented a lot of UNIX, too.
      """
+    __slots__ = ()
     allowed_child_node_types = Section.allowed_child_node_types + \
         [docutils.nodes.bullet_list]
     required_child_node_types = [docutils.nodes.bullet_list]
@@ -807,6 +1129,7 @@ class List(Section):
         return section
 
 
+@register_section
 class References(Section):
     """ A References section contains *only* a series of :ref:`Address
     Blocks <input-address-block>`.
@@ -824,12 +1147,14 @@ class References(Section):
         | (908) 555-5555
         | dmr@lucent.com
     """
+    __slots__ = ()
     allowed_child_node_types = Section.allowed_child_node_types + \
         [docutils.nodes.line_block]
     required_child_node_types = [docutils.nodes.line_block]
 
     def render(self, func):
         rv = self.__class__(func(self.name))
+        rv.filter_names = self.filter_names
         rv.extend([contact.render(func) for contact in self])
         return rv
 
@@ -891,8 +1216,52 @@ class Document(list, Parseable):
         #: original doctree.
         self.source = source
 
+        #: The in-document options, as a dict of output format name
+        #: (or None for options that apply to all formats) to a list
+        #: of option strings.
+        self.options = dict()
+
+        #: The ``(include, exclude)`` filters that this document is a
+        #: view with (see :func:`dmr.data.Document.view`), or None if
+        #: it is not a view.
+        self.filters = None
+
+        #: All of the sections that were parsed, including those that
+        #: are excluded from this view, or None if this document is
+        #: not a view.
+        self.all_sections = None
+
+        #: The settings the document was parsed with, including its
+        #: in-document options: either :attr:`dmr.config.config` or a
+        #: :class:`dmr.config.Settings` object.  Output formats use
+        #: these settings.  This is None if the document was not
+        #: created by :func:`dmr.input.parse`.
+        self.settings = None
+
     @classmethod
-    def parse(cls, node):
+    def parse(cls, node, settings=config,
+              parsed=None):  # pylint: disable=W0221
+        """ Parse a document out of the given node.  Every section and
+        job is parsed, and a view of the document with the ``include``
+        and ``exclude`` options from the settings is returned; other
+        views can be made from it with
+        :func:`dmr.data.Document.view` without parsing the document
+        again.
+
+        :param node: The top-level section of the doctree to parse
+        :type node: docutils.nodes.Node
+        :param settings: The settings to parse the document with,
+                         instead of :attr:`dmr.config.config`
+        :type settings: dmr.config.Settings
+        :param parsed: Sections that have already been parsed (e.g.,
+                       by :mod:`dmr.incremental`), as a dict of the
+                       ``id()`` of a section node to the result of
+                       :func:`dmr.data.Document.parse_section` for it
+        :type parsed: dict
+        :returns: :class:`dmr.data.Document`
+        """
+        if parsed is None:
+            parsed = dict()
         doc = cls()
         doc.contact = Contact.parse(node)
 
@@ -904,22 +1273,115 @@ class Document(list, Parseable):
                     logger.info("Skipping unknown node %s" % data)
                 continue
 
-            if exclude(data):
-                logger.debug("Skipping excluded section %s" % get_title(data))
+            if id(data) in parsed:
+                section = parsed[id(data)]
+            else:
+                section = cls.parse_section(data)
+            if section is not None:
+                doc.append(section)
+        return doc.view(settings.include, settings.exclude)
+
+    @staticmethod
+    def parse_section(node):
+        """ Parse a top-level section of a document as the first
+        registered section type that it is valid for.
+
+        :param node: The section to parse
+        :type node: docutils.nodes.Structural
+        :returns: :class:`dmr.data.Section`, or None if the node is
+                  not a valid section of any type
+        """
+        sectiontype = section_type(node)
+        if sectiontype is None:
+            logger.info("Skipping unknown section %s" % get_title(node))
+            return None
+        with phase("Parsing section %s" % get_title(node).astext()):
+            return sectiontype.parse(node)
+
+    def view(self, include=(), exclude=()):  # pylint: disable=W0621
+        """ Get a view of this document that only contains the
+        sections and jobs that are not excluded by the given filters,
+        as with the ``--include`` and ``--exclude`` options.  Views
+        are always made from all of the sections that were parsed, so
+        a view can include sections that are excluded from the
+        document it was made from.  The view shares its contact,
+        sections, jobs, doctree, and in-document options with this
+        document; only the lists that hold them are new.
+
+        :param include: The names of sections, jobs, and groups to
+                        include
+        :type include: list
+        :param exclude: The names of sections, jobs, and groups to
+                        exclude
+        :type exclude: list
+        :returns: :class:`dmr.data.Document`
+        """
+        all_sections = self.all_sections
+        if all_sections is None:
+            all_sections = list(self)
+        rv = self.__class__(source=self.source, contact=self.contact)
+        for section in all_sections:
+            if is_excluded(section.filter_names, include, exclude):
+                logger.debug("Skipping excluded section %s" % section.name)
                 continue
+            rv.append(section.view(include, exclude))
+        rv.options = self.options
+        rv.settings = self.settings
+        rv.filters = (sorted(include), sorted(exclude))
+        rv.all_sections = all_sections
+        return rv
 
-            for sectiontype in sections:
-                if sectiontype.is_valid(data):
-                    doc.append(sectiontype.parse(data))
-                    break
-            else:
-                logger.info("Skipping unknown section %s" % get_title(data))
-        return doc
+    def compact(self, func):
+        """ Get a compact copy of this document that keeps the
+        rendered strings instead of the doctrees, for holding large
+        numbers of documents in memory (e.g., to search or sort
+        them).  Each doctree is rendered once with ``func``, so data
+        that is shared in this document (such as the employer of
+        several jobs) is shared in the copy; section and employer
+        names are interned with :func:`dmr.data.intern_name`.  The
+        copy only holds the sections in this view, and does not keep
+        the source doctree, so it cannot be rendered by an output
+        format.
+
+        :param func: The function to render doctrees with, as for
+                     :func:`dmr.data.Renderable.render`
+        :returns: :class:`dmr.data.Document`
+        """
+        rendered = dict()
+
+        def render(node):
+            """ Render a doctree once, however many times it is used """
+            try:
+                return rendered[id(node)][1]
+            except KeyError:
+                # keep the node so that its id cannot be reused
+                rendered[id(node)] = (node, func(node))
+                return rendered[id(node)][1]
+
+        employers = dict()
+        sections = []  # pylint: disable=W0621
+        for section in self:
+            compacted = section.render(render)
+            compacted.name = intern_name(compacted.name)
+            if isinstance(section, Experience):
+                for job, cjob in zip(section, compacted):
+                    if id(job.employer) not in employers:
+                        employers[id(job.employer)] = cjob.employer._replace(
+                            name=intern_name(cjob.employer.name))
+                    cjob.employer = employers[id(job.employer)]
+            sections.append(compacted)
+        rv = self.__class__(contact=self.contact.render(render),
+                            sections=sections)
+        rv.options = self.options
+        rv.settings = self.settings
+        rv.filters = self.filters
+        return rv
 
     @property
     def sections(self):
         """ A list of names of the sections contained in this document """
-        return [s.name.astext() for s in self]
+        return [s.name.astext() if isinstance(s.name, docutils.nodes.Node)
+                else s.name for s in self]
 
     def __repr__(self):
         return "%s(%s): %s" % (self.__class__.__name__, self.contact,
@@ -930,7 +1392,3 @@ class Document(list, Parseable):
             return list.index(val)
         except ValueError:
             return self.sections.index(val)
-
-
-sections = [c for c in globals().values()  # pylint: disable=C0103
-            if Section in getattr(c, "__mro__", []) and c != Section]
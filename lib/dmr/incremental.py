@@ -0,0 +1,433 @@
+""" Incremental parsing of dmr documents.
+
+Parsing a long document with docutils is slow, and when a document is
+parsed again after a small change (e.g., by ``dmr --watch`` or by a
+:mod:`dmr.server`), most of it has not changed.  With
+``--incremental``, :func:`dmr.input.parse` splits the source into a
+*header* -- the title, the contact information, and anything else
+before the first top-level section -- and a *chunk* for each
+top-level section.  Each chunk is parsed together with the header, so
+that docutils parses it in the same context as it would in the whole
+document, and the section is then parsed into a
+:class:`dmr.data.Section`.  The results are kept in a
+:class:`dmr.cache.ChunkCache`, keyed by the text of the chunk and of
+the header, so when a document is parsed again, only the chunks that
+changed are parsed; the rest are loaded from the cache, and the
+doctrees of all of them are stitched together into one.
+
+The source is split by looking for lines that look like section
+titles, so the split is checked against the doctrees that the chunks
+are parsed into.  A document is parsed as a whole instead if it
+cannot be split that way, or if its chunks are not independent of
+each other: e.g., if sections in two different chunks have the same
+title (and so the same target name), or if it has automatically
+numbered footnotes.  Either way, the result is the same as that of
+parsing the whole document at once.
+
+The same split lets the chunks of a long document be parsed in
+parallel: with ``--parse-processes``, the chunks that need to be
+parsed are parsed in a pool of worker processes, which send back the
+doctrees and sections serialized with :func:`dmr.cache.dumps`, and
+they are stitched together in their original order.  Starting the
+worker processes and serializing the results has a cost, so this
+only pays off for long documents (e.g., a CV with hundreds of
+publications) on a machine with several CPUs.
+"""
+
+import re
+import bisect
+import multiprocessing
+import docutils.nodes
+from docutils.parsers.rst import Parser, states, roles
+from docutils.statemachine import StringList, string2lines
+from docutils.utils import new_document
+from dmr.cache import dumps, loads
+from dmr.data import Document, sections
+from dmr.logger import logger
+from dmr.profile import phase
+from dmr.render import default_settings
+
+__all__ = ["split", "parse_source"]
+
+#: A line that may be a section title underline or overline: a single
+#: punctuation character, repeated
+_ADORNMENT = re.compile(r'([!-/:-@[-`{-~])\1* *$')
+
+#: Document attributes that map a name or id to a single value
+_REGISTRIES = ["ids", "nameids", "nametypes", "substitution_defs",
+               "substitution_names"]
+
+#: Document attributes that map a name or id to a list of nodes
+_REFERENCES = ["refnames", "refids", "footnote_refs", "citation_refs"]
+
+#: Document attributes that are lists of nodes
+_LISTS = ["indirect_targets", "autofootnotes", "autofootnote_refs",
+          "symbol_footnotes", "symbol_footnote_refs", "footnotes",
+          "citations", "parse_messages", "transform_messages"]
+
+
+class _LinesParser(Parser):
+    """ A reST parser that parses a
+    :class:`docutils.statemachine.StringList` instead of a string, so
+    that the nodes and messages for the lines of a chunk have the
+    line numbers of those lines in the whole document. """
+
+    def parse(self, inputstring, document):
+        self.setup_parse(inputstring, document)
+        self.statemachine = states.RSTStateMachine(
+            state_classes=self.state_classes,
+            initial_state=self.initial_state,
+            debug=document.reporter.debug_flag)
+        self.statemachine.run(inputstring, document, inliner=self.inliner)
+        # restore the "default" default role, as Parser.parse does
+        if '' in roles._roles:  # pylint: disable=W0212
+            del roles._roles['']  # pylint: disable=W0212
+        self.finish_parse()
+
+
+def _headings(lines):
+    """ Find the lines of a document that look like section titles.
+
+    :param lines: The lines of the document
+    :type lines: list of str
+    :returns: generator of tuples of ``(index, style)``, where
+              ``index`` is the index of the first line of the title
+              (its overline, if it has one), and ``style`` is its
+              adornment style, as docutils records it: the underline
+              character, or the overline and underline characters
+    """
+    start = True  # whether a new block may start on this line
+    i = 0
+    while i < len(lines) - 1:
+        line = lines[i]
+        adornment = _ADORNMENT.match(line)
+        if start and adornment:
+            if (i + 2 < len(lines) and lines[i + 1].strip() and
+                    _ADORNMENT.match(lines[i + 2]) and
+                    lines[i + 2][0] == line[0]):
+                yield i, line[0] * 2
+                i += 3
+                continue
+        elif start and line[:1].strip() and _ADORNMENT.match(lines[i + 1]):
+            underline = lines[i + 1].rstrip()
+            if len(underline) >= min(4, len(line.rstrip())):
+                yield i, underline[0]
+                i += 2
+                continue
+        start = not line.strip()
+        i += 1
+
+
+def split(lines):
+    """ Split the lines of a document into a header and a chunk for
+    each top-level section, by looking for titles with the second
+    adornment style in the document.  This does not parse the
+    document, so the split may be wrong (e.g., if a literal block
+    contains a line that looks like a section title), and must be
+    checked against the result of parsing the chunks.
+
+    :param lines: The lines of the document
+    :type lines: list of str
+    :returns: list of int - The index of the first line of each
+              chunk, or None if the document has no top-level
+              sections, or if some chunk would not give its title
+              styles the same section levels when it is parsed after
+              the header as when it is parsed after everything that
+              precedes it
+    """
+    headings = list(_headings(lines))
+    styles = []
+    for _, style in headings:
+        if style not in styles:
+            styles.append(style)
+    if len(styles) < 2:
+        return None
+    starts = [i for i, style in headings if style == styles[1]]
+
+    # the title styles of the header, and of each chunk, in the order
+    # they first appear in
+    header = []
+    chunks = [[] for _ in starts]
+    for i, style in headings:
+        chunk = bisect.bisect_right(starts, i) - 1
+        used = header if chunk < 0 else chunks[chunk]
+        if style not in used:
+            used.append(style)
+
+    seen = header
+    for used in chunks:
+        alone = header + [s for s in used if s not in header]
+        together = seen + [s for s in used if s not in seen]
+        if any(alone.index(s) != together.index(s) for s in used):
+            logger.debug("Title styles of chunk are inconsistent: %s" %
+                         used)
+            return None
+        seen = together
+    return starts
+
+
+def _parse(lines, offsets, name):
+    """ Parse lines of a document with docutils.
+
+    :param lines: The lines to parse
+    :type lines: list of str
+    :param offsets: The index of each line in the whole document
+    :type offsets: list of int
+    :param name: The name of the document, used in messages
+    :type name: str
+    :returns: :class:`docutils.nodes.document`
+    """
+    document = new_document(name, default_settings(Parser))
+    lines = StringList(lines, items=[(name, offset) for offset in offsets])
+    with phase("Parsing document with docutils"):
+        _LinesParser().parse(lines, document)
+    return document
+
+
+def _get_top(document):
+    """ Get the only top-level section of a document, or None """
+    top = [child for child in document.children
+           if isinstance(child, docutils.nodes.Structural)]
+    if len(top) == 1:
+        return top[0]
+    return None
+
+
+def _chunk_section(chunk, shape):
+    """ Get the top-level section that a chunk was parsed into.
+
+    :param chunk: The document that the chunk was parsed into
+    :type chunk: docutils.nodes.document
+    :param shape: The number of children of the header's document,
+                  and of its top-level section
+    :type shape: tuple
+    :returns: :class:`docutils.nodes.section`, or None if the chunk
+              does not hold exactly one top-level section after the
+              header
+    """
+    top = _get_top(chunk)
+    if (top is None or len(chunk.children) != shape[0] or
+            len(top.children) != shape[1] + 1 or
+            not isinstance(top.children[-1], docutils.nodes.section)):
+        return None
+    return top.children[-1]
+
+
+def _parse_chunk(header, lines, start, name, shape):
+    """ Parse a chunk of a document after its header, and parse its
+    section into a :class:`dmr.data.Section` if it holds exactly one
+    top-level section.
+
+    :param header: The lines of the header
+    :type header: list of str
+    :param lines: The lines of the chunk
+    :type lines: list of str
+    :param start: The index of the first line of the chunk in the
+                  document
+    :type start: int
+    :param name: The name of the document, used in messages
+    :type name: str
+    :param shape: The shape of the header, as for
+                  :func:`dmr.incremental._chunk_section`
+    :type shape: tuple
+    :returns: tuple of ``(document, section, start)``, where
+              ``section`` is the :class:`dmr.data.Section` or None
+    """
+    chunk = _parse(header + lines,
+                   range(len(header)) + range(start, start + len(lines)),
+                   name)
+    node = _chunk_section(chunk, shape)
+    section = None
+    if node is not None:
+        section = Document.parse_section(node)
+    return chunk, section, start
+
+
+def _parse_chunk_serialized(args):
+    """ Parse a chunk in a worker process, given a tuple of the
+    arguments to :func:`dmr.incremental._parse_chunk`, and serialize
+    the results with :func:`dmr.cache.dumps` to send them back. """
+    rv = _parse_chunk(*args)
+    return dumps(rv, rv[0])
+
+
+def _parse_chunks(tasks, processes=1):
+    """ Parse chunks of a document, in a pool of worker processes if
+    there is more than one process and more than one chunk.
+
+    :param tasks: A tuple of the arguments to
+                  :func:`dmr.incremental._parse_chunk` for each chunk
+    :type tasks: list of tuples
+    :param processes: The number of processes to use
+    :type processes: int
+    :returns: list of the results of
+              :func:`dmr.incremental._parse_chunk`, in order
+    """
+    if processes <= 1 or len(tasks) <= 1:
+        return [_parse_chunk(*task) for task in tasks]
+    processes = min(processes, len(tasks))
+    with phase("Parsing sections in %s processes" % processes):
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_parse_chunk_serialized, tasks, chunksize=1)
+        finally:
+            pool.terminate()
+        return [loads(result) for result in results]
+
+
+def _counts(document):
+    """ Count the entries in the lists of nodes that a document
+    keeps, so that the entries a chunk adds to those of the header
+    can be told apart. """
+    rv = dict((attr, len(getattr(document, attr))) for attr in _LISTS)
+    for attr in _REFERENCES:
+        rv[attr] = dict((key, len(val))
+                        for key, val in getattr(document, attr).items())
+    return rv
+
+
+def _merge(document, chunk, counts, added):
+    """ Add the names, ids, and other nodes that a chunk's document
+    keeps track of to the stitched document, unless they conflict
+    with those of the header or of other chunks.
+
+    :param document: The stitched document, which is the header's
+    :type document: docutils.nodes.document
+    :param chunk: The document that the chunk was parsed into
+    :type chunk: docutils.nodes.document
+    :param counts: The counts of the header's entries, from
+                   :func:`dmr.incremental._counts`
+    :type counts: dict
+    :param added: A dict of attribute name to the set of keys that
+                  other chunks have added to that attribute
+    :type added: dict
+    :returns: bool - False if the chunk depends on the header or on
+              other chunks, in which case the document may be
+              partially merged
+    """
+    if chunk.id_counter != document.id_counter:
+        # automatically generated ids depend on what came before
+        return False
+    for attr in _REGISTRIES:
+        target = getattr(document, attr)
+        for key, val in getattr(chunk, attr).items():
+            if key in added[attr]:
+                return False
+            elif key not in target:
+                target[key] = val
+                added[attr].add(key)
+            elif isinstance(val, docutils.nodes.Node):
+                # the chunk's copy of a node in the header must be
+                # unchanged, e.g., not marked as a duplicate name
+                if val.attributes != target[key].attributes:
+                    return False
+            elif val != target[key]:
+                return False
+    for attr in _REFERENCES:
+        target = getattr(document, attr)
+        for key, val in getattr(chunk, attr).items():
+            target.setdefault(key, []).extend(
+                val[counts[attr].get(key, 0):])
+    for attr in _LISTS:
+        getattr(document, attr).extend(getattr(chunk, attr)[counts[attr]:])
+    return True
+
+
+def _adopt(document, node, delta):
+    """ Make the nodes in a doctree part of the given document, and
+    move their line numbers by ``delta`` lines. """
+    for child in node.traverse():
+        if child.document is not None:
+            child.document = document
+        if delta:
+            if child.line is not None:
+                child.line += delta
+            if (isinstance(child, docutils.nodes.system_message) and
+                    child.get('line')):
+                child['line'] += delta
+
+
+def parse_source(source, name="<string>", cache=None, processes=1):
+    """ Parse a document from a string with docutils, one top-level
+    section at a time, reusing the results for sections that have
+    been parsed before, and parsing the rest in parallel.
+
+    :param source: The document source
+    :type source: str
+    :param name: The name of the source, used in messages
+    :type name: str
+    :param cache: The cache of parsed chunks to use, or None to parse
+                  every chunk
+    :type cache: dmr.cache.ChunkCache
+    :param processes: The number of worker processes to parse chunks
+                      in.  With 1, chunks are parsed in this process.
+    :type processes: int
+    :returns: tuple of ``(document, parsed)``, where ``document`` is
+              the :class:`docutils.nodes.document` and ``parsed`` is
+              a dict of sections that have already been parsed, to
+              pass to :func:`dmr.data.Document.parse`; or None if the
+              document must be parsed as a whole
+    """
+    settings = default_settings(Parser)
+    lines = string2lines(source, tab_width=settings.tab_width,
+                         convert_whitespace=True)
+    starts = split(lines)
+    if not starts:
+        logger.info("Parsing %s as a whole: Could not split it into "
+                    "sections" % name)
+        return None
+    bounds = zip(starts, starts[1:] + [len(lines)])
+
+    header = lines[:starts[0]]
+    document = header_key = None
+    if cache is not None:
+        header_key = cache.key("\n".join(header), name)
+        document = cache.get(header_key)
+    if document is None:
+        document = _parse(header, range(len(header)), name)
+        if cache is not None:
+            cache.put(header_key, document, document)
+    top = _get_top(document)
+    if top is None:
+        logger.info("Parsing %s as a whole: Header has no title" % name)
+        return None
+    shape = (len(document.children), len(top.children))
+
+    keys = [None] * len(bounds)
+    results = [None] * len(bounds)
+    if cache is not None:
+        # registered section types change the result of a parse
+        types = ["%s.%s" % (c.__module__, c.__name__) for c in sections]
+        for i, (start, end) in enumerate(bounds):
+            keys[i] = cache.key("\n".join(lines[start:end]), name,
+                                header_key, types)
+            results[i] = cache.get(keys[i])
+    missing = [i for i, result in enumerate(results) if result is None]
+    fresh = set(missing)
+    tasks = [(header, lines[bounds[i][0]:bounds[i][1]], bounds[i][0], name,
+              shape) for i in missing]
+    for i, result in zip(missing, _parse_chunks(tasks, processes)):
+        results[i] = result
+
+    counts = _counts(document)
+    added = dict((attr, set()) for attr in _REGISTRIES)
+    parsed = dict()
+    for i, (start, _) in enumerate(bounds):
+        chunk, section, offset = results[i]
+        node = _chunk_section(chunk, shape)
+        if node is None:
+            logger.info("Parsing %s as a whole: Line %s does not start "
+                        "exactly one top-level section" % (name, start + 1))
+            return None
+        if not _merge(document, chunk, counts, added):
+            logger.info("Parsing %s as a whole: The section at line %s "
+                        "depends on other sections" % (name, start + 1))
+            return None
+        if cache is not None and i in fresh:
+            cache.put(keys[i], results[i], chunk)
+        _adopt(document, node, start - offset)
+        top.append(node)
+        parsed[id(node)] = section
+    logger.info("Parsed %s of %s sections of %s" %
+                (len(missing), len(starts), name))
+    return document, parsed
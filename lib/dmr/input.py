@@ -1,49 +1,147 @@
 """ Input parsing routines for dmr. """
 
 import sys
+import threading
 from dmr.config import config, parse_document_options
-from dmr.data import Document, child_by_class
+from dmr.cache import ParseCache, ChunkCache
+from dmr.data import Document, child_by_class, sections
 from dmr.logger import logger, fatal
+from dmr.profile import phase
+from dmr.render import default_settings
 import docutils.nodes
-from docutils.utils import new_document
-from docutils.frontend import OptionParser
-from docutils.parsers.rst import Parser
+from docutils.utils import new_document, SystemMessage
+from docutils.parsers.rst import Parser, states
 
-__all__ = ['parse']
+__all__ = ['DocumentError', 'parse', 'parse_source', 'for_format']
 
 
-def parse(filehandle):
-    """ Parse a document read from the given filehandle into a
-    :class:`dmr.data.Document` object.
+class _NestedStateMachineCache(threading.local):
+    """ A per-thread replacement for the cache of nested state machines
+    that the reST parser shares between all parsers
+    (:attr:`docutils.parsers.rst.states.RSTState.nested_sm_cache`).
+    The parser uses a state machine after returning it to the cache,
+    so with a shared cache, concurrent parses in different threads can
+    corrupt each other.  The parser only pops from and appends to the
+    cache. """
 
-    The document must contain:
+    def __init__(self):
+        super(_NestedStateMachineCache, self).__init__()
+        self.machines = []
 
-    * A top-level title, the resume owner's name;
-    * A :class:`docutils.nodes.line_block` containing contact
-      information for the resume, to be parsed with
-      :func:`dmr.data.Contact.parse`; and
-    * Any number of subsections that conform to the restrictions of
-      the various :class:`dmr.data.Section` subclasses.
+    def pop(self):
+        return self.machines.pop()
 
-    :param filehandle: The file-like object to parse the document from.
-    :type filehandle: file
+    def append(self, machine):
+        self.machines.append(machine)
+
+
+states.RSTState.nested_sm_cache = _NestedStateMachineCache()
+
+
+class DocumentError(ValueError):
+    """ Raised by :func:`dmr.input.parse` and
+    :func:`dmr.input.parse_source` when a document cannot be read or
+    parsed, if they were given settings.  Without settings, the error
+    is fatal instead. """
+    pass
+
+
+def _error(msg, settings=None):
+    """ Report an error in reading or parsing a document.
+
+    :param msg: The error message
+    :type msg: str
+    :param settings: The settings the document was parsed with, or
+                     None if it was parsed with
+                     :attr:`dmr.config.config`
+    :type settings: dmr.config.Settings
+    :raises: :exc:`dmr.input.DocumentError` if settings were given,
+             :exc:`SystemExit` otherwise
+    """
+    if settings is None:
+        fatal(msg)
+    raise DocumentError(msg)
+
+
+def _get_cache(settings=config, cls=ParseCache):
+    """ Get the :class:`dmr.cache.ParseCache` to use, according to
+    the configuration.
+
+    :param settings: The settings to use instead of
+                     :attr:`dmr.config.config`
+    :type settings: dmr.config.Settings
+    :param cls: The cache class to use
+    :type cls: type
+    :returns: :class:`dmr.cache.ParseCache`, or None if the parse
+              cache is disabled
+    """
+    if not getattr(settings, "cache", False) or not settings.cache_dir:
+        return None
+    maxsize = None
+    if settings.cache_size is not None:
+        maxsize = int(settings.cache_size) * 1024 * 1024
+    return cls(settings.cache_dir, maxsize=maxsize)
+
+
+def _apply_document_options(options, settings=None):
+    """ Apply the default and format-specific in-document options
+    found in a document.
+
+    :param options: A dict of format name (or None for options that
+                    apply to all formats) to a list of option strings
+    :type options: dict
+    :param settings: The settings to apply the options to.  If this
+                     is None, the options are applied to
+                     :attr:`dmr.config.config`.
+    :type settings: dmr.config.Settings
+    :returns: The settings with the options applied; either
+              :attr:`dmr.config.config` or a new
+              :class:`dmr.config.Settings` object
+    """
+    if settings is not None:
+        return settings.with_document_options(options)
+    for ofmt in [None, config.format]:
+        if ofmt in options:
+            parse_document_options(options[ofmt])
+    return config
+
+
+def _view(doc, settings=config):
+    """ Get a view of a parsed document with the include and exclude
+    options from the given settings.
+
+    :param doc: The parsed document
+    :type doc: dmr.data.Document
+    :param settings: The settings to use instead of
+                     :attr:`dmr.config.config`
+    :type settings: dmr.config.Settings
     :returns: :class:`dmr.data.Document`
     """
-    parser = Parser()
-    settings = OptionParser(components=(Parser,)).get_default_values()
-    logger.info("Parsing document from %s" % filehandle.name)
-    document = new_document(filehandle.name, settings)
-    try:
-        parser.parse(filehandle.read(), document)
-    except IOError:
-        fatal("Could not parse %s: %s" % (filehandle.name, sys.exc_info()[1]))
+    rv = doc.view(settings.include, settings.exclude)
+    rv.settings = settings
+    return rv
+
 
+def _get_top(document):
+    """ Get the top-level section and the in-document options from a
+    parsed docutils document.
+
+    :param document: The parsed docutils document
+    :type document: docutils.nodes.document
+    :returns: tuple of ``(top, options)``, where ``top`` is a
+              :class:`docutils.nodes.Structural` node and
+              ``options`` is a dict of format name (or None) to a list
+              of option strings
+    :raises: :exc:`dmr.input.DocumentError` if the document does not
+             have exactly one top-level heading
+    """
     top = None
     options = dict()
     for child in document.children:
         if isinstance(child, docutils.nodes.Structural):
             if top:
-                fatal("Document must have exactly one top-level heading")
+                raise DocumentError("Document must have exactly one "
+                                    "top-level heading")
             top = child
         elif isinstance(child, docutils.nodes.comment):
             contents = child_by_class(child, docutils.nodes.Text)
@@ -61,11 +159,151 @@ def parse(filehandle):
                 options[ofmt] = opts[1:]
         else:
             logger.info("Skipping unknown node %s" % child)
+    if top is None:
+        raise DocumentError("Document must have exactly one top-level "
+                            "heading")
+    return top, options
 
-    for ofmt in [None, config.format]:
-        if ofmt in options:
-            parse_document_options(options[ofmt])
 
-    doc = Document.parse(top)
+def for_format(doc):
+    """ Prepare a parsed document to be rendered in the output format
+    currently selected with :func:`dmr.config.select_format`.  This
+    applies the in-document options for that format, and returns a
+    view of the document (see :func:`dmr.data.Document.view`) with
+    the sections those options include or exclude.
+
+    :param doc: A document returned by :func:`dmr.input.parse`
+    :type doc: dmr.data.Document
+    :returns: :class:`dmr.data.Document`
+    """
+    _apply_document_options(doc.options)
+    return _view(doc)
+
+
+def parse(filehandle, settings=None):
+    """ Parse a document read from the given filehandle into a
+    :class:`dmr.data.Document` object.
+
+    The document must contain:
+
+    * A top-level title, the resume owner's name;
+    * A :class:`docutils.nodes.line_block` containing contact
+      information for the resume, to be parsed with
+      :func:`dmr.data.Contact.parse`; and
+    * Any number of subsections that conform to the restrictions of
+      the various :class:`dmr.data.Section` subclasses.
+
+    Every section is parsed, and a view of the document (see
+    :func:`dmr.data.Document.view`) with the ``include`` and
+    ``exclude`` options is returned.  Unless the parse cache is
+    disabled, the results are cached with
+    :class:`dmr.cache.ParseCache`, and a document that has already
+    been parsed is loaded from the cache instead of being parsed
+    again, whatever its options.  With the ``incremental`` option,
+    a document that has changed is parsed with
+    :func:`dmr.incremental.parse_source`, so that only the top-level
+    sections that changed are parsed again; with ``parse_processes``
+    greater than 1, its top-level sections are parsed in that many
+    worker processes.
+
+    :param filehandle: The file-like object to parse the document from.
+    :type filehandle: file
+    :param settings: The settings to parse the document with.  If
+                     this is None, :attr:`dmr.config.config` is used,
+                     and the in-document options are applied to it;
+                     otherwise, the in-document options are applied
+                     to a copy of the settings, which is stored in
+                     the ``settings`` attribute of the document.
+    :type settings: dmr.config.Settings
+    :returns: :class:`dmr.data.Document`
+    :raises: :exc:`dmr.input.DocumentError` if the document cannot be
+             read or parsed and settings were given; without
+             settings, the error is fatal
+    """
+    logger.info("Parsing document from %s" % filehandle.name)
+    try:
+        with phase("Reading input"):
+            source = filehandle.read()
+    except IOError:
+        _error("Could not read %s: %s" % (filehandle.name, sys.exc_info()[1]),
+               settings)
+    return parse_source(source, filehandle.name, settings=settings)
+
+
+def parse_source(source, name="<string>", settings=None):
+    """ Parse a document from a string into a
+    :class:`dmr.data.Document` object.  See :func:`dmr.input.parse`
+    for details.
+
+    :param source: The document source
+    :type source: str
+    :param name: The name of the source, used in messages
+    :type name: str
+    :param settings: The settings to parse the document with, or None
+                     to use :attr:`dmr.config.config`
+    :type settings: dmr.config.Settings
+    :returns: :class:`dmr.data.Document`
+    :raises: :exc:`dmr.input.DocumentError` if the document cannot be
+             parsed and settings were given; without settings, the
+             error is fatal
+    """
+    base_settings = settings
+    if settings is None:
+        settings = config
+    cache = _get_cache(settings)
+    if cache is not None:
+        # registered section types change the result of a parse
+        types = ["%s.%s" % (c.__module__, c.__name__) for c in sections]
+        key = cache.key(source, name, types)
+        with phase("Loading parse cache"):
+            cached = cache.get(key)
+        if cached is not None:
+            options, doc = cached
+            doc.options = options
+            return _view(doc, _apply_document_options(options, base_settings))
+
+    document = parsed = None
+    processes = getattr(settings, "parse_processes", None) or 1
+    if getattr(settings, "incremental", False) or processes > 1:
+        # only needed to parse by sections
+        import dmr.incremental
+        chunks = None
+        if getattr(settings, "incremental", False):
+            chunks = _get_cache(settings, ChunkCache) or ChunkCache(None)
+        try:
+            with phase("Parsing document by sections"):
+                incremental = dmr.incremental.parse_source(
+                    source, name, cache=chunks, processes=processes)
+        except (IOError, SystemMessage):
+            _error("Could not parse %s: %s" % (name, sys.exc_info()[1]),
+                   base_settings)
+        if incremental is not None:
+            document, parsed = incremental
+
+    if document is None:
+        parser = Parser()
+        docsettings = default_settings(Parser)
+        document = new_document(name, docsettings)
+        try:
+            with phase("Parsing document with docutils"):
+                parser.parse(source, document)
+        except (IOError, SystemMessage):
+            _error("Could not parse %s: %s" % (name, sys.exc_info()[1]),
+                   base_settings)
+
+    try:
+        top, options = _get_top(document)
+    except DocumentError:
+        _error("Could not parse %s: %s" % (name, sys.exc_info()[1]),
+               base_settings)
+    settings = _apply_document_options(options, base_settings)
+
+    with phase("Parsing document"):
+        doc = Document.parse(top, settings=settings, parsed=parsed)
     doc.source = document
+    doc.options = options
+    if cache is not None:
+        with phase("Writing parse cache"):
+            cache.put(key, (options, doc), document)
+    doc.settings = settings
     return doc
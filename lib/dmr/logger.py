@@ -10,16 +10,27 @@ __all__ = ["logger", "fatal"]
 #:output.
 logger = logging.getLogger(sys.argv[0])
 
+#: The handlers added to :attr:`dmr.logger.logger` by the most recent
+#: call to :func:`dmr.logger.setup_logging`
+_HANDLERS = []
+
 
 def setup_logging(verbose=0):
     """ Set up logging according to the verbose level given on the
-    command line.
+    command line.  Handlers added by a previous call are removed
+    first, so this can be called again to reconfigure logging (e.g.,
+    for each request handled by :func:`dmr.server.serve`).
 
     :param verbose: Verbose level.  0 through 3 are specifically
                     handled; higher means more verbose.
     :type verbose: int
     :returns: logging.RootLogger - :attr:`dmr.logger.logger`
     """
+    while _HANDLERS:
+        handler = _HANDLERS.pop()
+        logger.removeHandler(handler)
+        handler.close()
+
     stderr = logging.StreamHandler()
     level = logging.WARNING
     if verbose == 1:
@@ -37,6 +48,7 @@ def setup_logging(verbose=0):
     syslog = logging.handlers.SysLogHandler("/dev/log")
     syslog.setFormatter(logging.Formatter("%(name)s: %(message)s"))
     logger.addHandler(syslog)
+    _HANDLERS.extend([stderr, syslog])
     logger.debug("Setting verbose to %s" % verbose)
     return logger
 
@@ -1,12 +1,14 @@
-""" Base package for all dmr output formats """
+""" Base package for all dmr output formats.
 
-import sys
-from pkgutil import walk_packages
+The available output formats are listed statically in ``__all__``
+rather than discovered by importing every module in this package, so
+that only the module for the selected output format (and its
+dependencies, e.g., Genshi or a docutils writer) is imported; see
+:func:`dmr.config._get_output_class`.  To add a new output format,
+add its module to ``__all__``. """
 
-__all__ = []
-
-for _mod in walk_packages(path=__path__, prefix=__name__ + "."):
-    _modname = _mod[1]
-    __import__(_modname)
-    if getattr(sys.modules[_modname], "__expose__", True):
-        __all__.append(_modname)
+__all__ = ["dmr.output.html",
+           "dmr.output.json",
+           "dmr.output.jsonl",
+           "dmr.output.latex",
+           "dmr.output.text"]
@@ -1,8 +1,6 @@
 """ Base dmr output module. """
 
-#: Do not expose the output class defined in this module as a usable
-#: output format.
-__expose__ = False
+from dmr.config import config
 
 
 class ClassName(object):
@@ -19,14 +17,38 @@ class BaseOutput(object):
     inherit from this class. """
     name = ClassName()
 
-    def __init__(self, document):
+    #: The usual file extension for files written in this output
+    #: format, without the leading dot.  If this is None, the name of
+    #: the output format module is used.
+    extension = None
+
+    #: The number of bytes of output to collect before writing them in
+    #: :func:`dmr.output.base.BaseOutput.write_chunks`
+    buffer_size = 64 * 1024
+
+    #: Whether the output of several documents can be appended to a
+    #: single file.  ``dmr batch`` appends to the output file of an
+    #: appendable output format, rather than overwriting it.
+    appendable = False
+
+    def __init__(self, document, settings=None):
         """
         :param document: The DMR document to output
         :type document: dmr.data.Document
+        :param settings: The settings to output the document with.
+                         By default, the settings the document was
+                         parsed with are used, or
+                         :attr:`dmr.config.config` if it has none.
+        :type settings: dmr.config.Settings
         """
         #: The :class:`dmr.data.Document` object to output
         self.document = document
 
+        #: The settings to output the document with
+        self.settings = settings
+        if self.settings is None:
+            self.settings = getattr(document, "settings", None) or config
+
     @classmethod
     def get_options(cls):
         """ Get a list of options to parse from the config files and
@@ -43,3 +65,36 @@ class BaseOutput(object):
         :returns: str - The document output
         """
         raise NotImplementedError
+
+    def output_to(self, fileobj):
+        """ Write the document output as rendered by this output
+        format to a file-like object.  By default, this writes the
+        result of :func:`dmr.output.base.BaseOutput.output`; child
+        classes can override it to write their output as it is
+        rendered, without holding all of it in memory at once.
+
+        :param fileobj: The file-like object to write to
+        :type fileobj: file
+        """
+        fileobj.write(self.output())
+
+    def write_chunks(self, fileobj, chunks):
+        """ Write chunks of output to a file-like object as they are
+        produced.  Small chunks are collected and written together,
+        in writes of about
+        :attr:`dmr.output.base.BaseOutput.buffer_size` bytes.
+
+        :param fileobj: The file-like object to write to
+        :type fileobj: file
+        :param chunks: An iterable of strings to write
+        """
+        buf = []
+        size = 0
+        for chunk in chunks:
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= self.buffer_size:
+                fileobj.write("".join(buf))
+                buf = []
+                size = 0
+        fileobj.write("".join(buf))
@@ -1,22 +1,33 @@
 """ `Genshi`_ helper output format for dmr.  This helper output module
 should not be called by itself, but can be used by other output
-modules to easily add Genshi templating abilities. """
+modules to easily add Genshi templating abilities.
+
+Loaded templates are kept in :data:`dmr.output.genshi.templates`, a
+process-wide :class:`dmr.output.genshi.TemplateCache` shared by all
+Genshi output formats, so a template is only parsed once per process
+unless the template file changes.  With ``--template-cache-dir``,
+parsed templates are also stored on disk, so that new processes do
+not need to parse them either. """
 
 from __future__ import absolute_import
 import os
+import sys
+import hashlib
+import tempfile
+import cPickle as pickle
 from pkg_resources import resource_filename  # pylint: disable=E0611
+import genshi
 import genshi.core
+import genshi.output
 import genshi.template
-from dmr.render import WriterRenderer
+import dmr.version
+from dmr.render import WriterRenderer, BatchRenderer, LRUCache
 from dmr.logger import logger
+from dmr.profile import phase
 from dmr.config import config, DMROption
 from dmr.output.base import BaseOutput
 
-__all__ = ["GenshiOutput"]
-
-#: Do not expose the output class defined in this module as a usable
-#: output format.
-__expose__ = False
+__all__ = ["GenshiOutput", "TemplateCache", "templates"]
 
 
 def removecomment(stream):
@@ -33,6 +44,183 @@ def removecomment(stream):
         yield kind, data, pos
 
 
+class TemplateCache(object):
+    """ A cache of loaded Genshi templates, keyed by the path and
+    modification time of the template file, so that a template is
+    loaded again when it changes.  It is safe to share between
+    threads. """
+
+    #: The suffix of on-disk cache entry files
+    suffix = ".tmpl"
+
+    def __init__(self, maxsize=32):
+        """
+        :param maxsize: The maximum number of templates to keep in
+                        memory
+        :type maxsize: int
+        """
+        #: The loaded templates, keyed by ``(path, mtime, size,
+        #: class, search path)``
+        self.memory = LRUCache(maxsize=maxsize)
+
+        # template loaders for included templates, keyed by search
+        # path
+        self._loaders = LRUCache(maxsize=maxsize)
+
+    @staticmethod
+    def find(name, search_path):
+        """ Find a template file in the same way as
+        :class:`genshi.template.TemplateLoader`.
+
+        :param name: The template name, relative to the search path,
+                     or an absolute path
+        :type name: str
+        :param search_path: The directories to search for the template
+        :type search_path: list
+        :returns: str - The absolute path to the template file
+        :raises: :exc:`genshi.template.TemplateNotFound`
+        """
+        if os.path.isabs(name):
+            if os.path.isfile(name):
+                return name
+        else:
+            for dirname in search_path:
+                filepath = os.path.join(dirname, name)
+                if os.path.isfile(filepath):
+                    return os.path.abspath(filepath)
+        raise genshi.template.TemplateNotFound(name, search_path)
+
+    def _loader(self, search_path):
+        """ Get a template loader for the templates that a template in
+        the given search path includes.  The loader checks whether an
+        included template has changed each time it is included;
+        without ``auto_reload``, Genshi would also inline included
+        templates into the loaded template, and changes to them would
+        never be seen. """
+        loader = self._loaders.get(search_path)
+        if loader is None:
+            loader = genshi.template.TemplateLoader(list(search_path),
+                                                    auto_reload=True)
+            self._loaders[search_path] = loader
+        return loader
+
+    def load(self, name, search_path, cls=genshi.template.MarkupTemplate,
+             cache_dir=None):
+        """ Load a template, parsing it only if it has not already
+        been loaded.
+
+        :param name: The template name, relative to the search path,
+                     or an absolute path
+        :type name: str
+        :param search_path: The directories to search for the template
+        :type search_path: list
+        :param cls: The template class to load the template with
+        :type cls: type
+        :param cache_dir: The directory to store parsed templates in,
+                          or None to only keep them in memory
+        :type cache_dir: str
+        :returns: :class:`genshi.template.Template`
+        """
+        search_path = tuple(search_path)
+        filepath = self.find(name, search_path)
+        stat = os.stat(filepath)
+        key = (filepath, stat.st_mtime, stat.st_size, cls, search_path)
+        tmpl = self.memory.get(key)
+        if tmpl is not None:
+            logger.debug("Using loaded template %s" % filepath)
+            return tmpl
+
+        entry = None
+        if cache_dir:
+            digest = hashlib.sha1()
+            for part in key[:3] + (cls.__module__, cls.__name__,
+                                   genshi.__version__,
+                                   dmr.version.__version__):
+                digest.update("%r\0" % (part,))
+            entry = os.path.join(os.path.expanduser(cache_dir),
+                                 digest.hexdigest() + self.suffix)
+            tmpl = self._read(entry)
+
+        if tmpl is None:
+            logger.debug("Parsing template %s" % filepath)
+            with open(filepath, "rb") as fileobj:
+                tmpl = cls(fileobj, filepath=filepath, filename=name)
+            if entry is not None:
+                self._write(entry, tmpl)
+        tmpl.loader = self._loader(search_path)
+        # prepare the template now, rather than when it is first
+        # rendered, which might happen in several threads at once
+        tmpl.stream  # pylint: disable=W0104
+        self.memory[key] = tmpl
+        return tmpl
+
+    @staticmethod
+    def _read(entry):
+        """ Read a parsed template from an on-disk cache entry.
+
+        :returns: :class:`genshi.template.Template`, or None if there
+                  is no usable entry
+        """
+        try:
+            with open(entry, "rb") as fileobj:
+                tmpl = pickle.load(fileobj)
+        except IOError:
+            logger.debug("No template cache entry at %s" % entry)
+            return None
+        except:  # pylint: disable=W0702
+            logger.info("Discarding unreadable template cache entry %s: %s"
+                        % (entry, sys.exc_info()[1]))
+            try:
+                os.unlink(entry)
+            except OSError:
+                pass
+            return None
+        logger.debug("Loaded template from cache entry %s" % entry)
+        return tmpl
+
+    @staticmethod
+    def _write(entry, tmpl):
+        """ Write a parsed template to an on-disk cache entry.  This
+        must be done before the template is first rendered, since
+        rendering prepares the template in a form that cannot be
+        pickled.  Failure to write the entry is logged, but is not
+        fatal. """
+        try:
+            serialized = pickle.dumps(tmpl, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError):
+            logger.warning("Could not serialize template %s: %s" %
+                           (tmpl.filepath, sys.exc_info()[1]))
+            return
+        cache_dir = os.path.dirname(entry)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # write to a temp file and rename it into place so that a
+            # concurrent reader never sees a partial entry
+            fd, tmpfile = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            try:
+                os.write(fd, serialized)
+            finally:
+                os.close(fd)
+            os.rename(tmpfile, entry)
+        except (IOError, OSError):
+            logger.warning("Could not write template cache entry %s: %s" %
+                           (entry, sys.exc_info()[1]))
+            return
+        logger.debug("Wrote template to cache entry %s" % entry)
+
+    def clear(self):
+        """ Forget all loaded templates.  On-disk cache entries are
+        not removed. """
+        self.memory.clear()
+        self._loaders.clear()
+
+
+#: The :class:`dmr.output.genshi.TemplateCache` used by all Genshi
+#: output formats
+templates = TemplateCache()  # pylint: disable=C0103
+
+
 class GenshiOutput(BaseOutput):
     """ dmr output class that renders the data in the document with a
     `Genshi`_ template.  This class is
@@ -47,8 +235,12 @@ class GenshiOutput(BaseOutput):
     #: to translate the snippets in the dmr document.
     writer = None
 
-    def __init__(self, document):
-        BaseOutput.__init__(self, document)
+    #: The encoding to write output in with
+    #: :func:`dmr.output.genshi.GenshiOutput.output_to`
+    encoding = "utf-8"
+
+    def __init__(self, document, settings=None):
+        BaseOutput.__init__(self, document, settings=settings)
         self._renderer = None
 
     @classmethod
@@ -69,6 +261,9 @@ class GenshiOutput(BaseOutput):
                             help="Template to use, relative to template path",
                             default="%s.genshi" % cls.__name__.lower(),
                             cf=(cls.__name__.lower(), 'template')))
+        rv.append(DMROption("--template-cache-dir",
+                            help="Directory to store parsed templates in",
+                            cf=('genshi', 'cache_dir')))
         return rv
 
     @property
@@ -81,30 +276,67 @@ class GenshiOutput(BaseOutput):
                                             self.writer)
         return self._renderer
 
-    def output(self):
+    def _get_stream(self):
+        """ Render the document and generate the template output
+        stream, with comments removed.
+
+        :returns: :class:`genshi.core.Stream`
+        """
         logger.debug("Rendering document")
-        data = dict(document=self.document,
-                    contact=self.document.contact.render(self.renderer),
-                    sections=[],
-                    footer=None)
+        renderer = BatchRenderer(self.renderer)
+        with phase("Rendering fragments"):
+            renderer.prepare([self.document.contact] + list(self.document))
+        with phase("Rendering contact"):
+            data = dict(document=self.document,
+                        contact=self.document.contact.render(renderer),
+                        sections=[],
+                        footer=None)
         for section in self.document:
             logger.debug("Rendering section '%s'" % section.name)
-            data['sections'].append(section.render(self.renderer))
+            with phase("Rendering section %s" % section.name.astext()):
+                data['sections'].append(section.render(renderer))
 
-        if config.footer:
-            data['footer'] = self.renderer(config.footer)
+        if self.settings.footer:
+            data['footer'] = renderer(self.settings.footer)
 
-        tmpl_paths = [config.template_path,
+        tmpl_paths = [self.settings.template_path,
                       os.path.expanduser('~/.dmr/templates')]
         logger.debug("Loading templates from %s" % tmpl_paths)
-        loader = genshi.template.TemplateLoader(tmpl_paths)
-        logger.info("Loading template at %s" % config.template)
-        tmpl = loader.load(config.template,
-                           cls=genshi.template.NewTextTemplate)
+        cache_dir = None
+        if getattr(self.settings, "cache", False):
+            cache_dir = self.settings.template_cache_dir
+        logger.info("Loading template at %s" % self.settings.template)
+        with phase("Loading template"):
+            tmpl = templates.load(self.settings.template, tmpl_paths,
+                                  cls=genshi.template.NewTextTemplate,
+                                  cache_dir=cache_dir)
         logger.debug("Generating template output stream")
-        stream = tmpl.generate(**data).filter(removecomment)
-        logger.debug("Rendering template")
+        return tmpl.generate(**data).filter(removecomment)
+
+    @staticmethod
+    def _serialize(stream):
+        """ Get an iterator over the text serialization of a template
+        output stream """
         try:
-            return stream.render('text', strip_whitespace=False)
+            return stream.serialize('text', strip_whitespace=False)
         except TypeError:
-            return stream.render('text')
+            return stream.serialize('text')
+
+    def output(self):
+        stream = self._get_stream()
+        logger.debug("Rendering template")
+        with phase("Rendering template"):
+            return genshi.output.encode(self._serialize(stream),
+                                        method='text')
+
+    def output_to(self, fileobj):
+        """ Write the template output to a file-like object as it is
+        generated, encoded with
+        :attr:`dmr.output.genshi.GenshiOutput.encoding`, rather than
+        rendering all of it first. """
+        stream = self._get_stream()
+        logger.debug("Rendering template")
+        with phase("Rendering template"):
+            chunks = self._serialize(stream)
+            self.write_chunks(fileobj, (c.encode(self.encoding, 'replace')
+                                        for c in chunks))
@@ -7,32 +7,65 @@ HTML translator -- it's basically equivalent to running ``rst2html``
 on your reST resume.
 """
 
-import copy
-from dmr.config import config
 from dmr.output.base import BaseOutput
-from docutils.writers.html4css1 import Writer
+from dmr.profile import phase
+from dmr.render import default_settings, copy_document, \
+    PrivateAttributes
+from docutils.writers import html4css1
 from docutils.io import StringOutput
-from docutils.frontend import OptionParser
 import docutils.nodes
 
-__all__ = ["Html"]
+__all__ = ["Html", "HTMLTranslator", "Writer"]
+
+
+class HTMLTranslator(PrivateAttributes, html4css1.HTMLTranslator):
+    """ A docutils HTML translator that leaves the doctree it walks
+    unchanged, and that adds the footer given in the
+    ``dmr_footer`` setting at the end of the document.
+
+    The docutils HTML translator adds classes (and occasionally ids
+    and names) to the nodes it visits and to their children.  This
+    translator gives them private copies of their attributes (see
+    :class:`dmr.render.PrivateAttributes`), so that the same doctree
+    can be translated any number of times without copying it. """
+
+    def depart_document(self, node):
+        footer = getattr(self.settings, "dmr_footer", None)
+        if footer:
+            docutils.nodes.footer(footer,
+                                  docutils.nodes.Text(footer)).walkabout(self)
+        html4css1.HTMLTranslator.depart_document(self, node)
+        # restore nodes whose departure was skipped
+        self.restore()
+
+
+class Writer(html4css1.Writer):
+    """ A docutils HTML writer that uses
+    :class:`dmr.output.html.HTMLTranslator`. """
+
+    def __init__(self):
+        html4css1.Writer.__init__(self)
+        self.translator_class = HTMLTranslator
 
 
 class Html(BaseOutput):
     """ dmr output format class to write HTML output using the
-    :mod:`docutils HTML translator <docutils.writers.html4css1>`."""
+    :mod:`docutils HTML translator <docutils.writers.html4css1>`.
+    The source doctree is translated in place, rather than copied, and
+    is left unchanged."""
     name = "HTML"
+    extension = "html"
 
     def output(self):
         writer = Writer()
         output = StringOutput(encoding="utf8")
-        mydoc = copy.deepcopy(self.document.source)
-        mydoc.reporter = self.document.source.reporter
-        mydoc.settings = \
-            OptionParser(components=(Writer,)).get_default_values()
-        if config.footer:
-            mydoc.append(
-                docutils.nodes.footer(config.footer,
-                                      docutils.nodes.Text(config.footer)))
-
-        return writer.write(mydoc, output)
+        mydoc = copy_document(self.document.source,
+                              default_settings(Writer))
+        mydoc.settings.dmr_footer = self.settings.footer
+
+        with phase("Writing HTML"):
+            try:
+                return writer.write(mydoc, output)
+            finally:
+                if getattr(writer, "visitor", None) is not None:
+                    writer.visitor.restore()
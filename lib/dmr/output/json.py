@@ -11,23 +11,39 @@ programs.
 
 from __future__ import absolute_import
 import json
-from dmr.config import config, DMROption
+import functools
+from dmr.config import DMROption
 from dmr.output.base import BaseOutput
-from dmr.render import WhitespaceRemovingRenderer, ReferenceTransformer
+from dmr.profile import phase
+from dmr.render import WhitespaceRemovingRenderer, ReferenceTransformer, \
+    BatchRenderer
 
 __all__ = ["Json"]
 
 
+class _StreamingDict(dict):
+    """ A dict of keys to functions that produce their values.  When
+    it is serialized by the pure-Python JSON encoder (i.e., with
+    :func:`json.JSONEncoder.iterencode`), each value is produced as
+    the encoder reaches it, so only one value needs to be held in
+    memory at a time. """
+
+    def iteritems(self):
+        for key, func in dict.iteritems(self):
+            yield key, func()
+
+
 class Json(BaseOutput):
     """ dmr output format class to write JSON output.  Note that this
     output format is lossy; text formatting (e.g., emphasis, etc.) is
     discarded. """
     name = "JSON"
+    extension = "json"
 
-    def __init__(self, document):
-        BaseOutput.__init__(self, document)
-        self.renderer = WhitespaceRemovingRenderer(document.source,
-                                                   ReferenceTransformer)
+    def __init__(self, document, settings=None):
+        BaseOutput.__init__(self, document, settings=settings)
+        self.renderer = BatchRenderer(
+            WhitespaceRemovingRenderer(document.source, ReferenceTransformer))
 
     @classmethod
     def get_options(cls):
@@ -37,22 +53,83 @@ class Json(BaseOutput):
                             default=False,
                             action="store_true",
                             cf=('json', 'pretty')))
+        rv.append(DMROption("--date-keys",
+                            help="Include sortable keys for dates",
+                            default=False,
+                            action="store_true",
+                            cf=('json', 'date_keys')))
         return rv
 
-    def output(self):
-        jdata = dict()
-        jdata.update(self.dump_contact(self.document.contact))
+    def _get_indent(self):
+        """ Get the indent to serialize JSON with """
+        if self.settings.pretty:
+            return 2
+        return None
+
+    def _get_data(self, cls=dict):
+        """ Get a dict of each top-level key in the output to a
+        function that renders its value.  Keys are added in the same
+        order as they would be added to a dict of the complete
+        output, so that the dict iterates over them in the same order.
+
+        :param cls: The dict class to create
+        :type cls: type
+        :returns: dict
+        """
+        rv = cls()
+        contact = []
+
+        def dump_contact(field):
+            """ Get a function that gets a field of the rendered
+            contact, which is rendered the first time it is needed """
+            def dump():
+                """ Get the field of the rendered contact """
+                if not contact:
+                    with phase("Rendering contact"):
+                        self.renderer.prepare([self.document.contact])
+                        contact.append(self.dump_contact(
+                            self.document.contact))
+                return contact[0][field]
+            return dump
+
+        # the iteration order of a dict depends on how it was built,
+        # so this is built exactly as a dict of the complete output
+        # would be
+        rv.update(dict([(field, dump_contact(field))
+                        for field in self.document.contact._fields]))
         for section in self.document:
-            jdata[section.name.astext()] = \
-                getattr(self,
-                        "dump_%s" % section.type)(section)
-        if config.footer:
-            jdata['_comment'] = self.renderer(config.footer)
-        if config.pretty:
-            indent = 2
-        else:
-            indent = None
-        return json.dumps(jdata, indent=indent)
+            rv[section.name.astext()] = functools.partial(self._dump_top,
+                                                          section)
+        if self.settings.footer:
+            rv['_comment'] = functools.partial(self.renderer,
+                                               self.settings.footer)
+        return rv
+
+    def _dump_top(self, section):
+        """ Render and dump a top-level section.  The snippets in the
+        section are rendered together, and discarded afterwards. """
+        with phase("Rendering section %s" % section.name.astext()):
+            self.renderer.prepare([section])
+            try:
+                return getattr(self, "dump_%s" % section.type)(section)
+            finally:
+                self.renderer.results.clear()
+
+    def output(self):
+        jdata = self._get_data()
+        for key in jdata:
+            # replacing values does not change the order of the keys
+            jdata[key] = jdata[key]()
+        with phase("Serializing JSON"):
+            return json.dumps(jdata, indent=self._get_indent())
+
+    def output_to(self, fileobj):
+        """ Write the JSON output to a file-like object as it is
+        rendered, one top-level key at a time.  The output is
+        identical to :func:`dmr.output.json.Json.output`. """
+        encoder = json.JSONEncoder(indent=self._get_indent())
+        self.write_chunks(fileobj,
+                          encoder.iterencode(self._get_data(_StreamingDict)))
 
     def dump_namedtuple(self, tpl):
         """ Dump a rendered namedtuple data class
@@ -62,6 +139,17 @@ class Json(BaseOutput):
         return dict([(field, getattr(data, field))
                      for field in tpl._fields])  # pylint: disable=W0212
 
+    def dump_dates(self, dates):
+        """ Dump a :class:`dmr.data.Dates` object to a dict in
+        preparation for JSON serialization.  With ``--date-keys``,
+        this includes the sortable ``start_key`` and ``end_key`` of
+        the dates as ``[year, month, day]`` lists. """
+        rv = self.dump_namedtuple(dates)
+        if self.settings.date_keys:
+            rv['start_key'] = dates.start_key
+            rv['end_key'] = dates.end_key
+        return rv
+
     def dump_job(self, job):
         """ Dump a rendered :class:`dmr.data.Job` to a dict in preparation
         for JSON serialization. """
@@ -82,7 +170,6 @@ class Json(BaseOutput):
         return [self.dump_job(j) for j in section]
 
     dump_contact = dump_namedtuple
-    dump_dates = dump_namedtuple
     dump_text = dump_section
     dump_list = dump_section
     dump_references = dump_section
@@ -0,0 +1,95 @@
+""" This module provides a `JSON Lines <http://jsonlines.org>`_ output
+format for dmr, for loading many resumes at once (e.g., into a search
+index).  Each line of output is a compact JSON record, so the output
+for many resumes can be concatenated into a single file; ``dmr batch``
+appends every document to the same file if ``--output-pattern`` does
+not depend on the document:
+
+.. code-block:: bash
+
+    dmr batch resumes/ -f jsonl --output-pattern corpus.jsonl
+
+By default, there is one record per resume, with the same data as the
+:mod:`dmr.output.json` output format.  With ``--records item``, there
+is one record for each job, list item, and reference instead, with
+the contact information of the owner of the resume attached.  Every
+record includes the name of the document it came from in
+``_source``.
+
+.. note::
+
+    **N.B.!** Like :mod:`dmr.output.json`, this output format is
+    lossy.
+"""
+
+from __future__ import absolute_import
+import json
+from dmr.config import DMROption
+from dmr.output.json import Json
+
+__all__ = ["Jsonl"]
+
+
+class Jsonl(Json):
+    """ dmr output format class to write JSON Lines output.  This
+    uses the ``dump_*`` methods of :class:`dmr.output.json.Json`, so
+    records have the same schema as JSON output. """
+    name = "JSON Lines"
+    extension = "jsonl"
+    appendable = True
+
+    @classmethod
+    def get_options(cls):
+        rv = [opt for opt in Json.get_options() if "--pretty" not in opt.args]
+        rv.append(DMROption("--records",
+                            help="Write one record per document, or one per "
+                            "job, list item, and reference",
+                            default="document",
+                            choices=["document", "item"],
+                            cf=('jsonl', 'records')))
+        return rv
+
+    def _get_indent(self):
+        return None
+
+    def _get_source(self):
+        """ Get the name of the document that is being rendered """
+        return self.document.source.get('source')
+
+    def _get_data(self, cls=dict):
+        rv = Json._get_data(self, cls=cls)
+        rv['_source'] = self._get_source
+        return rv
+
+    def records(self):
+        """ Get the records to output.
+
+        :returns: list of dicts
+        """
+        if self.settings.records != "item":
+            data = self._get_data()
+            for key in data:
+                data[key] = data[key]()
+            return [data]
+
+        contact = self.dump_contact(self.document.contact)
+        rv = []
+        for section in self.document:
+            if section.type == "text":
+                continue
+            for item in self._dump_top(section):
+                rv.append(dict(_source=self._get_source(),
+                               section=section.name.astext(),
+                               type=section.type,
+                               contact=contact,
+                               item=item))
+        return rv
+
+    def output(self):
+        return "".join(json.dumps(r) + "\n" for r in self.records())
+
+    def output_to(self, fileobj):
+        """ Write the records to a file-like object.  They are written
+        with a single call, so that records from several processes
+        appending to the same file are not interleaved. """
+        fileobj.write(self.output())
@@ -5,14 +5,35 @@ based on `Genshi <http://genshi.edgewall.org>`_ templates using
 See :ref:`configuration-genshi` for details on how the template is
 selected. """
 
+from dmr.render import nonmutating, PrivateAttributes
 from dmr.output.genshi import GenshiOutput
-from docutils.writers.latex2e import Writer
+from docutils.writers import latex2e
 
-__all__ = ["Latex"]
+__all__ = ["Latex", "LaTeXTranslator", "Writer"]
+
+
+@nonmutating
+class LaTeXTranslator(PrivateAttributes, latex2e.LaTeXTranslator):
+    """ A docutils LaTeX translator that leaves the doctree it walks
+    unchanged.  The docutils LaTeX translator adds classes to
+    (e.g.) abbreviation, acronym, and compound nodes every time it
+    visits them, so it is given private copies of their attributes
+    (see :class:`dmr.render.PrivateAttributes`), and snippets can be
+    rendered without copying them. """
+
+
+class Writer(latex2e.Writer):
+    """ A docutils LaTeX writer that uses
+    :class:`dmr.output.latex.LaTeXTranslator`. """
+
+    def __init__(self):
+        latex2e.Writer.__init__(self)
+        self.translator_class = LaTeXTranslator
 
 
 class Latex(GenshiOutput):
     """ dmr output format to write LaTeX files using
     :class:`dmr.output.genshi.GenshiOutput`. """
     name = "LaTeX"
+    extension = "tex"
     writer = Writer()
@@ -16,6 +16,7 @@ __all__ = ["Text"]
 class Text(GenshiOutput):
     """ dmr output format to write plain text files using
     :class:`dmr.output.genshi.GenshiOutput`. """
+    extension = "txt"
 
     @property
     def renderer(self):
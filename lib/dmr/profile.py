@@ -0,0 +1,180 @@
+""" Per-phase timing of dmr runs.  With ``--profile``, dmr records the
+wall clock and CPU time spent in each phase of a run -- parsing the
+configuration, parsing the document with docutils, building the
+:class:`dmr.data.Document`, rendering each section, generating
+template output, and writing the output -- and writes a report when
+the run is done.
+
+Code that does a significant amount of work marks it as a phase:
+
+.. code-block:: python
+
+    from dmr.profile import phase
+
+    with phase("Rendering template"):
+        ...
+
+Phases nest, and a phase with the same name may occur more than once
+(e.g., once per output format).  When profiling is not active,
+:func:`dmr.profile.phase` does nothing.
+"""
+
+import os
+import time
+import json
+from contextlib import contextmanager
+
+__all__ = ["Profiler", "phase", "activate", "deactivate"]
+
+#: The active :class:`dmr.profile.Profiler`, or None
+_active = None  # pylint: disable=C0103
+
+
+def _now():
+    """ Get the current wall clock time and the CPU time used by this
+    process so far.
+
+    :returns: tuple of ``(wall, cpu)``, in seconds
+    """
+    times = os.times()
+    return time.time(), times[0] + times[1]
+
+
+class Phase(object):
+    """ The time spent in a single phase of a run """
+
+    def __init__(self, name):
+        #: The name of the phase
+        self.name = name
+
+        #: The wall clock time spent in the phase, in seconds
+        self.wall = 0.0
+
+        #: The CPU time spent in the phase, in seconds
+        self.cpu = 0.0
+
+        #: A list of :class:`dmr.profile.Phase` objects for the
+        #: phases within this one
+        self.children = []
+
+    def to_dict(self):
+        """ Get the timing of this phase and the phases within it as a
+        dict, suitable for JSON serialization.
+
+        :returns: dict
+        """
+        return dict(name=self.name, wall=self.wall, cpu=self.cpu,
+                    children=[c.to_dict() for c in self.children])
+
+
+class Profiler(object):
+    """ Record the time spent in the phases of a run.  The time from
+    the creation of the profiler until :func:`dmr.profile.Profiler.stop`
+    is the total time of the run. """
+
+    def __init__(self):
+        #: The :class:`dmr.profile.Phase` for the whole run
+        self.root = Phase("total")
+        self._stack = [self.root]
+        self._start = _now()
+
+    @contextmanager
+    def phase(self, name):
+        """ Record the time spent in a block of code.  This is a
+        context manager.
+
+        :param name: The name of the phase
+        :type name: str
+        """
+        rec = Phase(name)
+        self._stack[-1].children.append(rec)
+        self._stack.append(rec)
+        wall, cpu = _now()
+        try:
+            yield rec
+        finally:
+            end_wall, end_cpu = _now()
+            rec.wall = end_wall - wall
+            rec.cpu = end_cpu - cpu
+            self._stack.pop()
+
+    def stop(self):
+        """ Stop recording, and record the total time of the run """
+        end_wall, end_cpu = _now()
+        self.root.wall = end_wall - self._start[0]
+        self.root.cpu = end_cpu - self._start[1]
+
+    def report(self):
+        """ Get a human-readable report of the time spent in each
+        phase.
+
+        :returns: str
+        """
+        lines = ["%-56s %10s %10s %6s" % ("Phase", "Wall (ms)", "CPU (ms)",
+                                          "%")]
+        total = self.root.wall or 1.0
+
+        def add(rec, depth):
+            """ Add a line for a phase and the phases within it """
+            name = "  " * depth + " ".join(rec.name.split())
+            if len(name) > 56:
+                name = name[:53] + "..."
+            lines.append("%-56s %10.1f %10.1f %6.1f" %
+                         (name, rec.wall * 1000, rec.cpu * 1000,
+                          rec.wall * 100 / total))
+            for child in rec.children:
+                add(child, depth + 1)
+
+        add(self.root, 0)
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """ Get a JSON report of the time spent in each phase.  Times
+        are given in seconds.
+
+        :returns: str
+        """
+        return json.dumps(self.root.to_dict(), indent=2) + "\n"
+
+
+class _NullPhase(object):
+    """ A context manager that does nothing, used by
+    :func:`dmr.profile.phase` when profiling is not active """
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name):
+    """ Record the time spent in a block of code with the active
+    profiler, if there is one.  This is a context manager.
+
+    :param name: The name of the phase
+    :type name: str
+    """
+    if _active is None:
+        return _NULL_PHASE
+    return _active.phase(name)
+
+
+def activate(profiler):
+    """ Make the given profiler the active profiler, which records the
+    phases marked with :func:`dmr.profile.phase`.
+
+    :param profiler: The profiler to activate
+    :type profiler: dmr.profile.Profiler
+    """
+    global _active  # pylint: disable=W0603
+    _active = profiler
+
+
+def deactivate():
+    """ Stop recording phases with the active profiler """
+    global _active  # pylint: disable=W0603
+    _active = None
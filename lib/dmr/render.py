@@ -2,15 +2,304 @@
 
 import re
 import copy
+import threading
+from collections import OrderedDict
 import docutils.nodes
 from docutils.frontend import OptionParser
+from dmr.logger import logger
+
+#: The set of :class:`docutils.nodes.NodeVisitor` subclasses that
+#: have been declared not to modify the doctrees they walk.  See
+#: :func:`dmr.render.nonmutating`.
+_NONMUTATING = set()
+
+
+def nonmutating(visitor_cls):
+    """ Declare that the given :class:`docutils.nodes.NodeVisitor`
+    subclass does not modify the doctrees it walks, so
+    :class:`dmr.render.Renderer` can walk snippets directly rather
+    than walking a copy of each one.  This can be used as a class
+    decorator, or called with a visitor class that cannot be
+    decorated (e.g., a docutils translator).  The declaration applies
+    only to the class itself, not to its subclasses, since a subclass
+    may well add visit methods that do modify the tree.
+
+    :param visitor_cls: The visitor class to declare non-mutating
+    :type visitor_cls: type
+    :returns: ``visitor_cls``
+    """
+    _NONMUTATING.add(visitor_cls)
+    return visitor_cls
+
+
+class PrivateAttributes(object):
+    """ Mixin for docutils translators that change the attributes of
+    the nodes they visit (e.g., by adding classes), so that they leave
+    the doctree they walk unchanged and can be declared with
+    :func:`dmr.render.nonmutating`.  Each node is given a private copy
+    of its attributes while the node and its parent are being
+    visited, and the original attributes are put back afterwards.
+    The mixin must come before the translator class in the bases. """
+
+    def __init__(self, document):
+        super(PrivateAttributes, self).__init__(document)
+        # the original attributes of nodes that have a private copy,
+        # keyed by the id of the node that was visited when the copy
+        # was made
+        self._saved = dict()
+        self._private = set()
+
+    def _privatize(self, node, saved):
+        """ Give a node a private copy of its attributes, and add the
+        node and its original attributes to ``saved`` """
+        if (not isinstance(node, docutils.nodes.Element) or
+                id(node) in self._private):
+            return
+        self._private.add(id(node))
+        saved.append((node, node.attributes))
+        node.attributes = dict((key, value[:] if isinstance(value, list)
+                                else value)
+                               for key, value in node.attributes.items())
+
+    def _restore(self, saved):
+        """ Put back the original attributes of nodes """
+        for node, attributes in saved:
+            node.attributes = attributes
+            self._private.discard(id(node))
+
+    def restore(self):
+        """ Put back the original attributes of every node that still
+        has a private copy, e.g., after translation was interrupted by
+        an error. """
+        for saved in self._saved.values():
+            self._restore(saved)
+        self._saved.clear()
+
+    def dispatch_visit(self, node):
+        saved = []
+        self._privatize(node, saved)
+        for child in getattr(node, "children", []):
+            self._privatize(child, saved)
+        self._saved[id(node)] = saved
+        try:
+            return super(PrivateAttributes, self).dispatch_visit(node)
+        except docutils.nodes.SkipNode:
+            # the node will not be departed
+            self._restore(self._saved.pop(id(node)))
+            raise
+
+    def dispatch_departure(self, node):
+        try:
+            return super(PrivateAttributes, self).dispatch_departure(node)
+        finally:
+            self._restore(self._saved.pop(id(node), []))
+
+
+class LRUCache(object):
+    """ A bounded mapping that evicts the least recently used entries
+    once it is full, and counts cache hits and misses.  It is safe to
+    share between threads. """
+
+    def __init__(self, maxsize=4096):
+        """
+        :param maxsize: The maximum number of entries to keep
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        #: The number of lookups that found an entry
+        self.hits = 0
+
+        #: The number of lookups that did not find an entry
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """ Get the entry for the given key, and mark it as the most
+        recently used entry.
+
+        :param key: The key to look up
+        :param default: The value to return if there is no entry for
+                        the key
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """ Remove the entry for the given key, and return its value
+        (or ``default`` if there is no entry). """
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """ Remove all entries and reset the hit and miss counters """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """ Get statistics about the use of this cache.
+
+        :returns: dict with the keys ``hits``, ``misses``, ``size``,
+                  and ``maxsize``
+        """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses,
+                        size=len(self._data), maxsize=self.maxsize)
+
+
+#: Default docutils settings, keyed by the tuple of components they
+#: were built for.  See :func:`dmr.render.default_settings`.
+_SETTINGS = dict()
+_SETTINGS_LOCK = threading.Lock()
+
+
+def default_settings(*components):
+    """ Get the default docutils settings for the given components
+    (e.g., a parser or writer class).  Building a docutils option
+    parser is slow, so the defaults for each tuple of components are
+    only built once per process; each call returns a new copy of them
+    (with list and dict values copied too), which the caller is free
+    to modify.
+
+    :param components: The docutils components (classes or instances
+                       of :class:`docutils.SettingsSpec` subclasses)
+    :returns: :class:`optparse.Values`
+    """
+    with _SETTINGS_LOCK:
+        defaults = _SETTINGS.get(components)
+        if defaults is None:
+            defaults = OptionParser(
+                components=components).get_default_values()
+            _SETTINGS[components] = defaults
+    rv = copy.copy(defaults)
+    for key, value in vars(rv).items():
+        if isinstance(value, (list, dict)):
+            setattr(rv, key, copy.copy(value))
+    return rv
+
+
+def copy_document(document, settings=None):
+    """ Make a new document node that shares the children, ids, and
+    names of the given document, but has its own attributes and
+    settings.  This is much cheaper than :func:`copy.deepcopy`, and
+    lets a document be given writer settings without changing it.
+    The children still refer to the original document as their
+    parent.
+
+    :param document: The document to copy
+    :type document: docutils.nodes.document
+    :param settings: The settings to give the new document.  By
+                     default, it shares the settings of the original.
+    :type settings: optparse.Values
+    :returns: :class:`docutils.nodes.document`
+    """
+    rv = document.copy()
+    rv.children = document.children[:]
+    rv.ids = document.ids
+    rv.nameids = document.nameids
+    if settings is not None:
+        rv.settings = settings
+    return rv
+
+
+def structural_key(node):
+    """ Get a hashable key that describes the structure and content
+    of a doctree: the class and attributes of every node in it, and
+    all of its text.  Two doctrees with the same key render
+    identically in the same context.
+
+    :param node: The doctree to get a key for
+    :type node: docutils.nodes.Node
+    :returns: tuple
+    """
+    if isinstance(node, docutils.nodes.Text):
+        return (node.__class__, unicode(node))
+    return (node.__class__, _attributes_key(node),
+            tuple(structural_key(child) for child in node.children))
+
+
+def _attributes_key(node):
+    """ Get a hashable key for the attributes of an element """
+    return tuple(sorted((name, tuple(val) if isinstance(val, list) else val)
+                        for name, val in node.attributes.items() if val))
+
+
+def _context_key(node):
+    """ Get a hashable key that describes where a node sits in its
+    doctree.  Some translators render a node differently depending on
+    its parent, its position, and its siblings (e.g., the LaTeX
+    translator omits the blank line before a paragraph that opens a
+    list item or follows a list in a compound, and the HTML translator
+    only makes a paragraph compact if it is alone in its parent), so
+    this is part of the cache key for a rendered snippet.  The key
+    covers the class and attributes of the parent, the position of the
+    node in it, the classes of all of its children, and the classes of
+    the other ancestors of the node.
+
+    :param node: The node to get a key for
+    :type node: docutils.nodes.Node
+    :returns: tuple or None
+    """
+    parent = node.parent
+    if parent is None:
+        return None
+    ancestors = []
+    ancestor = parent.parent
+    while ancestor is not None:
+        ancestors.append(ancestor.__class__)
+        ancestor = ancestor.parent
+    return (parent.__class__, _attributes_key(parent), parent.index(node),
+            tuple(child.__class__ for child in parent.children),
+            tuple(ancestors))
+
+
+def _copy_state(state):
+    """ Copy the instance attributes of a visitor, shallow-copying
+    mutable containers (e.g., the ``body`` list that a visitor
+    appends to) so that walking a snippet does not change the copy.
+    Attributes that refer to the same container in ``state`` refer to
+    the same copy in the result.
+
+    :param state: The instance attributes to copy
+    :type state: dict
+    :returns: dict
+    """
+    copies = dict()
+    rv = dict()
+    for name, val in state.items():
+        if isinstance(val, (list, dict, set)):
+            if id(val) not in copies:
+                copies[id(val)] = copy.copy(val)
+            val = copies[id(val)]
+        rv[name] = val
+    return rv
 
 
 class Renderer(object):
     """ Get a renderer callable suitable for passing to
     :func:`dmr.data.Renderable.render`. """
 
-    def __init__(self, document, visitor_cls):
+    def __init__(self, document, visitor_cls, cache=True):
         """
         :param document: The docutils document to use as a rendering
                          base.  This is *not* the document to render,
@@ -20,34 +309,165 @@ class Renderer(object):
         :type document: docutils.nodes.document
         :param visitor_cls: A :class:`docutils.nodes.NodeVisitor`
                             subclass to use to walk the doctrees that
-                            are rendered.  A new visitor is
-                            instantiated for each snippet that is
-                            rendered, because we are not rendering
-                            full documents and so a visitor does not
-                            necessarily get reset between renderings.
+                            are rendered.  We are not rendering full
+                            documents, so a visitor does not
+                            necessarily get reset between renderings;
+                            instead, a single visitor is instantiated,
+                            its instance attributes are saved, and
+                            they are restored (with mutable
+                            containers shallow-copied) before each
+                            snippet is walked.  This is much cheaper
+                            than instantiating a new visitor for each
+                            snippet, which for docutils translators
+                            means processing all of their settings.
+                            Unless the visitor class has been declared
+                            with :func:`dmr.render.nonmutating`, each
+                            snippet is copied before it is walked so
+                            that the visitor cannot modify the
+                            original doctree.
         :type visitor_cls: docutils.nodes.NodeVisitor
+        :param cache: The cache of rendered snippets to use, True
+                      (the default) for a new cache for this renderer
+                      alone, or None to render every snippet.
+                      Snippets are keyed by their
+                      :func:`dmr.render.structural_key`, their context
+                      in their doctree, and the visitor class, but not
+                      by the document and its settings, which the
+                      visitor may also use; a cache should only be
+                      shared between renderers of the same document.
+        :type cache: dmr.render.LRUCache
         """
         self.visitor_cls = visitor_cls
         self.document = document
+        self.copy = visitor_cls not in _NONMUTATING
+
+        #: The :class:`dmr.render.LRUCache` of rendered snippets, or
+        #: None
+        self.cache = LRUCache() if cache is True else cache
+        self._visitor = None
+        self._initial = None
 
     def __call__(self, snippet):
-        mydoc = copy.deepcopy(snippet)
-        visitor = self.visitor_cls(self.document)
-        mydoc.walkabout(visitor)
+        if self.cache is None:
+            return self.render(snippet)
+        key = (self.visitor_cls, _context_key(snippet),
+               structural_key(snippet))
+        rv = self.cache.get(key)
+        if rv is None:
+            rv = self.render(snippet)
+            self.cache[key] = rv
+        return rv
+
+    def render(self, snippet):
+        """ Render a snippet without consulting the cache.
+
+        :param snippet: The doctree to render
+        :type snippet: docutils.nodes.Node
+        :returns: string
+        """
+        if self.copy:
+            snippet = copy.deepcopy(snippet)
+        visitor = self.visitor()
+        try:
+            snippet.walkabout(visitor)
+        finally:
+            if isinstance(visitor, PrivateAttributes):
+                visitor.restore()
         return ''.join(visitor.body)
 
+    def visitor(self):
+        """ Get a visitor in the state it was in when it was
+        instantiated.
+
+        :returns: An instance of the visitor class
+        """
+        if self._visitor is None:
+            self._visitor = self.visitor_cls(self.document)
+            self._initial = _copy_state(vars(self._visitor))
+        else:
+            state = vars(self._visitor)
+            state.clear()
+            state.update(_copy_state(self._initial))
+        return self._visitor
+
 
 class WriterRenderer(Renderer):
     """ Get a renderer callable for the given docutils Writer,
     suitable for passing to
-    :func:`dmr.data.Renderable.render`. """
+    :func:`dmr.data.Renderable.render`.  The translator is given a
+    copy of the document (see :func:`dmr.render.copy_document`) with
+    the default settings for the writer, so the document itself is not
+    changed. """
     def __init__(self, document, writer):
-        document.settings = \
-            OptionParser(components=(writer.__class__,)).get_default_values()
+        document = copy_document(document,
+                                 default_settings(writer.__class__))
         Renderer.__init__(self, document, writer.translator_class)
         self.writer = writer
 
 
+class BatchRenderer(object):
+    """ Wrap a renderer callable so that all of the snippets that a
+    set of :class:`dmr.data.Renderable` objects need can be rendered
+    in a single pass with :func:`dmr.render.BatchRenderer.prepare`.
+    Afterwards, calling the BatchRenderer returns the precomputed
+    results; snippets that were not prepared are passed through to
+    the wrapped renderer. """
+
+    def __init__(self, renderer):
+        """
+        :param renderer: The renderer to wrap
+        :type renderer: dmr.render.Renderer
+        """
+        self.renderer = renderer
+
+        #: A dict of ``id(snippet)`` to a tuple of ``(snippet,
+        #: result)``.  The snippet is kept so that its id cannot be
+        #: reused by another object.
+        self.results = dict()
+
+    @staticmethod
+    def _collect(snippets):
+        """ Get a function to pass to
+        :func:`dmr.data.Renderable.render` that appends each snippet
+        it is called with to the given list. """
+        def collect(snippet):
+            """ Collect a snippet and return it unrendered """
+            if not isinstance(snippet, docutils.nodes.Node):
+                # behave like a renderer given something that is not
+                # a doctree
+                raise TypeError("Cannot render %r" % (snippet,))
+            snippets.append(snippet)
+            return snippet
+        return collect
+
+    def prepare(self, renderables):
+        """ Render every snippet that the given objects contain.
+
+        :param renderables: The objects to prepare for rendering
+        :type renderables: list of :class:`dmr.data.Renderable`
+        """
+        snippets = []
+        collect = self._collect(snippets)
+        for renderable in renderables:
+            renderable.render(collect)
+        for snippet in snippets:
+            if id(snippet) not in self.results:
+                self.results[id(snippet)] = (snippet, self.renderer(snippet))
+        cache = getattr(self.renderer, "cache", None)
+        if cache is not None:
+            logger.debug("Snippet cache: %(hits)s hits, %(misses)s misses, "
+                         "%(size)s entries" % cache.stats())
+
+    def __call__(self, snippet):
+        try:
+            prepared, rv = self.results[id(snippet)]
+            if prepared is snippet:
+                return rv
+        except KeyError:
+            pass
+        return self.renderer(snippet)
+
+
 class WhitespaceRemovingRenderer(Renderer):
     """ :class:`dmr.render.Renderer` that removes newlines and
     duplicate whitespace. """
@@ -57,6 +477,7 @@ class WhitespaceRemovingRenderer(Renderer):
         return self.whitespace.sub(' ', Renderer.__call__(self, snippet))
 
 
+@nonmutating
 class ReferenceTransformer(docutils.nodes.GenericNodeVisitor):
     """ Node visitor that transforms :class:`docutils.nodes.reference`
     nodes into plain-text representations of those references. """
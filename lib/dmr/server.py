@@ -0,0 +1,256 @@
+""" A dmr server and client.  Most of the time taken to render a
+small resume goes to starting Python and importing docutils and
+Genshi.  ``dmr --serve`` starts a server that does that once and then
+listens on a Unix socket; ``dmr --client`` forwards its command line,
+working directory, and standard input to the server, and writes the
+server's output and return value back out, so that the result is
+exactly the same as rendering the document in the client process.
+If no server is listening, the client renders the document itself.
+
+The server handles one request at a time, and keeps its caches (see
+:mod:`dmr.cache` and :mod:`dmr.output.genshi`) warm between requests.
+
+This module must not import docutils or the rest of dmr at module
+level, so that the client starts quickly.
+"""
+
+import os
+import sys
+import signal
+import socket
+import struct
+import marshal
+import argparse
+import traceback
+import SocketServer
+
+__all__ = ["serve", "client"]
+
+#: The default path to the server socket
+DEFAULT_SOCKET = "~/.dmr/socket"
+
+#: The header of each message sent over the socket, giving the
+#: length of the message
+_HEADER = struct.Struct("!I")
+
+
+def _send(sock, msg):
+    """ Send a message over the socket.
+
+    :param sock: The socket to send the message on
+    :type sock: socket.socket
+    :param msg: The message.  This must be serializable with
+                :mod:`marshal`.
+    """
+    data = marshal.dumps(msg)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    """ Receive exactly ``size`` bytes from the socket.
+
+    :raises: EOFError
+    """
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+
+def _recv(sock):
+    """ Receive a message sent with :func:`dmr.server._send` """
+    size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))[0]
+    return marshal.loads(_recv_exactly(sock, size))
+
+
+class _RemoteOutput(object):
+    """ A file-like object that stands in for stdout or stderr while
+    the server handles a request, and sends everything written to it
+    to the client. """
+
+    def __init__(self, sock, channel):
+        self.sock = sock
+        self.channel = channel
+        self.name = "<%s>" % channel
+
+    def write(self, data):
+        """ Send data to the client """
+        if data:
+            _send(self.sock, (self.channel, data))
+
+    def writelines(self, lines):
+        """ Send a sequence of strings to the client """
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        """ Data is sent as soon as it is written, so this is a no-op """
+        pass
+
+
+class _RemoteInput(object):
+    """ A file-like object that stands in for stdin while the server
+    handles a request.  The client's stdin is only requested if it is
+    actually read. """
+    name = "<stdin>"
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._data = None
+
+    def read(self):
+        """ Read all of the client's stdin """
+        if self._data is None:
+            _send(self.sock, ("stdin",))
+            self._data = _recv(self.sock)
+        rv = self._data
+        self._data = ""
+        return rv
+
+
+class _Handler(SocketServer.BaseRequestHandler):
+    """ Handle a single request from :func:`dmr.server.client` """
+
+    def handle(self):
+        import dmr.cli
+        import dmr.config
+        from dmr.logger import setup_logging
+
+        request = _recv(self.request)
+        stdout = _RemoteOutput(self.request, "stdout")
+        stderr = _RemoteOutput(self.request, "stderr")
+        saved = (sys.stdin, sys.stdout, sys.stderr, os.getcwd())
+        sys.stdin = _RemoteInput(self.request)
+        sys.stdout = stdout
+        sys.stderr = stderr
+        try:
+            os.chdir(request['cwd'])
+            refused = [arg for arg in ("--serve", "--watch")
+                       if arg in request['argv']]
+            if refused:
+                # the server handles one request at a time, so a
+                # request that never finishes would block every other
+                # client
+                stderr.write("dmr: error: %s cannot be sent to a dmr "
+                             "server\n" % refused[0])
+                rv = 2
+            else:
+                dmr.config.reset()
+                rv = dmr.cli.main(request['argv'])
+        except SystemExit:
+            rv = sys.exc_info()[1].code
+        except:  # pylint: disable=W0702
+            traceback.print_exc(file=stderr)
+            rv = 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved[:3]
+            os.chdir(saved[3])
+            setup_logging(self.server.verbose)
+        _send(self.request, ("exit", rv))
+
+
+class _Server(SocketServer.UnixStreamServer):
+    """ A Unix socket server that remembers the server's own verbose
+    level, so that logging can be restored after each request. """
+
+    def __init__(self, path, verbose):
+        self.verbose = verbose
+        SocketServer.UnixStreamServer.__init__(self, path, _Handler)
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], SystemExit):
+            # SIGTERM arrived while a request was being handled (see
+            # _terminate); shut down rather than serving on
+            raise
+        from dmr.logger import logger
+        logger.error("Error handling request: %s" % sys.exc_info()[1])
+
+
+def _terminate(signum, frame):  # pylint: disable=W0613
+    """ Signal handler to shut down the server cleanly on SIGTERM """
+    raise SystemExit(0)
+
+
+def serve(path):
+    """ Run a dmr server listening on the given Unix socket until it
+    is interrupted or terminated.
+
+    :param path: The path to the socket
+    :type path: str
+    """
+    from dmr.config import config
+    from dmr.logger import logger, fatal
+
+    if os.path.exists(path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            logger.debug("Removing stale socket %s" % path)
+            os.unlink(path)
+        else:
+            fatal("A dmr server is already listening on %s" % path)
+        finally:
+            sock.close()
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    # only the user running the server may connect to it
+    umask = os.umask(077)
+    try:
+        server = _Server(path, config.verbose)
+    finally:
+        os.umask(umask)
+    logger.info("Listening for requests on %s" % path)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def client(argv):
+    """ Send a request to a dmr server, and write its output to stdout
+    and stderr.  If no server is listening, the request is handled in
+    this process instead.
+
+    :param argv: The full argument list, including the program name
+                 and ``--client``
+    :type argv: list
+    :returns: The return value of the request
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--client", action="store_true")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    opts, remaining = parser.parse_known_args(argv[1:])
+    argv = [argv[0]] + remaining
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(os.path.expanduser(opts.socket))
+    except socket.error:
+        sock.close()
+        import dmr.cli
+        return dmr.cli.main(argv)
+
+    try:
+        _send(sock, dict(argv=argv, cwd=os.getcwd()))
+        while True:
+            msg = _recv(sock)
+            if msg[0] == "stdout":
+                sys.stdout.write(msg[1])
+            elif msg[0] == "stderr":
+                sys.stderr.write(msg[1])
+            elif msg[0] == "stdin":
+                _send(sock, sys.stdin.read())
+            else:
+                return msg[1]
+    finally:
+        sock.close()
@@ -0,0 +1,396 @@
+""" Re-render a document whenever it changes, with ``dmr --watch``:
+
+.. code-block:: bash
+
+    dmr --watch -f html,latex resume.rst
+
+The input file, the config files, and the template directories of
+the selected `Genshi`_ output formats (``--template-path`` and
+``~/.dmr/templates``) are watched, and only the work that a change
+affects is redone:
+
+* When a template changes, the document is not parsed again, and only
+  the output formats that use templates are rendered;
+* When the input file changes, the sections of the document that
+  changed are parsed again (see :mod:`dmr.incremental`), and the
+  document is rendered in every selected output format; and
+* When a config file changes, the configuration is parsed again
+  before the document is parsed and rendered.
+
+Changes are detected with `pyinotify
+<https://github.com/seb-m/pyinotify>`_ if it is installed, and by
+polling the watched files every ``--watch-interval`` seconds
+otherwise.  An error while rendering is logged, and dmr keeps
+watching.  Press Ctrl-C to stop.
+"""
+
+import os
+import sys
+import time
+import traceback
+import dmr.config
+import dmr.cli
+from dmr.logger import logger, fatal
+
+try:
+    import pyinotify
+    HAS_INOTIFY = True
+except ImportError:
+    HAS_INOTIFY = False
+
+__all__ = ["Watcher", "PollingWatcher", "InotifyWatcher", "get_watcher",
+           "Session", "watch"]
+
+
+class Watcher(object):
+    """ Base class for objects that wait for files and directories to
+    change.  A watched directory changes when any file in it (or in
+    any of its subdirectories) is created, changed, or removed. """
+
+    def __init__(self, paths):
+        """
+        :param paths: The files and directories to watch.  They need
+                      not exist yet.
+        :type paths: list of str
+        """
+        #: The absolute paths of the watched files and directories
+        self.paths = sorted(set(os.path.abspath(os.path.expanduser(p))
+                                for p in paths))
+
+    def _owners(self, path):
+        """ Get the watched paths that a change to the given path
+        affects """
+        return set(p for p in self.paths
+                   if path == p or path.startswith(p + os.sep))
+
+    def wait(self, timeout=None):
+        """ Wait until one or more watched paths change.  Child classes
+        must implement this method.
+
+        :param timeout: The maximum number of seconds to wait, or None
+                        to wait until there is a change
+        :type timeout: float
+        :returns: set of str - The watched paths that changed, which
+                  is empty if the timeout expired first
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ Stop watching """
+        pass
+
+
+class PollingWatcher(Watcher):
+    """ Detect changes by checking the modification time and size of
+    every watched file at regular intervals. """
+
+    def __init__(self, paths, interval=1.0):
+        """
+        :param paths: The files and directories to watch
+        :type paths: list of str
+        :param interval: The number of seconds between checks
+        :type interval: float
+        """
+        Watcher.__init__(self, paths)
+        self.interval = interval
+        self._state = self._scan()
+
+    @staticmethod
+    def _stat(path):
+        """ Get the modification time and size of a file, or None if
+        it does not exist """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    def _scan(self):
+        """ Get the state of every watched path, as a dict of watched
+        path to a dict of file path to :func:`_stat` result """
+        rv = dict()
+        for path in self.paths:
+            files = rv[path] = dict()
+            if os.path.isdir(path):
+                for dirpath, _, filenames in os.walk(path):
+                    for fname in filenames:
+                        fpath = os.path.join(dirpath, fname)
+                        files[fpath] = self._stat(fpath)
+            else:
+                files[path] = self._stat(path)
+        return rv
+
+    def wait(self, timeout=None):
+        start = time.time()
+        while True:
+            state = self._scan()
+            changed = set(p for p in self.paths
+                          if state[p] != self._state[p])
+            self._state = state
+            if changed:
+                return changed
+            if timeout is not None and time.time() - start >= timeout:
+                return set()
+            time.sleep(self.interval)
+
+
+if HAS_INOTIFY:
+    class _EventCollector(pyinotify.ProcessEvent):
+        """ Collect the paths of the files that inotify events are
+        about """
+
+        def my_init(self, **kwargs):  # pylint: disable=W0221
+            self.changed = set()
+
+        def process_default(self, event):
+            self.changed.add(event.pathname)
+
+
+class InotifyWatcher(Watcher):
+    """ Detect changes with inotify, using `pyinotify
+    <https://github.com/seb-m/pyinotify>`_.  Directories are watched
+    recursively, and files are watched through the directories that
+    contain them, so that files that are replaced rather than
+    rewritten (as many editors do) are still noticed. """
+
+    #: The inotify events to watch for
+    mask = 0
+    if HAS_INOTIFY:
+        mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO |
+                pyinotify.IN_MOVED_FROM | pyinotify.IN_CREATE |
+                pyinotify.IN_DELETE)
+
+    #: The number of seconds to wait for more events after the first
+    #: one, so that a save that touches several files is reported as
+    #: a single change
+    settle = 0.1
+
+    def __init__(self, paths):
+        Watcher.__init__(self, paths)
+        self._collector = _EventCollector()
+        self._manager = pyinotify.WatchManager()
+        self._notifier = pyinotify.Notifier(self._manager, self._collector)
+        for path in self.paths:
+            if os.path.isdir(path):
+                self._manager.add_watch(path, self.mask, rec=True,
+                                        auto_add=True, quiet=True)
+            elif os.path.isdir(os.path.dirname(path)):
+                self._manager.add_watch(os.path.dirname(path), self.mask,
+                                        quiet=True)
+            else:
+                logger.info("Cannot watch %s: Directory does not exist" %
+                            path)
+
+    def _read(self, timeout):
+        """ Read and process pending events, waiting up to
+        ``timeout`` seconds for the first one """
+        if timeout is not None:
+            timeout = int(timeout * 1000)
+        if self._notifier.check_events(timeout=timeout):
+            self._notifier.read_events()
+            self._notifier.process_events()
+            return True
+        return False
+
+    def wait(self, timeout=None):
+        start = time.time()
+        while True:
+            remaining = None
+            if timeout is not None:
+                remaining = max(0, timeout - (time.time() - start))
+            if not self._read(remaining):
+                return set()
+            while self._read(self.settle):
+                pass
+            changed = set()
+            for path in self._collector.changed:
+                changed.update(self._owners(path))
+            self._collector.changed.clear()
+            if changed:
+                return changed
+
+    def close(self):
+        self._notifier.stop()
+
+
+def get_watcher(paths, interval=1.0):
+    """ Get a watcher for the given paths: an
+    :class:`dmr.watch.InotifyWatcher` if pyinotify is installed, or a
+    :class:`dmr.watch.PollingWatcher` otherwise.
+
+    :param paths: The files and directories to watch
+    :type paths: list of str
+    :param interval: The polling interval, in seconds
+    :type interval: float
+    :returns: :class:`dmr.watch.Watcher`
+    """
+    if HAS_INOTIFY:
+        logger.debug("Watching for changes with inotify")
+        return InotifyWatcher(paths)
+    logger.debug("Watching for changes by polling every %ss" % interval)
+    return PollingWatcher(paths, interval=interval)
+
+
+class Session(object):
+    """ Keep a parsed document and the configuration it was rendered
+    with, and re-render the parts that are affected by a change. """
+
+    def __init__(self, config, argv=None):
+        """
+        :param config: The parsed configuration
+        :type config: argparse.Namespace
+        :param argv: The argument list the configuration was parsed
+                     from, used to parse it again if a config file
+                     changes
+        :type argv: list
+        """
+        self.config = config
+        self.argv = argv
+
+        #: The parsed :class:`dmr.data.Document`, or None if it has
+        #: not been parsed yet
+        self.document = None
+        self._check()
+
+    def _check(self):
+        """ Make sure that the configuration can be watched, and
+        have documents parsed incrementally (see
+        :mod:`dmr.incremental`) """
+        if self.config.infile is sys.stdin:
+            fatal("--watch requires an input file")
+        dmr.config.override(incremental=True)
+
+    def paths(self):
+        """ Get the paths to watch.
+
+        :returns: dict with the keys ``config``, ``input``, and
+                  ``templates``, each a list of paths
+        """
+        templates = []
+        for fmt in self.config.formats:
+            dmr.config.select_format(fmt)
+            if getattr(self.config, "template_path", None):
+                templates.extend([self.config.template_path,
+                                  os.path.expanduser('~/.dmr/templates')])
+        return dict(config=[self.config.config,
+                            os.path.expanduser('~/.dmr/config')],
+                    input=[self.config.infile.name],
+                    templates=templates)
+
+    def template_formats(self):
+        """ Get the selected output formats that use templates """
+        rv = []
+        for fmt in self.config.formats:
+            dmr.config.select_format(fmt)
+            if getattr(self.config, "template_path", None):
+                rv.append(fmt)
+        return rv
+
+    def reload(self):
+        """ Parse the configuration again """
+        for fileobj in (self.config.infile, self.config.outfile):
+            if fileobj not in (sys.stdin, sys.stdout):
+                fileobj.close()
+        dmr.config.reset()
+        self.config = dmr.config.parse(self.argv)
+        self.document = None
+        self._check()
+
+    def render(self, formats=None):
+        """ Render the document, parsing it first if necessary.
+
+        :param formats: The output formats to render, or None for all
+                        selected formats
+        :type formats: list of str
+        """
+        if self.document is None:
+            with open(self.config.infile.name) as infile:
+                self.document = dmr.cli.load_document(infile)
+        outfile = self.config.outfile
+        if outfile is not sys.stdout:
+            # rewrite the output file from the start
+            outfile.seek(0)
+            outfile.truncate()
+        dmr.cli.render(self.config, document=self.document, formats=formats)
+        outfile.flush()
+
+    def update(self, changed):
+        """ Re-render what is affected by a change.
+
+        :param changed: The kinds of paths that changed, as in the
+                        keys of :func:`dmr.watch.Session.paths`
+        :type changed: set of str
+        """
+        if "config" in changed:
+            logger.warning("Configuration changed, reloading")
+            self.reload()
+            self.render()
+        elif "input" in changed:
+            logger.warning("%s changed, re-rendering" %
+                           self.config.infile.name)
+            self.document = None
+            self.render()
+        else:
+            formats = self.template_formats()
+            logger.warning("Templates changed, re-rendering %s" %
+                           ", ".join(formats))
+            self.render(formats=formats)
+
+
+def watch(config, argv=None):
+    """ Render a document, then re-render it whenever it changes,
+    until interrupted.
+
+    :param config: The parsed configuration
+    :type config: argparse.Namespace
+    :param argv: The argument list the configuration was parsed from
+    :type argv: list
+    :returns: int - 0
+    """
+    session = Session(config, argv)
+    _run(session.render)
+    watcher = None
+    try:
+        while True:
+            if watcher is None:
+                paths = session.paths()
+                kinds = dict()
+                for kind, kind_paths in paths.items():
+                    for path in kind_paths:
+                        path = os.path.abspath(os.path.expanduser(path))
+                        kinds.setdefault(path, set()).add(kind)
+                watcher = get_watcher(kinds.keys(),
+                                      interval=session.config.watch_interval)
+                logger.warning("Watching %s for changes" %
+                               ", ".join(sorted(kinds.keys())))
+            changed = set()
+            for path in watcher.wait():
+                changed.update(kinds[path])
+            _run(session.update, changed)
+            if "config" in changed:
+                # the configuration may name different files to watch
+                watcher.close()
+                watcher = None
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.close()
+    return 0
+
+
+def _run(func, *args):
+    """ Call a function, logging any error rather than raising it, so
+    that a mistake in the document does not stop ``dmr --watch``.
+
+    :returns: The return value of the function, or None on error
+    """
+    try:
+        return func(*args)
+    except SystemExit:
+        # dmr.logger.fatal() has already logged the reason
+        pass
+    except Exception:  # pylint: disable=W0703
+        logger.error("Failed to render: %s" % sys.exc_info()[1])
+        logger.debug(traceback.format_exc())
+    return None
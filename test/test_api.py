@@ -0,0 +1,114 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import dmr.api
+import dmr.input
+from docutils.parsers.rst import Directive, directives
+from unittest import TestCase
+
+# path to base test directory
+testdir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+
+class _Wait(Directive):
+    """ A directive that blocks the parse it is in until it is released """
+    started = threading.Event()
+    release = threading.Event()
+
+    def run(self):
+        self.started.set()
+        self.release.wait(10)
+        return []
+
+
+class TestRender(TestCase):
+    def setUp(self):
+        self.source = open(os.path.join(testdir, "end_to_end.rst")).read()
+
+    def test_render(self):
+        """ dmr.api.render() matches the command-line output """
+        self.assertEqual(
+            dmr.api.render(self.source, "json",
+                           dict(cache=False, pretty=True, footer=True)),
+            open(os.path.join(testdir, "end_to_end.json")).read())
+
+    def test_cache(self):
+        """ dmr.api.render() only uses the parse cache on request """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache_dir = os.path.join(tmpdir, "cache")
+            expected = dmr.api.render(self.source, "json",
+                                      dict(cache_dir=cache_dir))
+            self.assertFalse(os.path.exists(cache_dir))
+            self.assertEqual(dmr.api.render(self.source, "json",
+                                            dict(cache=True,
+                                                 cache_dir=cache_dir)),
+                             expected)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_bad_format(self):
+        """ dmr.api.render() rejects unknown output formats """
+        self.assertRaises(ValueError, dmr.api.render, self.source, "bogus")
+
+    def test_malformed(self):
+        """ dmr.api.render() raises DocumentError on malformed documents """
+        for source in ["", "No heading\n",
+                       "One\n===\n\nTwo\n===\n",
+                       "Name\n====\n\n.. include:: /nonexistent.rst\n"]:
+            self.assertRaises(dmr.input.DocumentError, dmr.api.render,
+                              source, "json")
+
+    def test_concurrent(self):
+        """ Concurrent renders with different options are independent """
+        options = [dict(cache=False),
+                   dict(cache=False, exclude=["Experience"]),
+                   dict(cache=False, include=["Exclude This Section"])]
+        expected = [json.loads(dmr.api.render(self.source, "json", o))
+                    for o in options]
+        self.assertNotIn("Experience", expected[1])
+        self.assertIn("Exclude This Section", expected[2])
+
+        results = dict()
+
+        def render(idx):
+            results[idx] = json.loads(
+                dmr.api.render(self.source, "json",
+                               options[idx % len(options)]))
+
+        threads = [threading.Thread(target=render, args=(i,))
+                   for i in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), len(threads))
+        for idx, result in results.items():
+            self.assertEqual(result, expected[idx % len(options)])
+
+    def test_parse_concurrently(self):
+        """ Concurrent renders do not wait for each other's parse """
+        directives.register_directive("dmr-test-wait", _Wait)
+        _Wait.started.clear()
+        _Wait.release.clear()
+        blocked = threading.Thread(
+            target=dmr.api.render,
+            args=(self.source + "\n.. dmr-test-wait::\n", "json"))
+        blocked.start()
+        try:
+            self.assertTrue(_Wait.started.wait(10))
+            results = []
+            other = threading.Thread(
+                target=lambda: results.append(
+                    dmr.api.render(self.source, "json")))
+            other.start()
+            other.join(10)
+            self.assertFalse(other.is_alive())
+            self.assertEqual(len(results), 1)
+            self.assertTrue(blocked.is_alive())
+        finally:
+            _Wait.release.set()
+            blocked.join()
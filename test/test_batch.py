@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+import tempfile
+import dmr.batch
+import dmr.config
+from unittest import TestCase
+
+# path to base test directory
+testdir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.indir = os.path.join(self.tmpdir, "in")
+        self.outdir = os.path.join(self.tmpdir, "out")
+        os.makedirs(os.path.join(self.indir, "sub"))
+        source = open(os.path.join(testdir, "end_to_end.rst")).read()
+        open(os.path.join(self.indir, "a.rst"), "w").write(source)
+        # in-document options only apply to the document they are in
+        open(os.path.join(self.indir, "sub", "b.rst"), "w").write(
+            source.replace("   no-footer\n", ""))
+        open(os.path.join(self.indir, "c.rst"), "w").write(
+            "Not a resume\n\n| contact\n\n.. options\n   footer\n")
+        dmr.config._get_default_config(
+            "json", opts=dict(cache=False, pretty=True,
+                              footer=dmr.config._get_footer(),
+                              include=[], exclude=[],
+                              output_pattern="%(base)s.%(extension)s"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_find_sources(self):
+        """ Documents are found recursively in directories """
+        self.assertEqual(
+            dmr.batch.find_sources(self.indir, self.outdir),
+            [(os.path.join(self.indir, "a.rst"),
+              os.path.join(self.outdir, "a")),
+             (os.path.join(self.indir, "c.rst"),
+              os.path.join(self.outdir, "c")),
+             (os.path.join(self.indir, "sub", "b.rst"),
+              os.path.join(self.outdir, "sub", "b"))])
+        self.assertEqual(
+            dmr.batch.find_sources(os.path.join(self.indir, "*", "*.rst"),
+                                   self.outdir),
+            [(os.path.join(self.indir, "sub", "b.rst"),
+              os.path.join(self.outdir, "b"))])
+
+    def test_run(self):
+        """ A batch renders every document and reports failures """
+        results = dmr.batch.run(dmr.batch.find_sources(self.indir,
+                                                       self.outdir),
+                                processes=2)
+        results = dict((os.path.basename(r['source']), r) for r in results)
+        self.assertEqual(sorted(results.keys()), ["a.rst", "b.rst", "c.rst"])
+        self.assertTrue(results['c.rst']['error'])
+        self.assertEqual(results['c.rst']['outputs'], [])
+
+        expected = open(os.path.join(testdir, "end_to_end.json")).read()
+        self.assertEqual(results['a.rst']['outputs'],
+                         [os.path.join(self.outdir, "a.json")])
+        self.assertEqual(open(os.path.join(self.outdir, "a.json")).read(),
+                         expected)
+        # b.rst does not disable the footer
+        self.assertIsNone(results['b.rst']['error'])
+        self.assertIn('"_comment"', open(os.path.join(self.outdir, "sub",
+                                                    "b.json")).read())
+        self.assertNotIn('"_comment"', expected)
+
+        summary = dmr.batch.summarize(results.values(), 1.0)
+        self.assertIn("Rendered 2 of 3 documents", summary)
+        self.assertIn(os.path.join(self.indir, "c.rst"), summary)
+
+    def test_append(self):
+        """ Appendable output formats append to a single file """
+        corpus = os.path.join(self.tmpdir, "corpus.jsonl")
+        dmr.config._get_default_config(
+            "jsonl", opts=dict(cache=False, footer=None, include=[],
+                               exclude=[], output_pattern=corpus))
+        sources = dmr.batch.find_sources(self.indir, self.outdir)
+        for _ in range(2):
+            dmr.batch.clear_outputs(sources)
+            results = dmr.batch.run(sources, processes=2)
+            self.assertEqual(len([r for r in results if r['error']]), 1)
+            records = [json.loads(l) for l in open(corpus)]
+            self.assertItemsEqual([r['_source'] for r in records],
+                                  [os.path.join(self.indir, "a.rst"),
+                                   os.path.join(self.indir, "sub", "b.rst")])
@@ -0,0 +1,119 @@
+import os
+import time
+import shutil
+import tempfile
+import genshi.template
+import dmr.input
+import dmr.config
+from dmr.cache import ParseCache
+from dmr.output.genshi import TemplateCache
+from unittest import TestCase
+
+# path to base test directory
+testdir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+
+class TestParseCache(TestCase):
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def get_output(self):
+        config = dmr.config._get_default_config(
+            "json", opts=dict(cache=True, cache_dir=self.cachedir,
+                              cache_size=None, incremental=False,
+                              pretty=True, footer=dmr.config._get_footer(),
+                              include=[], exclude=[]))
+        return config.output_class(dmr.input.parse(open(
+                    os.path.join(testdir, "end_to_end.rst")))).output()
+
+    def test_cached_output(self):
+        """ Output from a cached parse matches output from a fresh parse """
+        expected = open(os.path.join(testdir, "end_to_end.json")).read()
+        self.assertEqual(self.get_output(), expected)
+        self.assertEqual(len(os.listdir(self.cachedir)), 1)
+        self.assertEqual(self.get_output(), expected)
+        self.assertEqual(len(os.listdir(self.cachedir)), 1)
+
+    def test_evict(self):
+        """ Least recently used parse cache entries are evicted """
+        cache = ParseCache(self.cachedir)
+        for i in range(3):
+            entry = os.path.join(self.cachedir, "%s%s" % (i, cache.suffix))
+            open(entry, "w").write("x" * 100)
+            os.utime(entry, (i, i))
+        cache.maxsize = 250
+        cache.evict()
+        self.assertEqual(sorted(os.listdir(self.cachedir)),
+                         ["1.cache", "2.cache"])
+
+
+class TestTemplateCache(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.tmpdir, "cache")
+        self.tmpl = os.path.join(self.tmpdir, "test.genshi")
+        open(self.tmpl, "w").write("Hello, ${name}!")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def load(self, cache, cache_dir=None):
+        return cache.load("test.genshi", [self.tmpdir],
+                          cls=genshi.template.NewTextTemplate,
+                          cache_dir=cache_dir)
+
+    def test_load(self):
+        """ Templates are loaded once, and again when they change """
+        cache = TemplateCache()
+        tmpl = self.load(cache)
+        self.assertEqual(tmpl.generate(name="world").render("text"),
+                         "Hello, world!")
+        self.assertIs(self.load(cache), tmpl)
+
+        # ensure that the mtime changes
+        mtime = os.stat(self.tmpl).st_mtime
+        open(self.tmpl, "w").write("Goodbye, ${name}!")
+        os.utime(self.tmpl, (time.time(), mtime + 1))
+        self.assertEqual(
+            self.load(cache).generate(name="world").render("text"),
+            "Goodbye, world!")
+
+        self.assertRaises(genshi.template.TemplateNotFound,
+                          cache.load, "missing.genshi", [self.tmpdir])
+
+    def test_include(self):
+        """ Changes to included templates are seen """
+        part = os.path.join(self.tmpdir, "part.genshi")
+        open(part, "w").write("Hello")
+        open(self.tmpl, "w").write("{% include part.genshi %}, ${name}!")
+        cache = TemplateCache()
+        self.assertEqual(
+            self.load(cache).generate(name="world").render("text"),
+            "Hello, world!")
+
+        # ensure that the mtime changes
+        mtime = os.stat(part).st_mtime
+        open(part, "w").write("Goodbye")
+        os.utime(part, (time.time(), mtime + 1))
+        self.assertEqual(
+            self.load(cache).generate(name="world").render("text"),
+            "Goodbye, world!")
+
+    def test_cache_dir(self):
+        """ Parsed templates are stored on disk """
+        self.load(TemplateCache(), cache_dir=self.cachedir)
+        self.assertEqual(len(os.listdir(self.cachedir)), 1)
+
+        cache = TemplateCache()
+        cls = genshi.template.NewTextTemplate
+        parse = cls._parse
+        cls._parse = None
+        try:
+            tmpl = self.load(cache, cache_dir=self.cachedir)
+        finally:
+            cls._parse = parse
+        self.assertEqual(tmpl.generate(name="world").render("text"),
+                         "Hello, world!")
@@ -0,0 +1,127 @@
+import os
+import shutil
+import pickle
+import struct
+import zlib
+import tempfile
+from StringIO import StringIO
+import dmr.api
+import dmr.cli
+import dmr.config
+import dmr.input
+import dmr.compiled
+import dmr.version
+from dmr.config import Settings
+from unittest import TestCase
+
+# path to base test directory
+testdir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+
+class _Payload(object):
+    """ Creates a directory when it is unpickled """
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (os.mkdir, (self.path,))
+
+
+class TestCompiled(TestCase):
+    def setUp(self):
+        self.source = open(os.path.join(testdir, "end_to_end.rst")).read()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        dmr.config.reset()
+
+    def get_settings(self, **opts):
+        opts.setdefault("cache", False)
+        opts.setdefault("incremental", False)
+        return Settings.default("json", opts)
+
+    def get_output(self, source, **opts):
+        doc = dmr.input.parse_source(source, "test.rst",
+                                     settings=self.get_settings(**opts))
+        return doc.settings.output_class(doc).output()
+
+    def get_compiled_output(self, compiled, **opts):
+        infile = StringIO(compiled)
+        infile.name = "test.dmrc"
+        doc = dmr.compiled.load_file(infile, self.get_settings(**opts))
+        return doc.settings.output_class(doc).output()
+
+    def compile(self):
+        return dmr.compiled.dumps(
+            dmr.input.parse_source(self.source, "test.rst",
+                                   settings=self.get_settings()))
+
+    def test_load(self):
+        """ Compiled documents render like their source """
+        compiled = self.compile()
+        self.assertTrue(dmr.compiled.is_compiled(compiled))
+        self.assertFalse(dmr.compiled.is_compiled(self.source))
+
+        self.assertEqual(self.get_compiled_output(compiled),
+                         self.get_output(self.source))
+        # excluded sections are compiled, and can be included again
+        excluded = self.get_output(self.source, exclude=["Experience"])
+        self.assertNotEqual(excluded, self.get_output(self.source))
+        self.assertEqual(self.get_compiled_output(compiled,
+                                                  exclude=["Experience"]),
+                         excluded)
+
+    def test_load_document(self):
+        """ The command-line program loads .dmrc files compiled """
+        path = os.path.join(self.tmpdir, "test.dmrc")
+        open(path, "wb").write(self.compile())
+        config = dmr.config.parse(["dmr", "--no-cache", "-f", "json", path])
+        doc = dmr.cli.load_document(config.infile)
+        self.assertEqual(
+            config.output_class(dmr.input.for_format(doc)).output(),
+            self.get_output(self.source))
+
+    def test_untrusted(self):
+        """ Compiled documents are not recognized by their contents """
+        marker = os.path.join(self.tmpdir, "unpickled")
+        versions = dmr.compiled._versions()
+        payload = "".join([
+            dmr.compiled.MAGIC,
+            struct.pack("!HH", dmr.compiled.FORMAT_VERSION, len(versions)),
+            versions,
+            zlib.compress(pickle.dumps(_Payload(marker)))])
+
+        # the payload is not a valid reST document either
+        self.assertRaises((SystemExit, Exception), dmr.api.render, payload,
+                          "json")
+        self.assertFalse(os.path.exists(marker))
+
+        path = os.path.join(self.tmpdir, "test.rst")
+        open(path, "wb").write(payload)
+        config = dmr.config.parse(["dmr", "--no-cache", "-f", "json", path])
+        self.assertRaises((SystemExit, Exception), dmr.cli.load_document,
+                          config.infile)
+        self.assertFalse(os.path.exists(marker))
+
+        # but it is loaded from a .dmrc file, so it must be trusted
+        infile = StringIO(payload)
+        infile.name = "test.dmrc"
+        self.assertRaises(SystemExit, dmr.compiled.load_file, infile,
+                          self.get_settings())
+        self.assertTrue(os.path.exists(marker))
+
+    def test_version(self):
+        """ Documents compiled by other versions are rejected """
+        compiled = self.compile()
+        version = dmr.version.__version__
+        self.assertRaisesRegexp(ValueError, "dmr X+ and docutils",
+                                dmr.compiled.loads,
+                                compiled.replace(version + "\0",
+                                                 "X" * len(version) + "\0",
+                                                 1))
+        self.assertRaisesRegexp(ValueError, "format version 2",
+                                dmr.compiled.loads,
+                                compiled.replace("DMRC\0\1", "DMRC\0\2"))
+        self.assertRaisesRegexp(ValueError, "Corrupt",
+                                dmr.compiled.loads, compiled[:-10])
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import docutils.nodes
 import dmr.data
 import dmr.config
 from unittest import TestCase
@@ -139,6 +140,32 @@ class TestDates(TestCase):
             dates = dmr.data.Dates.parse(doc.children[0])
             self.assertEqual(tuple(dates.render(renderer)), expected)
 
+    def test_keys(self):
+        """ Get sortable keys for dates """
+        cases = [("1 February 2013 to 27 February 2013",
+                  (2013, 2, 1), (2013, 2, 27)),
+                 ("2-1-2013 to 2-27-2013", (2013, 2, 1), (2013, 2, 27)),
+                 ("2013-1-2 - 2013-27-2", (2013, 1, 2), (2013, 2, 27)),
+                 ("Sept. 2009 to Present", (2009, 9, 0), dmr.data.PRESENT),
+                 ("1999-2004", (1999, 0, 0), (2004, 0, 0)),
+                 (u"Marceau, Nonidi 9 Ventôse an 221 - Présent", None,
+                  None)]
+        for datestr, start, end in cases:
+            dates = dmr.data.Dates.parse(parse(datestr).children[0])
+            self.assertEqual((dates.start_key, dates.end_key), (start, end))
+        self.assertTrue((2013, 2, 27) < dmr.data.PRESENT)
+        self.assertIs(dmr.data.Dates(None, None).start_key, None)
+
+    def test_keys_bounded(self):
+        """ Only the most recently used date keys are memoized """
+        for year in range(1000, 1010 + dmr.data._date_keys.maxsize):
+            self.assertEqual(dmr.data.date_key(u"May %s" % year),
+                             (year, 5, 0))
+        self.assertEqual(len(dmr.data._date_keys),
+                         dmr.data._date_keys.maxsize)
+        for _ in range(2):
+            self.assertIs(dmr.data.date_key(u"Sometime"), None)
+
 
 class TestJob(TestCase):
     employerdata = """
@@ -407,3 +434,159 @@ Test Section
 
 class TestBogusSection(TestCase):
     pass
+
+
+class Table(dmr.data.Section):
+    """ A section type that is not registered by default """
+    allowed_child_node_types = (dmr.data.Section.allowed_child_node_types +
+                                [docutils.nodes.table])
+    required_child_node_types = [docutils.nodes.table]
+
+
+class TestRegisterSection(TestCase):
+    data = """
+=======
+ Title
+=======
+
+Test Section
+============
+
++---+---+
+| a | b |
++---+---+
+"""
+
+    def tearDown(self):
+        dmr.data.sections.remove(Table)
+        dmr.data._dispatch.clear()
+
+    def test_register(self):
+        """ Registered section types are parsed """
+        settings = dmr.config.Settings.default("json")
+        node = parse(self.data).children[0]
+        self.assertIs(dmr.data.section_type(node.children[-1]), None)
+        self.assertEqual(dmr.data.Document.parse(node, settings), [])
+
+        self.assertIs(dmr.data.register_section(Table), Table)
+        self.assertIs(dmr.data.section_type(node.children[-1]), Table)
+        doc = dmr.data.Document.parse(node, settings)
+        self.assertEqual([s.type for s in doc], ["table"])
+
+
+class TestView(TestCase):
+    data = """
+=======
+ Title
+=======
+
+Experience
+==========
+
+Employer
+--------
+
+Job One
+~~~~~~~
+
+.. group old
+
+* Did things.
+
+Job Two
+~~~~~~~
+
+* Did other things.
+
+Skills
+======
+
+.. group old
+
+* Things.
+"""
+
+    def setUp(self):
+        settings = dmr.config.Settings.default("json",
+                                               dict(exclude=["old"]))
+        self.doc = dmr.data.Document.parse(parse(self.data).children[0],
+                                           settings)
+
+    def test_parse(self):
+        """ Excluded sections and jobs are parsed, but not in the view """
+        self.assertEqual(self.doc.sections, ["Experience"])
+        self.assertEqual(len(self.doc[0]), 1)
+        self.assertEqual(len(self.doc.all_sections), 2)
+        self.assertEqual(len(self.doc.all_sections[0]), 2)
+
+    def test_view(self):
+        """ Views are made from all sections and share their data """
+        view = self.doc.view()
+        self.assertEqual(view.sections, ["Experience", "Skills"])
+        self.assertIs(view[0], self.doc.all_sections[0])
+        self.assertIs(view.contact, self.doc.contact)
+
+        view = self.doc.view(include=["Job One"], exclude=["old"])
+        self.assertEqual(view.sections, ["Experience"])
+        self.assertEqual([j.position.astext() for j in view[0]],
+                         ["Job One", "Job Two"])
+
+        view = self.doc.view(exclude=["Employer"])
+        self.assertEqual(len(view[0]), 0)
+        self.assertEqual(len(view.all_sections[0]), 2)
+
+
+class TestCompact(TestCase):
+    data = """
+=======
+ Title
+=======
+
+Experience
+==========
+
+Employer
+--------
+
+Job One
+~~~~~~~
+
+* Did *things*.
+
+Job Two
+~~~~~~~
+
+* Did other things.
+"""
+
+    def test_compact(self):
+        """ Compact documents keep rendered strings and share data """
+        settings = dmr.config.Settings.default("json")
+        doc = dmr.data.Document.parse(parse(self.data).children[0],
+                                      settings)
+        compact = doc.compact(renderer)
+        self.assertIs(compact.source, None)
+        self.assertEqual(compact.sections, ["Experience"])
+        jobs = compact[0]
+        self.assertEqual([j.position for j in jobs], ["Job One", "Job Two"])
+        self.assertEqual(jobs[0][:], ["Did things."])
+        self.assertIs(jobs[0].employer, jobs[1].employer)
+        self.assertIs(jobs[0].employer.name,
+                      dmr.data.intern_name(u"Employer"))
+        self.assertEqual(jobs[0].filter_names, doc[0][0].filter_names)
+
+    def test_intern_bounded(self):
+        """ Only the most recently interned names are kept """
+        for i in range(dmr.data._names.maxsize + 10):
+            dmr.data.intern_name(u"Name %s" % i)
+        self.assertEqual(len(dmr.data._names), dmr.data._names.maxsize)
+        name = u"".join([u"Emp", u"loyer"])
+        self.assertIsNot(name, u"Employer")
+        self.assertIs(dmr.data.intern_name(name),
+                      dmr.data.intern_name(u"Employer"))
+
+    def test_slots(self):
+        """ Data model objects do not have a __dict__ """
+        for obj in (dmr.data.Job(), dmr.data.Experience("name"),
+                    dmr.data.Dates(None, None)):
+            self.assertRaises(AttributeError, setattr, obj, "bogus", 1)
@@ -1,7 +1,14 @@
 import os
+import sys
 import copy
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+import dmr.data
 import dmr.input
 import dmr.config
+import dmr.cli
 from unittest import TestCase
 
 # path to base test directory
@@ -36,12 +43,16 @@ class TestEndToEnd(TestCase):
     def get_expected(self, fmt):
         return open(os.path.join(testdir, "end_to_end.%s" % fmt)).read()
 
-    def get_actual(self, fmt):
+    def get_output(self, fmt, **options):
         fmt_opts = copy.deepcopy(self.options)
         fmt_opts.update(self.fmt_options.get(fmt, dict()))
+        fmt_opts.update(options)
         config = dmr.config._get_default_config(fmt, opts=fmt_opts)
         return config.output_class(dmr.input.parse(open(
-                    os.path.join(testdir, "end_to_end.rst")))).output()
+                    os.path.join(testdir, "end_to_end.rst"))))
+
+    def get_actual(self, fmt):
+        return self.get_output(fmt).output()
 
     def _test_format(self, fmt):
         self.assertEqual(self.get_expected(fmt),
@@ -55,6 +66,154 @@ class TestEndToEnd(TestCase):
         """ End-to-end test with JSON output """
         self._test_format("text")
 
+    def test_json_stream(self):
+        """ Streamed JSON output matches JSON output """
+        for pretty in [False, True]:
+            outfile = StringIO()
+            self.get_output("json", pretty=pretty).output_to(outfile)
+            self.assertEqual(outfile.getvalue(),
+                             self.get_output("json", pretty=pretty).output())
+        self.assertEqual(outfile.getvalue(), self.get_expected("json"))
+
+    def test_text_stream(self):
+        """ Streamed Genshi output matches Genshi output """
+        outfile = StringIO()
+        self.get_output("text").output_to(outfile)
+        self.assertEqual(outfile.getvalue(), self.get_expected("text"))
+
+    def test_html(self):
+        """ HTML output leaves the document unchanged """
+        output = self.get_output("html", footer="Test footer")
+        source = output.document.source.pformat()
+        html = output.output()
+        self.assertIn('<div class="footer">', html)
+        self.assertIn("Test footer", html)
+        self.assertEqual(output.document.source.pformat(), source)
+        self.assertEqual(output.output(), html)
+
+    def test_jsonl(self):
+        """ JSON Lines output has the same data as JSON output """
+        expected = json.loads(self.get_expected("json"))
+        source = os.path.join(testdir, "end_to_end.rst")
+
+        # the in-document options for JSON do not apply
+        options = dict(include=[], exclude=["Exclude This Section in JSON"],
+                       footer=None)
+        lines = self.get_output("jsonl", **options).output().splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record.pop("_source"), source)
+        self.assertEqual(record, expected)
+
+        records = [json.loads(l) for l in
+                   self.get_output("jsonl", records="item",
+                                   **options).output()
+                   .splitlines()]
+        contact = dict((k, expected[k]) for k in dmr.data.Contact._fields)
+        items = []
+        for name in ["Experience", "Education",
+                     "Related Skills and Activities", "References"]:
+            items.extend((name, item) for item in expected[name])
+        self.assertItemsEqual([(r['section'], r['item']) for r in records],
+                              items)
+        for record in records:
+            self.assertEqual(record['_source'], source)
+            self.assertEqual(record['contact'], contact)
+
+
+class TestMultipleFormats(TestCase):
+    """ Render several output formats from a single parse, as with
+    ``dmr -f json,text`` """
+
+    templates = os.path.abspath(os.path.join(testdir, '..', "templates"))
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.infile = open(os.path.join(testdir, "end_to_end.rst"))
+
+    def tearDown(self):
+        self.infile.close()
+        shutil.rmtree(self.tmpdir)
+
+    def get_config(self, fmt, **options):
+        opts = dict(cache=False, incremental=False, footer=None,
+                    include=[], exclude=[], pretty=True,
+                    template_path=self.templates, template="text.genshi",
+                    infile=self.infile, outfile=sys.stdout,
+                    output_pattern="%(base)s.%(extension)s")
+        opts.update(options)
+        return dmr.config._get_default_config(fmt, opts=opts)
+
+    def get_single(self, fmt):
+        config = self.get_config(fmt)
+        self.infile.seek(0)
+        return config.output_class(dmr.input.for_format(
+            dmr.input.parse(self.infile))).output()
+
+    def test_render(self):
+        """ Each format is rendered from one parse with its own options """
+        expected = dict((fmt, self.get_single(fmt))
+                        for fmt in ["json", "text"])
+
+        pattern = os.path.join(self.tmpdir, "%(format)s.%(extension)s")
+        config = self.get_config("json", formats=["json", "text"],
+                                 output_pattern=pattern)
+        self.infile.seek(0)
+        document = dmr.input.parse(self.infile)
+        dmr.cli.render(config, document=document)
+        actual = dict(json=open(os.path.join(self.tmpdir,
+                                             "json.json")).read(),
+                      text=open(os.path.join(self.tmpdir,
+                                             "text.txt")).read())
+        self.assertEqual(actual, expected)
+
+        # the options=json block only applies to JSON output
+        self.assertNotIn("Exclude This Section in JSON", actual['json'])
+        self.assertIn("Exclude This Section in JSON", actual['text'])
+        self.assertNotIn("Include This Section in Plain Text",
+                         actual['json'])
+        self.assertIn("Include This Section in Plain Text", actual['text'])
+        # the default options block applies to both
+        for output in actual.values():
+            self.assertNotIn("This section will always be excluded", output)
+
+    def test_output_filename(self):
+        """ Output filenames are made from --output-pattern """
+        self.get_config("json", formats=["json", "text"])
+        base = os.path.join(testdir, "end_to_end")
+        self.assertEqual(dmr.config.output_filename(), base + ".json")
+        dmr.config.select_format("text")
+        self.assertEqual(dmr.config.output_filename(), base + ".txt")
+        self.assertEqual(dmr.config.output_filename(base="out"), "out.txt")
+
+    def test_outfile(self):
+        """ --outfile cannot be used with several formats """
+        outfile = open(os.path.join(self.tmpdir, "out"), "w")
+        try:
+            config = self.get_config("json", formats=["json", "text"],
+                                     outfile=outfile)
+            self.assertRaises(SystemExit, dmr.cli.render, config)
+        finally:
+            outfile.close()
+
+    def test_outfile_kept(self):
+        """ --outfile is not truncated when it is given with several
+        formats """
+        path = os.path.join(self.tmpdir, "out")
+        open(path, "w").write("Keep me")
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        dmr.config.reset()
+        try:
+            self.assertRaises(SystemExit, dmr.config.parse,
+                              ["dmr", "-f", "json,text", "-o", path,
+                               self.infile.name])
+            self.assertIn("--output-pattern", sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+            dmr.config.reset()
+        self.assertEqual(open(path).read(), "Keep me")
+
 
 if __name__ == "__main__":
     # update expected test output
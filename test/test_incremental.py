@@ -0,0 +1,113 @@
+import os
+import dmr.input
+import dmr.incremental
+from dmr.cache import ChunkCache
+from dmr.config import Settings
+from unittest import TestCase
+
+# path to base test directory
+testdir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+SOURCE = """\
+=======
+ Title
+=======
+
+| Address
+
+First
+=====
+
+Text::
+
+  Not a
+  =====
+
+Second
+======
+
+Employer
+--------
+
+Job
+~~~
+2010 - Present
+
+* Did things.
+
+Third
+=====
+
+Text.
+"""
+
+
+class TestIncremental(TestCase):
+    def setUp(self):
+        ChunkCache.memory.clear()
+        self.source = open(os.path.join(testdir, "end_to_end.rst")).read()
+        self.serial = Settings.default("json", dict(cache=False,
+                                                    incremental=False))
+        self.incremental = Settings.default("json",
+                                            dict(cache=False,
+                                                 incremental=True))
+
+    def assertSameParse(self, source, settings=None):
+        if settings is None:
+            settings = self.incremental
+        expected = dmr.input.parse_source(source, "test.rst",
+                                          settings=self.serial)
+        actual = dmr.input.parse_source(source, "test.rst",
+                                        settings=settings)
+        self.assertEqual(actual.source.pformat(), expected.source.pformat())
+        self.assertEqual(repr(actual), repr(expected))
+        self.assertEqual([n.line for n in actual.source.traverse()],
+                         [n.line for n in expected.source.traverse()])
+        self.assertEqual(actual.settings.output_class(actual).output(),
+                         expected.settings.output_class(expected).output())
+
+    def test_split(self):
+        """ Documents are split at top-level section titles """
+        self.assertEqual(dmr.incremental.split(SOURCE.splitlines()),
+                         [6, 14, 26])
+        self.assertIsNone(dmr.incremental.split(SOURCE.splitlines()[:5]))
+
+    def test_parse(self):
+        """ Only changed sections are parsed again """
+        self.assertSameParse(self.source)
+        self.assertEqual(ChunkCache.memory.stats()['hits'], 0)
+
+        changed = self.source.replace("Managed assistants",
+                                      "Managed *all* assistants")
+        self.assertSameParse(changed)
+        # the header and every section but Experience were reused
+        self.assertEqual(ChunkCache.memory.stats()['hits'],
+                         len(dmr.incremental.split(changed.splitlines())))
+
+        # moving sections around does not change their line numbers
+        self.assertSameParse(changed.replace("single end-to-end test.",
+                                             "single\nend-to-end test."))
+
+    def test_fallback(self):
+        """ Documents whose sections depend on each other are parsed as
+        a whole """
+        source = SOURCE.replace("Third\n=====", "Employer\n========")
+        self.assertIsNone(dmr.incremental.parse_source(source))
+        self.assertSameParse(source)
+
+    def test_parallel(self):
+        """ Sections parsed in worker processes match a serial parse """
+        parallel = Settings.default("json", dict(cache=False,
+                                                 incremental=False,
+                                                 parse_processes=2))
+        self.assertSameParse(self.source, settings=parallel)
+        self.assertEqual(len(ChunkCache.memory), 0)
+
+        parallel = Settings.default("json", dict(cache=False,
+                                                 incremental=True,
+                                                 parse_processes=2))
+        self.assertSameParse(self.source, settings=parallel)
+        self.assertSameParse(self.source, settings=self.incremental)
+        self.assertEqual(ChunkCache.memory.stats()['hits'],
+                         len(dmr.incremental.split(
+                             self.source.splitlines())) + 1)
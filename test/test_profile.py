@@ -0,0 +1,36 @@
+import json
+import dmr.profile
+from dmr.profile import Profiler, phase
+from unittest import TestCase
+
+
+class TestProfiler(TestCase):
+    def tearDown(self):
+        dmr.profile.deactivate()
+
+    def test_phases(self):
+        """ Nested phases are recorded and reported """
+        profiler = Profiler()
+        dmr.profile.activate(profiler)
+        with phase("outer"):
+            with phase("inner"):
+                pass
+            with phase("inner"):
+                pass
+        dmr.profile.deactivate()
+        with phase("ignored"):
+            pass
+        profiler.stop()
+
+        self.assertEqual([p.name for p in profiler.root.children], ["outer"])
+        self.assertEqual([p.name for p in profiler.root.children[0].children],
+                         ["inner", "inner"])
+        self.assertTrue(profiler.root.wall >=
+                        profiler.root.children[0].wall)
+
+        report = json.loads(profiler.to_json())
+        self.assertEqual(report['name'], "total")
+        self.assertEqual(len(report['children'][0]['children']), 2)
+        lines = profiler.report().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[3].startswith("    inner"))
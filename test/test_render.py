@@ -0,0 +1,190 @@
+import docutils.nodes
+from unittest import TestCase
+from docutils.utils import new_document
+from docutils.frontend import OptionParser
+from docutils.parsers.rst import Parser
+from dmr.data import Section
+from docutils.writers.latex2e import Writer
+import dmr.output.latex
+from dmr.render import Renderer, ReferenceTransformer, LRUCache, \
+    BatchRenderer, WriterRenderer, default_settings
+
+
+def parse(data):
+    parser = Parser()
+    settings = OptionParser(components=(Parser,)).get_default_values()
+    document = new_document("/tmp/fake", settings)
+    parser.parse(data, document)
+    return document
+
+
+class UpperCaser(ReferenceTransformer):
+    """ A visitor that modifies the doctree it walks """
+
+    def visit_Text(self, node):
+        node.parent.replace(node, docutils.nodes.Text(node.upper()))
+        self.body.append(node.upper())
+
+
+class TestRenderer(TestCase):
+    def test_nonmutating(self):
+        """ Non-mutating visitors walk snippets without copying them """
+        document = parse("Some *text* here.")
+        renderer = Renderer(document, ReferenceTransformer)
+        self.assertFalse(renderer.copy)
+        self.assertEqual(renderer(document.children[0]), "Some text here.")
+
+    def test_mutating(self):
+        """ Undeclared visitors cannot modify the original doctree """
+        document = parse("Some *text* here.")
+        renderer = Renderer(document, UpperCaser)
+        self.assertTrue(renderer.copy)
+        self.assertEqual(renderer(document.children[0]), "SOME TEXT HERE.")
+        self.assertEqual(document.children[0].astext(), "Some text here.")
+
+    def test_cache(self):
+        """ Identical snippets are only rendered once """
+        document = parse("""
+* Same text.
+* Same text.
+
+Same text.
+""")
+        cache = LRUCache()
+        renderer = Renderer(document, ReferenceTransformer, cache=cache)
+        items = [i.children[0] for i in document.children[0].children]
+        self.assertEqual([renderer(i) for i in items],
+                         ["Same text.", "Same text."])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # the same content in a different position is rendered again
+        self.assertEqual(renderer(document.children[1]), "Same text.")
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_reuse_visitor(self):
+        """ A single visitor is reset between snippets """
+        document = parse("First *para*.\n\nSecond para.")
+        renderer = Renderer(document, ReferenceTransformer)
+        self.assertEqual([renderer(p) for p in document.children],
+                         ["First para.", "Second para."])
+        visitor = renderer.visitor()
+        self.assertIs(renderer.visitor(), visitor)
+        self.assertEqual(visitor.body, [])
+
+
+class TestWriterRenderer(TestCase):
+    def test_settings(self):
+        """ Writer renderers do not change the document's settings """
+        document = parse("Some *text* here.")
+        settings = document.settings
+        renderer = WriterRenderer(document, Writer())
+        self.assertIs(document.settings, settings)
+        self.assertIsNot(renderer.document.settings, settings)
+        self.assertIs(renderer.document.children[0], document.children[0])
+        self.assertIn("\\emph{text}", renderer(document.children[0]))
+
+    def test_latex(self):
+        """ The LaTeX translator walks snippets without changing them """
+        document = parse("""
+* Wrote :abbreviation:`HTML` and :acronym:`CSS` docs.
+
+.. compound::
+
+   Compound text.
+""")
+        source = document.pformat()
+        renderer = WriterRenderer(document, dmr.output.latex.Writer())
+        self.assertFalse(renderer.copy)
+        snippets = [document.children[0].children[0].children[0],
+                    document.children[1]]
+        rendered = [renderer(s) for s in snippets]
+        self.assertEqual(document.pformat(), source)
+        self.assertEqual([renderer(s) for s in snippets], rendered)
+        self.assertIn("\\DUrole{abbreviation}{HTML}", rendered[0])
+        self.assertIn("\\DUrole{acronym}{CSS}", rendered[0])
+        self.assertIn("compound", rendered[1])
+
+    def test_context(self):
+        """ Identical snippets in different contexts are rendered apart """
+        document = parse("""
+.. compound::
+
+   First.
+
+   * Item.
+
+   Same.
+
+.. compound::
+
+   First.
+
+   Second.
+
+   Same.
+""")
+        snippets = [c.children[2] for c in document.children]
+        self.assertEqual(snippets[0].astext(), snippets[1].astext())
+        writer = dmr.output.latex.Writer()
+        expected = [WriterRenderer(document, writer).render(s)
+                    for s in snippets]
+        self.assertNotEqual(expected[0], expected[1])
+        renderer = WriterRenderer(document, writer)
+        self.assertEqual([renderer(s) for s in snippets], expected)
+        self.assertEqual((renderer.cache.hits, renderer.cache.misses), (0, 2))
+
+    def test_cache_scope(self):
+        """ Each renderer has its own snippet cache by default """
+        document = parse("Some *text* here.")
+        renderers = [WriterRenderer(document, Writer()) for _ in range(2)]
+        self.assertIsNot(renderers[0].cache, renderers[1].cache)
+        self.assertIs(Renderer(document, ReferenceTransformer,
+                               cache=None).cache, None)
+
+    def test_default_settings(self):
+        """ Default settings are copied for each caller """
+        settings = default_settings(Writer)
+        settings.documentclass = "book"
+        settings.stylesheet_dirs.append("foo")
+        self.assertEqual(default_settings(Writer).documentclass, "article")
+        self.assertNotIn("foo", default_settings(Writer).stylesheet_dirs)
+
+
+class TestBatchRenderer(TestCase):
+    def test_prepare(self):
+        """ Prepared snippets are rendered once, with identical results """
+        document = parse("""
+* One *item*.
+* Two items.
+""")
+        section = Section(docutils.nodes.Text("Items"))
+        section.extend(i.children[0] for i in document.children[0].children)
+        expected = section.render(Renderer(document, ReferenceTransformer,
+                                           cache=LRUCache()))
+
+        renderer = BatchRenderer(Renderer(document, ReferenceTransformer,
+                                          cache=LRUCache()))
+        renderer.prepare([section])
+        self.assertEqual(len(renderer.results), 3)
+        calls = []
+        renderer.renderer = calls.append
+        rendered = section.render(renderer)
+        self.assertEqual(calls, [])
+        self.assertEqual(rendered.name, expected.name)
+        self.assertEqual(rendered[:], expected[:])
+
+
+class TestLRUCache(TestCase):
+    def test_evict(self):
+        """ Least recently used entries are evicted from a full cache """
+        cache = LRUCache(maxsize=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)
+        cache["c"] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats(),
+                         dict(hits=3, misses=1, size=2, maxsize=2))
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+from StringIO import StringIO
+import dmr.cli
+import dmr.config
+import dmr.server
+from unittest import TestCase
+
+# path to base test directory
+testdir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+
+def _serve(path):
+    """ Run a dmr server in a child process """
+    dmr.config.config.verbose = 0
+    dmr.server.serve(path)
+
+
+class TestServer(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.socket = os.path.join(self.tmpdir, "socket")
+        self.server = multiprocessing.Process(target=_serve,
+                                              args=(self.socket,))
+        self.server.start()
+        start = time.time()
+        while not os.path.exists(self.socket):
+            if time.time() - start > 10:
+                self.fail("dmr server did not start")
+            time.sleep(0.01)
+        self.source = open(os.path.join(testdir, "end_to_end.rst")).read()
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.join()
+        shutil.rmtree(self.tmpdir)
+        dmr.config.reset()
+
+    def run_dmr(self, func, argv, stdin=""):
+        """ Run dmr with the given stdin, and get its return value,
+        stdout, and stderr """
+        saved = (sys.stdin, sys.stdout, sys.stderr)
+        sys.stdin = StringIO(stdin)
+        sys.stdout = StringIO()
+        sys.stderr = StringIO()
+        # named like the streams that the server stands in
+        for name in ["stdin", "stdout", "stderr"]:
+            getattr(sys, name).name = "<%s>" % name
+        try:
+            dmr.config.reset()
+            try:
+                rv = func(argv)
+            except SystemExit:
+                rv = sys.exc_info()[1].code
+            return rv, sys.stdout.getvalue(), sys.stderr.getvalue()
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved
+
+    def assertSameResult(self, argv, stdin=""):
+        expected = self.run_dmr(dmr.cli.main, ["dmr"] + argv, stdin)
+        actual = self.run_dmr(dmr.server.client,
+                              ["dmr", "--client", "--socket", self.socket] +
+                              argv, stdin)
+        self.assertEqual(actual, expected)
+        return actual
+
+    def test_client(self):
+        """ The server produces the same results as a local run """
+        infile = os.path.join(testdir, "end_to_end.rst")
+        rv, stdout = self.assertSameResult(["--no-cache", "-f", "json",
+                                            infile])[:2]
+        self.assertFalse(rv)
+        self.assertIn('"Experience"', stdout)
+
+        rv, stdout = self.assertSameResult(["--no-cache", "-f", "json"],
+                                           stdin=self.source)[:2]
+        self.assertFalse(rv)
+        self.assertIn('"Experience"', stdout)
+
+        rv, _, stderr = self.assertSameResult(["--no-cache", "-f", "bogus",
+                                               infile])
+        self.assertEqual(rv, 2)
+        self.assertIn("invalid choice: 'bogus'", stderr)
+
+    def test_refused(self):
+        """ --serve and --watch cannot be sent to a server """
+        infile = os.path.join(testdir, "end_to_end.rst")
+        for arg in ["--serve", "--watch"]:
+            rv, _, stderr = self.run_dmr(dmr.server.client,
+                                         ["dmr", "--client", "--socket",
+                                          self.socket, arg, infile])
+            self.assertEqual(rv, 2)
+            self.assertIn("%s cannot be sent" % arg, stderr)
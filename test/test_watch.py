@@ -0,0 +1,107 @@
+import os
+import time
+import shutil
+import tempfile
+import dmr.config
+import dmr.incremental
+from dmr.watch import PollingWatcher, Session
+from unittest import TestCase
+
+# path to base test directory
+testdir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+
+class TestPollingWatcher(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, "file")
+        self.subdir = os.path.join(self.tmpdir, "dir")
+        os.makedirs(self.subdir)
+        open(self.fname, "w").write("data")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def touch(self, path, data="changed"):
+        open(path, "w").write(data)
+        # ensure that the mtime changes
+        mtime = time.time() + 10
+        os.utime(path, (mtime, mtime))
+
+    def test_wait(self):
+        """ Changes to watched files and directories are detected """
+        missing = os.path.join(self.tmpdir, "missing")
+        watcher = PollingWatcher([self.fname, self.subdir, missing],
+                                 interval=0.01)
+        self.assertEqual(watcher.wait(timeout=0.05), set())
+        self.touch(self.fname)
+        self.assertEqual(watcher.wait(timeout=0.05), set([self.fname]))
+        self.touch(os.path.join(self.subdir, "new"))
+        self.assertEqual(watcher.wait(timeout=0.05), set([self.subdir]))
+        self.touch(missing)
+        os.unlink(self.fname)
+        self.assertEqual(watcher.wait(timeout=0.05),
+                         set([missing, self.fname]))
+
+
+class TestSession(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.templates = os.path.join(self.tmpdir, "templates")
+        shutil.copytree(os.path.join(testdir, "..", "templates"),
+                        self.templates)
+        self.outfile = os.path.join(self.tmpdir, "resume.txt")
+        dmr.config._get_default_config(
+            "text", opts=dict(cache=False, incremental=False,
+                              footer=None, include=[],
+                              exclude=[], template_path=self.templates,
+                              template="text.genshi",
+                              infile=open(os.path.join(testdir,
+                                                       "end_to_end.rst")),
+                              outfile=open(self.outfile, "w")))
+
+    def tearDown(self):
+        dmr.config.config.infile.close()
+        dmr.config.config.outfile.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_update(self):
+        """ Template changes do not cause the document to be parsed """
+        parses = []
+        parse_source = dmr.incremental.parse_source
+
+        def record(source, name="<string>", **kwargs):
+            parses.append(name)
+            return parse_source(source, name, **kwargs)
+
+        dmr.incremental.parse_source = record
+        try:
+            self._test_update(parses)
+        finally:
+            dmr.incremental.parse_source = parse_source
+
+    def _test_update(self, parses):
+        session = Session(dmr.config.config)
+        self.assertItemsEqual(session.paths()['templates'],
+                              [self.templates,
+                               os.path.expanduser("~/.dmr/templates")])
+        session.render()
+        document = session.document
+        expected = open(self.outfile).read()
+        self.assertIn("Experience:", expected)
+
+        template = os.path.join(self.templates, "text.genshi")
+        open(template, "a").write("The end\n")
+        mtime = time.time() + 10
+        os.utime(template, (mtime, mtime))
+        session.update(set(["templates"]))
+        self.assertIs(session.document, document)
+        self.assertEqual(open(self.outfile).read(), expected + "The end\n")
+
+        # documents are always parsed incrementally, however many
+        # times the output format has been selected
+        self.assertEqual(len(parses), 1)
+        session.update(set(["input"]))
+        self.assertIsNot(session.document, document)
+        self.assertEqual(open(self.outfile).read(), expected + "The end\n")
+        self.assertEqual(len(parses), 2)